@@ -1,19 +1,26 @@
 # app.py（整理・再構築・更新：1時間半対応＋目標上書き）
 
-from flask import Flask, request, abort
+from flask import Flask, Response, request, abort
 from linebot import LineBotApi, WebhookHandler
-from linebot.exceptions import InvalidSignatureError
+from linebot.exceptions import LineBotApiError
 from linebot.models import MessageEvent, TextMessage, TextSendMessage, FollowEvent
 from dotenv import load_dotenv
 import os
 import datetime
-import re
+import json
 
 # 自作モジュール
-from data_utils.subject_dict import ALL_SUBJECTS
+from data_utils.message_router import (
+    route_message, parse_notification, NotificationCommand, DailyGoalCommand, StudyLogCommand,
+    LeaderboardCommand
+)
 from spreadsheet_utils.spreadsheet_utils import update_notification_time, record_study_log
-from goal_manager.parse_goal import parse_daily_goal_message
+from spreadsheet_utils.leaderboard import get_leaderboard, format_leaderboard, warm_leaderboard
 from goal_manager.save_goal import save_or_update_daily_goal
+from webhook_queue.event_queue import EventQueue, EventWorkerPool
+from webhook_queue.dedupe import create_deduper_from_env, create_journal_from_env
+from metrics_utils.metrics import span, timed, render_prometheus
+from graph_generator.chart_service import get_chart_service
 
 # Flaskアプリ設定
 load_dotenv()
@@ -23,36 +30,14 @@ app = Flask(__name__, static_folder='static')
 line_bot_api = LineBotApi(os.getenv("LINE_CHANNEL_ACCESS_TOKEN"))
 handler = WebhookHandler(os.getenv("LINE_CHANNEL_SECRET"))
 
+# 非同期モード：/callback は署名確認とキュー投入だけ行い、処理はワーカーに任せる
+ASYNC_WEBHOOK = os.getenv("WEBHOOK_ASYNC", "0") == "1"
+
 # =========================
 # 🔁 通知変更メッセージ解析
 # =========================
 def parse_message(text):
-    pattern = r"(朝|昼|夕方|夜)の通知を(?:\s*(\d{1,2})(?::|：| |時)?(\d{1,2})?|\s*(\d{1,2})時半)にして"
-    match = re.search(pattern, text)
-    if not match:
-        return False, None, None
-
-    time_period = match.group(1)
-    if match.group(2):
-        hour = int(match.group(2))
-        minute = int(match.group(3)) if match.group(3) else 0
-    elif match.group(4):
-        hour = int(match.group(4))
-        minute = 30
-    else:
-        return False, None, None
-
-    time_24 = convert_to_24h(f"{hour}:{minute}", time_period)
-    return True, time_period, time_24
-
-# 通知の時間帯を24時間制に変換
-def convert_to_24h(time_str, period):
-    hour, minute = map(int, time_str.split(":"))
-    if period == "朝" and hour == 12:
-        hour = 0
-    elif period in ["昼", "夕方", "夜"] and hour < 12:
-        hour += 12
-    return f"{hour:02}:{minute:02}"
+    return parse_notification(text)
 
 # =========================
 # 📌 フォローイベント
@@ -68,79 +53,133 @@ def handle_follow(event):
 # =========================
 # 💬 通常メッセージ応答
 # =========================
+# 保存に失敗したときの返信（同期モードのみ。キューのモードではワーカーが再試行する）
+STORAGE_ERROR_REPLIES = {
+    DailyGoalCommand: "⚠️ 目標の保存中にエラーが発生しました: {error}",
+    StudyLogCommand: "❌ スプレッドシート記録中にエラーが発生しました: {error}"
+}
+
+def command_reply(user_id, text, command):
+    """
+    コマンドを実行して返信文を返す。保存先への書き込みの失敗はそのまま例外にする。
+    """
+    # ① 通知変更メッセージ
+    if isinstance(command, NotificationCommand):
+        update_notification_time(user_id, command.period, command.time)
+        reply = f"✅ {command.period}の通知時間を {command.time} に変更しました！"
+
+    # ② 毎日目標の設定
+    elif isinstance(command, DailyGoalCommand):
+        goal_data = command.goal
+        save_or_update_daily_goal(user_id, goal_data)
+        unit_label = "分" if goal_data["type"] == "time" else "回"
+        reply = f"✅ 毎日の目標「{goal_data['value']}{unit_label}」を設定しました！"
+
+    # ③ 学習記録
+    elif isinstance(command, StudyLogCommand):
+        record_study_log({
+            "datetime": datetime.datetime.now().isoformat(),
+            "user_id": user_id,
+            "subject": command.subject,
+            "minutes": command.minutes,
+            "raw_message": text
+        })
+        reply = f"✅ 「{command.subject}」を{command.minutes}分 記録しました！"
+
+    # ④ 今週のランキング（メモリ上の順位表から返す）
+    elif isinstance(command, LeaderboardCommand):
+        try:
+            with span("leaderboard"):
+                reply = format_leaderboard(get_leaderboard(), user_id, command.subject)
+        except Exception as e:
+            reply = f"⚠️ ランキングの取得中にエラーが発生しました: {e}"
+
+    elif command.reason == "subject":
+        reply = "⚠️ 科目名が見つかりませんでした。\n例：「英語30分」「数学1時間」"
+    else:
+        reply = "⚠️ 入力形式が正しくありません。\n例：「英語30分」「数学1時間」"
+
+    return reply
+
+# 保存まで終わったイベントの返信文（再送・再試行で同じ記録を二重に書かない）
+event_journal = create_journal_from_env()
+
 @handler.add(MessageEvent, message=TextMessage)
+@timed("handle_message")
 def handle_message(event):
     user_id = event.source.user_id
     text = event.message.text.strip()
+    event_id = getattr(event, "webhook_event_id", None)
 
-    # ① 通知変更メッセージか？
-    is_notification, period, new_time = parse_message(text)
-    if is_notification:
-        if new_time:
-            update_notification_time(user_id, period, new_time)
-            reply = f"✅ {period}の通知時間を {new_time} に変更しました！"
-        else:
-            reply = "⚠️ 通知時間の形式が正しくありません（例：朝の通知を7時30分にして）"
-        line_bot_api.reply_message(event.reply_token, TextSendMessage(text=reply))
-        return
-
-    # ② 毎日目標の設定か？
-    goal_data = parse_daily_goal_message(text)
-    if goal_data:
+    # 前回保存まで終わっていれば（返信だけ失敗した再試行・再送）、保存はやり直さず同じ返信だけ送る
+    reply = event_journal.get(event_id)
+    if reply is None:
+        # 1回の走査で「通知変更 / 毎日目標 / 学習記録 / ランキング」を判定
+        with span("parse"):
+            command = route_message(text)
         try:
-            save_or_update_daily_goal(user_id, goal_data)
-            unit_label = "分" if goal_data["type"] == "time" else "回"
-            reply = f"✅ 毎日の目標「{goal_data['value']}{unit_label}」を設定しました！"
+            reply = command_reply(user_id, text, command)
         except Exception as e:
-            reply = f"⚠️ 目標の保存中にエラーが発生しました: {e}"
-        line_bot_api.reply_message(event.reply_token, TextSendMessage(text=reply))
-        return
+            if ASYNC_WEBHOOK:
+                # 返信はせず、キューのワーカーに保存ごと再試行させる
+                raise
+            reply = STORAGE_ERROR_REPLIES.get(type(command), "⚠️ エラーが発生しました: {error}").format(error=e)
+        else:
+            event_journal.put(event_id, reply)
 
-    # ③ 学習記録か？
-    time_match = re.search(r"([0-9０-９]+)時間([0-9０-９]+)?分?|([0-9０-９]+)時間半|([0-9０-９]+)分|([0-9０-９])半", text)
-    if not time_match:
-        reply = "⚠️ 入力形式が正しくありません。\n例：「英語30分」「数学1時間」"
+    with span("line.reply"):
         line_bot_api.reply_message(event.reply_token, TextSendMessage(text=reply))
-        return
 
-    # 時間抽出
-    minutes = 0
-    if time_match.group(1):  # 1時間 or 1時間30分
-        minutes += int(time_match.group(1)) * 60
-        if time_match.group(2):
-            minutes += int(time_match.group(2))
-    elif time_match.group(3):  # 1時間半
-        minutes += int(time_match.group(3)) * 60 + 30
-    elif time_match.group(4):  # 30分など
-        minutes += int(time_match.group(4))
-    elif time_match.group(5):  # 「1半」など
-        minutes += 30
-
-    # 科目抽出
-    subject = None
-    for word in ALL_SUBJECTS:
-        if word in text:
-            subject = word
-            break
-    if not subject:
-        reply = "⚠️ 科目名が見つかりませんでした。\n例：「英語30分」「数学1時間」"
-        line_bot_api.reply_message(event.reply_token, TextSendMessage(text=reply))
+# =========================
+# 📨 キューからのイベント処理
+# =========================
+EVENT_TYPES = {
+    "message": MessageEvent,
+    "follow": FollowEvent
+}
+
+def dispatch_event(event_dict):
+    event_cls = EVENT_TYPES.get(event_dict.get("type"))
+    if event_cls is None:
         return
+    event = event_cls.new_from_json_dict(event_dict)
+    with span("queue.dispatch"):
+        if isinstance(event, FollowEvent):
+            handle_follow(event)
+        elif isinstance(event.message, TextMessage):
+            handle_message(event)
 
-    # スプレッドシートに記録
-    try:
-        record_study_log({
-            "datetime": datetime.datetime.now().isoformat(),
-            "user_id": user_id,
-            "subject": subject,
-            "minutes": minutes,
-            "raw_message": text
-        })
-        reply = f"✅ 「{subject}」を{minutes}分 記録しました！"
-    except Exception as e:
-        reply = f"❌ スプレッドシート記録中にエラーが発生しました: {e}"
+# LINE API の 4xx（期限切れの reply token など）は再試行しても成功しない
+# 保存先の失敗は再試行する。保存のあとの返信だけが失敗した場合は、event_journal で返信だけやり直す
+def is_retryable_error(exc):
+    if isinstance(exc, LineBotApiError):
+        return exc.status_code == 429 or exc.status_code >= 500
+    return True
+
+def event_user_key(event_dict):
+    source = event_dict.get("source", {})
+    return source.get("userId") or source.get("groupId") or source.get("roomId") or ""
 
-    line_bot_api.reply_message(event.reply_token, TextSendMessage(text=reply))
+# 再送（同じ webhookEventId）はシートにも返信にも届く前に捨てる
+event_deduper = create_deduper_from_env()
+
+def fresh_events(events):
+    return [e for e in events if event_deduper.check_and_mark(e.get("webhookEventId"))]
+
+def forget_events(events):
+    # 処理できなかったイベントは、LINE の再送を受け付けられるように記録から外す
+    for e in events:
+        event_deduper.forget(e.get("webhookEventId"))
+
+event_queue = None
+if ASYNC_WEBHOOK:
+    event_queue = EventQueue(os.getenv("EVENT_QUEUE_PATH", "event_queue.sqlite3"))
+    worker_pool = EventWorkerPool(
+        event_queue, dispatch_event,
+        workers=int(os.getenv("EVENT_WORKERS", "4")),
+        is_retryable=is_retryable_error
+    )
+    worker_pool.start()
 
 # =========================
 # 🚪 Webhookエンドポイント
@@ -149,12 +188,69 @@ def handle_message(event):
 def callback():
     signature = request.headers['X-Line-Signature']
     body = request.get_data(as_text=True)
-    try:
-        handler.handle(body, signature)
-    except InvalidSignatureError:
+
+    with span("webhook.signature"):
+        valid = handler.parser.signature_validator.validate(body, signature)
+    if not valid:
         abort(400)
+
+    with span("webhook.dedupe"):
+        events = fresh_events(json.loads(body).get("events", []))
+    if not events:
+        return 'OK'
+
+    if ASYNC_WEBHOOK:
+        with span("webhook.enqueue"):
+            try:
+                event_queue.enqueue([(event_user_key(e), e) for e in events])
+            except Exception:
+                forget_events(events)
+                raise
+        return 'OK'
+
+    with span("webhook.handle"):
+        for i, event in enumerate(events):
+            try:
+                dispatch_event(event)
+            except Exception:
+                # 失敗したイベントと、まだ処理していない後ろのイベントは再送で処理し直す
+                # （保存まで終わっていたイベントは event_journal が保存を飛ばす）
+                forget_events(events[i:])
+                raise
     return 'OK'
 
-if __name__ == '__main__':
+# 📊 キューの深さと遅延
+@app.route("/queue/stats", methods=['GET'])
+def queue_stats():
+    if event_queue is None:
+        return {"enabled": False}
+    return {"enabled": True, **event_queue.stats()}
+
+# 🖼️ グラフ画像（見られたときに描き、同じ内容は LRU から返す）
+# /charts/<user_id>/day.png が本体、/charts/<user_id>/day.preview.png が LINE の previewImageUrl 用
+@app.route("/charts/<user_id>/<period>.png", methods=['GET'])
+def chart_image(user_id, period):
+    with span("chart"):
+        chart = get_chart_service().chart(user_id, period, request.args.get("date"), request.args.get("sig"))
+    if chart is None:
+        abort(404)
+    response = Response(chart.png, mimetype="image/png")
+    response.set_etag(chart.etag)
+    response.cache_control.public = True
+    response.cache_control.max_age = chart.max_age
+    # If-None-Match が一致すれば 304（本文なし）にする
+    return response.make_conditional(request)
+
+# 📈 Prometheus 形式のメトリクス（処理段階ごとの所要時間・Google API の呼び出し回数）
+@app.route("/metrics", methods=['GET'])
+def metrics():
+    return Response(render_prometheus(), mimetype="text/plain; version=0.0.4")
+
+def main():
+    # 今週のランキングは最初のリクエストを待たずに作っておく
+    warm_leaderboard()
     port = int(os.environ.get("PORT", 5000))
     app.run(host='0.0.0.0', port=port)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,43 @@
+# bench_message_router.py
+# 旧来の「3本の正規表現を順に試す」分類と、1回走査のルーターの比較
+# 実行: python -m benchmarks.bench_message_router
+
+import re
+import timeit
+
+from data_utils.message_router import route_message
+from data_utils.subject_dict import ALL_SUBJECTS
+
+MESSAGES = [
+    "英語30分",
+    "数学1時間30分",
+    "毎日1時間半",
+    "朝の通知を7時30分にして",
+    "今日は疲れたのでお休み",
+    "英語表現を２時間がんばった",
+]
+
+
+def legacy_route(text):
+    # app.py / parse_goal.py にあった処理と同じ順・同じ書き方
+    if re.search(r"(朝|昼|夕方|夜)の通知を(?:\s*(\d{1,2})(?::|：| |時)?(\d{1,2})?|\s*(\d{1,2})時半)にして", text):
+        return "notify"
+    if re.search(r"毎日(?:(\d+)時間半|(\d+)時間(\d+)分|(\d+)時間|(\d+)分)", text):
+        return "goal"
+    if not re.search(r"([0-9０-９]+)時間([0-9０-９]+)?分?|([0-9０-９]+)時間半|([0-9０-９]+)分|([0-9０-９])半", text):
+        return "unknown"
+    for word in ALL_SUBJECTS:
+        if word in text:
+            return word
+    return "unknown"
+
+
+def main(number=20000):
+    for name, fn in [("legacy", legacy_route), ("message_router", route_message)]:
+        seconds = timeit.timeit(lambda: [fn(m) for m in MESSAGES], number=number)
+        per_call_us = seconds / (number * len(MESSAGES)) * 1e6
+        print(f"{name:>15}: {per_call_us:.2f} µs/message")
+
+
+if __name__ == "__main__":
+    main()
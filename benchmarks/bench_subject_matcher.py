@@ -0,0 +1,35 @@
+# bench_subject_matcher.py
+# 旧来の ALL_SUBJECTS 線形走査と、コンパイル済みマッチャーの比較
+# 実行: python -m benchmarks.bench_subject_matcher
+
+import timeit
+
+from data_utils.subject_dict import ALL_SUBJECTS
+from data_utils.subject_matcher import find_subject
+
+MESSAGES = [
+    "英語30分",
+    "数学III1時間",
+    "今日は英語表現を1時間半やりました",
+    "おうようじょうほうぎじゅつしゃ2時間",
+    "ライティング45分",
+    "何もしていない30分",
+]
+
+
+def linear_scan(text):
+    for word in ALL_SUBJECTS:
+        if word in text:
+            return word
+    return None
+
+
+def main(number=20000):
+    for name, fn in [("linear_scan", linear_scan), ("subject_matcher", find_subject)]:
+        seconds = timeit.timeit(lambda: [fn(m) for m in MESSAGES], number=number)
+        per_call_us = seconds / (number * len(MESSAGES)) * 1e6
+        print(f"{name:>16}: {per_call_us:.2f} µs/message")
+
+
+if __name__ == "__main__":
+    main()
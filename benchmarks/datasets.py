@@ -0,0 +1,68 @@
+# datasets.py
+# ベンチマーク用の合成データ（StudyLog の行・受信メッセージ）。seed が同じなら毎回同じデータになる
+
+import random
+from datetime import date, timedelta
+
+from data_utils.subject_dict import ALL_SUBJECTS
+
+END_DATE = date(2026, 10, 18)
+DURATIONS = ["15分", "30分", "45分", "1時間", "1時間30分", "1時間半", "2時間", "３０分"]
+
+
+def user_count_for(rows):
+    # 行数が増えるほどユーザーも増やす（1k 行で 20 人、1M 行で 10,000 人）
+    return min(10000, max(20, rows // 100))
+
+
+def synthetic_study_log(rows, users=None, days=90, seed=0, end=END_DATE):
+    """
+    StudyLog と同じ形の dict を rows 件返す。datetime は (user_id, datetime) が重複しないようにする。
+    """
+    rng = random.Random(seed)
+    users = users or user_count_for(rows)
+    user_ids = [f"U{seed:04d}{i:08d}" for i in range(users)]
+    subjects = ALL_SUBJECTS[:60]
+    records = []
+    for i in range(rows):
+        day = end - timedelta(days=rng.randrange(days))
+        seconds = rng.randrange(86400)
+        subject = rng.choice(subjects)
+        minutes = rng.choice((15, 30, 45, 60, 90, 120))
+        records.append({
+            "datetime": f"{day.isoformat()}T{seconds // 3600:02}:{seconds // 60 % 60:02}:{seconds % 60:02}.{i:06d}",
+            "user_id": rng.choice(user_ids),
+            "subject": subject,
+            "minutes": minutes,
+            "raw_message": f"{subject}{minutes}分"
+        })
+    return records
+
+
+def synthetic_goal_rows(user_ids, day=END_DATE, seed=0):
+    """
+    (row_no, user_id, value)。半分ほどのユーザーが目標を設定している想定。
+    """
+    rng = random.Random(seed)
+    return [(row_no, uid, rng.choice((30, 60, 90, 120)))
+            for row_no, uid in enumerate((u for u in user_ids if rng.random() < 0.5), start=2)]
+
+
+def synthetic_messages(count, seed=0):
+    """
+    webhook に届くメッセージの混ぜ合わせ（学習記録が多め、通知・目標・雑談が少し）。
+    """
+    rng = random.Random(seed)
+    subjects = ALL_SUBJECTS
+    messages = []
+    for _ in range(count):
+        roll = rng.random()
+        if roll < 0.7:
+            messages.append(f"{rng.choice(subjects)}{rng.choice(DURATIONS)}")
+        elif roll < 0.8:
+            messages.append(f"毎日{rng.choice(DURATIONS)}")
+        elif roll < 0.9:
+            messages.append(f"{rng.choice(['朝', '昼', '夕方', '夜'])}の通知を{rng.randrange(1, 12)}時{rng.choice(['', '30分', '半'])}にして")
+        else:
+            messages.append(rng.choice(["今日は疲れたのでお休み", "ありがとう", "明日がんばる", "テスト前で焦ってる"]))
+    return messages
@@ -0,0 +1,110 @@
+# import_budget.py
+# 各エントリーポイントを `python -X importtime` で読み込み、起動時間の予算と「読み込んではいけない重いモジュール」を確かめる
+# 実行: python -m benchmarks.import_budget
+#       python -m benchmarks.import_budget --only app --scale 2.0
+
+import argparse
+import os
+import re
+import subprocess
+import sys
+
+# import しただけでは読み込まない（使うときに読み込む）モジュール
+FORBIDDEN_MODULES = ("pandas", "numpy", "matplotlib", "gspread", "google.auth", "googleapiclient", "requests")
+
+# エントリーポイント -> import の予算（ミリ秒、自分以下の累計）
+# app は Flask / LINE SDK を読み込むので大きめ。requests は LINE SDK が使うので禁止リストから外す
+ENTRY_POINTS = {
+    "graph_generator.generate_and_send_graphs": {"budget_ms": 150},
+    "graph_generator.split_by_user": {"budget_ms": 150},
+    "generate_and_send_goal_report": {"budget_ms": 150},
+    "push_schedulers.scheduler": {"budget_ms": 150},
+    "spreadsheet_utils.study_rollup": {"budget_ms": 100},
+    "app": {"budget_ms": 1500, "allowed": ("requests",)},
+}
+
+# import time:   self [us] | cumulative | imported package
+_LINE = re.compile(r"^import time:\s+(\d+)\s*\|\s*(\d+)\s*\|(\s*)(\S+)\s*$")
+
+
+def parse_importtime(stderr):
+    """
+    -X importtime の出力から {モジュール名: 累計マイクロ秒} を返す。
+    """
+    cumulative = {}
+    for line in stderr.splitlines():
+        m = _LINE.match(line)
+        if m:
+            name = m.group(4)
+            cumulative[name] = max(cumulative.get(name, 0), int(m.group(2)))
+    return cumulative
+
+
+def find_forbidden(modules, forbidden):
+    """
+    読み込まれたモジュールのうち、forbidden（またはその子パッケージ）に当たるもの。
+    """
+    hits = set()
+    for name in modules:
+        for bad in forbidden:
+            if name == bad or name.startswith(bad + "."):
+                hits.add(bad)
+    return sorted(hits)
+
+
+def measure_import(module, cwd=None):
+    """
+    新しいプロセスで module を import する。戻り値: (returncode, {モジュール名: 累計µs}, stderr)
+    """
+    env = dict(os.environ, PYTHONDONTWRITEBYTECODE="1")
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True, text=True, cwd=cwd, env=env
+    )
+    return proc.returncode, parse_importtime(proc.stderr), proc.stderr
+
+
+def check(entries, scale=1.0, cwd=None):
+    """
+    各エントリーポイントを測って結果の一覧を返す。
+    依存パッケージが入っていない環境では、その entry は skipped にする（違反には数えない）。
+    """
+    results = []
+    for module, spec in entries.items():
+        returncode, cumulative, stderr = measure_import(module, cwd=cwd)
+        if returncode != 0:
+            missing = re.search(r"No module named '([^']+)'", stderr)
+            reason = f"missing {missing.group(1)}" if missing else (stderr.strip().splitlines() or ["error"])[-1]
+            results.append({"module": module, "skipped": reason})
+            print(f"⏭️  {module:<44} skipped ({reason})")
+            continue
+
+        elapsed_ms = cumulative.get(module, 0) / 1000
+        budget_ms = spec["budget_ms"] * scale
+        forbidden = [m for m in FORBIDDEN_MODULES if m not in spec.get("allowed", ())]
+        heavy = find_forbidden(cumulative, forbidden)
+        ok = elapsed_ms <= budget_ms and not heavy
+        results.append({"module": module, "ms": elapsed_ms, "budget_ms": budget_ms, "heavy": heavy, "ok": ok})
+        mark = "✅" if ok else "❌"
+        note = f"  重いモジュール: {', '.join(heavy)}" if heavy else ""
+        print(f"{mark} {module:<44} {elapsed_ms:8.1f} ms / {budget_ms:.0f} ms{note}")
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="エントリーポイントの import 時間の予算チェック")
+    parser.add_argument("--only", default="", help="測るモジュール名（カンマ区切り）")
+    parser.add_argument("--scale", type=float, default=float(os.getenv("IMPORT_BUDGET_SCALE", "1.0")),
+                        help="遅いマシン向けに予算を何倍にするか")
+    args = parser.parse_args(argv)
+
+    only = {s.strip() for s in args.only.split(",") if s.strip()}
+    entries = {m: spec for m, spec in ENTRY_POINTS.items() if not only or m in only}
+    results = check(entries, scale=args.scale)
+    violations = [r for r in results if r.get("ok") is False]
+    print(f"{len(violations)} 件の予算超過")
+    return 1 if violations else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,215 @@
+# run.py
+# 解析・集計・描画のホットパスをまとめて測り、JSON に保存する。保存した結果同士を比べて退行を見つける
+# 実行:    python -m benchmarks.run --sizes 1000,100000,1000000 --output bench.json
+# 比較:    python -m benchmarks.run --compare old.json new.json --threshold 1.2
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+from benchmarks.datasets import END_DATE, synthetic_goal_rows, synthetic_messages, synthetic_study_log
+
+DEFAULT_SIZES = [1000, 100000, 1000000]
+MESSAGE_COUNT = 5000
+TODAY = END_DATE.strftime("%Y/%m/%d")
+
+
+def measure(fn, repeat):
+    """
+    fn を repeat 回実行し、各回の秒数を返す。
+    """
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - started)
+    return timings
+
+
+# =========================
+# 💬 メッセージ解析（webhook の経路）
+# =========================
+def message_cases(messages):
+    from data_utils.message_router import parse_notification, parse_study_minutes, route_message
+    from data_utils.subject_matcher import find_subject
+    from goal_manager.parse_goal import parse_daily_goal_message
+
+    # app.parse_message は parse_notification をそのまま呼ぶ（app は LINE SDK を読み込むので直接使う）
+    return {
+        "parse_message": lambda: [parse_notification(m) for m in messages],
+        "study_time_regex": lambda: [parse_study_minutes(m) for m in messages],
+        "parse_daily_goal_message": lambda: [parse_daily_goal_message(m) for m in messages],
+        "subject_match": lambda: [find_subject(m) for m in messages],
+        "route_message": lambda: [route_message(m) for m in messages],
+    }
+
+
+# =========================
+# 📊 集計・描画（夜のジョブの経路）
+# =========================
+def dataset_cases(records):
+    """
+    戻り値: ({ケース名: 関数 または (関数, op 数)}, {スキップしたケース名: 理由})
+    op 数を省いたものはデータの行数で割る。
+    """
+    from spreadsheet_utils.study_rollup import StudyRollup
+    from storage.local_backend import LocalStorage
+
+    cases = {}
+
+    def rollup_apply():
+        StudyRollup().apply(records)
+
+    cases["rollup_apply"] = rollup_apply
+
+    rollup = StudyRollup()
+    rollup.apply(records)
+    # 参照は1回の問い合わせを1 op として数える
+    cases["rollup_rows_on"] = (lambda: rollup.rows_on(TODAY), 1)
+
+    local = LocalStorage()
+    local.append_study_logs(records)
+    cases["local_storage_rows_on"] = (lambda: local.study_rows_on(TODAY), 1)
+
+    # ここから先は pandas / matplotlib が必要
+    try:
+        import pandas as pd
+        from goal_manager.report_engine import build_goal_report
+    except ImportError as e:
+        return cases, {"goal_report": str(e), "chart_aggregate": str(e), "generate_graph": str(e)}
+
+    user_ids = sorted({r["user_id"] for r in records})
+    goal_rows = synthetic_goal_rows(user_ids)
+    study_rows = [(r["user_id"], r["subject"], r["minutes"]) for r in records]
+    cases["goal_report"] = lambda: build_goal_report(user_ids, goal_rows, study_rows)
+
+    skipped = {}
+    try:
+        import graph_generator.generate_and_send_graphs as graphs
+    except ImportError as e:
+        skipped["chart_aggregate"] = skipped["generate_graph"] = str(e)
+        return cases, skipped
+
+    frame = pd.DataFrame(
+        [(r["user_id"], r["datetime"][:10].replace("-", "/"), r["subject"], r["minutes"]) for r in records],
+        columns=["user_id", "date", "subject", "minutes"]
+    )
+    cases["chart_aggregate"] = lambda: graphs.aggregate_stage(frame, END_DATE)
+
+    # generate_graph は1ユーザー分の DataFrame を受け取って描画する（全件の groupby も含めて測る）
+    graphs.STATIC_DIR = tempfile.mkdtemp(prefix="bench_charts_")
+    cases["generate_graph"] = lambda: graphs.generate_graph(frame, "Ubench", "day", "2026/10/01")
+    return cases, skipped
+
+
+def run(sizes, repeat, only=None):
+    results = []
+
+    def record(name, size, ops, timings=None, skipped=None):
+        if only and name not in only:
+            return
+        entry = {"name": name, "size": size}
+        if skipped:
+            entry["skipped"] = skipped
+            print(f"⏭️  {name:<26} size={size:>8}: skipped ({skipped})")
+        else:
+            median = statistics.median(timings)
+            entry.update({
+                "repeat": len(timings),
+                "best_s": min(timings),
+                "median_s": median,
+                "ops": ops,
+                "per_op_us": median / ops * 1e6,
+            })
+            print(f"⏱️  {name:<26} size={size:>8}: median {median * 1e3:9.2f} ms  ({entry['per_op_us']:.2f} µs/op)")
+        results.append(entry)
+
+    messages = synthetic_messages(MESSAGE_COUNT)
+    for name, fn in message_cases(messages).items():
+        if not only or name in only:
+            record(name, len(messages), len(messages), measure(fn, repeat))
+
+    for size in sizes:
+        records = synthetic_study_log(size)
+        cases, skipped = dataset_cases(records)
+        for name, case in cases.items():
+            fn, ops = case if isinstance(case, tuple) else (case, size)
+            if not only or name in only:
+                record(name, size, ops, measure(fn, repeat))
+        for name, reason in skipped.items():
+            record(name, size, size, skipped=reason)
+    return results
+
+
+def metadata():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "commit": commit,
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+    }
+
+
+# =========================
+# 🔍 比較
+# =========================
+def compare(old_path, new_path, threshold):
+    """
+    (name, size) ごとに median の比（new / old）を出す。threshold を超えたものがあれば 1 を返す。
+    """
+    with open(old_path, encoding="utf-8") as f:
+        old = {(r["name"], r["size"]): r for r in json.load(f)["results"] if "median_s" in r}
+    with open(new_path, encoding="utf-8") as f:
+        new = {(r["name"], r["size"]): r for r in json.load(f)["results"] if "median_s" in r}
+
+    regressions = 0
+    for key in sorted(old.keys() & new.keys()):
+        ratio = new[key]["median_s"] / old[key]["median_s"]
+        mark = "❌" if ratio > threshold else "✅"
+        regressions += ratio > threshold
+        print(f"{mark} {key[0]:<26} size={key[1]:>8}: {old[key]['median_s'] * 1e3:9.2f} ms → "
+              f"{new[key]['median_s'] * 1e3:9.2f} ms  (x{ratio:.2f})")
+    print(f"{regressions} 件の退行（しきい値 x{threshold}）")
+    return 1 if regressions else 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="StudyMeBot のホットパスのベンチマーク")
+    parser.add_argument("--sizes", default=",".join(str(s) for s in DEFAULT_SIZES),
+                        help="合成 StudyLog の行数（カンマ区切り）")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--only", default="", help="測るケース名（カンマ区切り）")
+    parser.add_argument("--output", help="結果を書き出す JSON ファイル")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"), help="2つの結果ファイルを比較する")
+    parser.add_argument("--threshold", type=float, default=1.2, help="退行とみなす比（new / old）")
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        return compare(args.compare[0], args.compare[1], args.threshold)
+
+    sizes = [int(s) for s in args.sizes.split(",") if s.strip()]
+    only = {s.strip() for s in args.only.split(",") if s.strip()}
+    results = run(sizes, args.repeat, only)
+    report = {"meta": metadata(), "results": results}
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"💾 {args.output} に保存しました")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,184 @@
+# message_router.py
+# 受信テキストを1回だけ正規化し、1回の走査で「通知変更 / 毎日目標 / 学習記録」を判定する
+
+import re
+from dataclasses import dataclass
+from typing import Optional
+
+from data_utils.subject_matcher import find_subject
+
+# 全角数字・コロン・スペースを半角に（含まれているときだけ変換する）
+_HALF_WIDTH = str.maketrans("０１２３４５６７８９：　", "0123456789: ")
+_FULL_WIDTH_RE = re.compile(r"[０-９：　]")
+
+NOTIFY_PATTERN = (
+    r"(?P<period>朝|昼|夕方|夜)の通知を\s*"
+    r"(?:(?P<n_half>\d{1,2})時半|(?P<n_hour>\d{1,2})(?::| |時)?(?P<n_min>\d{1,2})?分?)にして"
+)
+GOAL_PATTERN = (
+    r"毎日(?:(?P<g_half>\d+)時間半|(?P<g_hm_hour>\d+)時間(?P<g_hm_min>\d+)分"
+    r"|(?P<g_hour>\d+)時間|(?P<g_min>\d+)分)"
+)
+STUDY_PATTERN = (
+    r"(?P<s_half>\d+)時間半|(?P<s_hour>\d+)時間(?P<s_hour_min>\d+)?分?"
+    r"|(?P<s_min>\d+)分|(?P<s_x_half>\d)半"
+)
+
+# 「ランキング」「ランキング 英語」（科目は省略可）
+LEADERBOARD_RE = re.compile(r"^ランキング\s*(?P<rest>.*)$")
+
+NOTIFY_RE = re.compile(NOTIFY_PATTERN)
+GOAL_RE = re.compile(GOAL_PATTERN)
+STUDY_RE = re.compile(STUDY_PATTERN)
+# 3種類をまとめた1本の正規表現（優先度：通知 > 目標 > 学習記録）
+# 先頭の先読みで、どのパターンも始まりえない位置をすぐに飛ばす
+ROUTER_RE = re.compile(
+    f"(?=[朝昼夕夜毎0-9])"
+    f"(?:(?P<notify>{NOTIFY_PATTERN})|(?P<goal>{GOAL_PATTERN})|(?P<study>{STUDY_PATTERN}))"
+)
+
+
+# =========================
+# 🧾 コマンド
+# =========================
+@dataclass
+class NotificationCommand:
+    period: str
+    time: str
+
+
+@dataclass
+class DailyGoalCommand:
+    goal: dict
+
+
+@dataclass
+class StudyLogCommand:
+    subject: str
+    minutes: int
+
+
+@dataclass
+class LeaderboardCommand:
+    subject: Optional[str] = None
+
+
+@dataclass
+class UnknownCommand:
+    # "format"：時間が読み取れない / "subject"：科目が見つからない
+    reason: str
+    minutes: Optional[int] = None
+
+
+def normalize_message(text):
+    text = text.strip()
+    if _FULL_WIDTH_RE.search(text):
+        text = text.translate(_HALF_WIDTH)
+    return text
+
+
+# 通知の時間帯を24時間制に変換
+def convert_to_24h(time_str, period):
+    hour, minute = map(int, time_str.split(":"))
+    if period == "朝" and hour == 12:
+        hour = 0
+    elif period in ["昼", "夕方", "夜"] and hour < 12:
+        hour += 12
+    return f"{hour:02}:{minute:02}"
+
+
+# =========================
+# 🔧 マッチからの値の取り出し
+# =========================
+def _notification_from(match):
+    period = match.group("period")
+    if match.group("n_half"):
+        hour, minute = int(match.group("n_half")), 30
+    else:
+        hour = int(match.group("n_hour"))
+        minute = int(match.group("n_min")) if match.group("n_min") else 0
+    return NotificationCommand(period, convert_to_24h(f"{hour}:{minute}", period))
+
+
+def _goal_minutes_from(match):
+    if match.group("g_half"):  # 1時間半
+        return int(match.group("g_half")) * 60 + 30
+    if match.group("g_hm_hour"):  # 1時間30分
+        return int(match.group("g_hm_hour")) * 60 + int(match.group("g_hm_min"))
+    if match.group("g_hour"):  # 1時間
+        return int(match.group("g_hour")) * 60
+    return int(match.group("g_min"))  # 30分
+
+
+def _goal_from(match):
+    return {"unit": "daily", "type": "time", "value": _goal_minutes_from(match)}
+
+
+def _study_minutes_from(match):
+    if match.group("s_half"):  # 1時間半
+        return int(match.group("s_half")) * 60 + 30
+    if match.group("s_hour"):  # 1時間 or 1時間30分
+        minutes = int(match.group("s_hour")) * 60
+        if match.group("s_hour_min"):
+            minutes += int(match.group("s_hour_min"))
+        return minutes
+    if match.group("s_min"):  # 30分など
+        return int(match.group("s_min"))
+    return 30  # 「1半」など
+
+
+# =========================
+# 🚦 ルーター
+# =========================
+def route_message(text):
+    """
+    テキストを分類して NotificationCommand / DailyGoalCommand / StudyLogCommand / LeaderboardCommand /
+    UnknownCommand を返す。
+    """
+    normalized = normalize_message(text)
+    leaderboard = LEADERBOARD_RE.match(normalized)
+    if leaderboard:
+        rest = leaderboard.group("rest").strip()
+        if not rest:
+            return LeaderboardCommand()
+        subject = find_subject(rest)
+        return LeaderboardCommand(subject) if subject else UnknownCommand("subject")
+    found = {}
+    for match in ROUTER_RE.finditer(normalized):
+        # 外側のグループが最後に閉じるので lastgroup が種別になる
+        kind = match.lastgroup
+        found.setdefault(kind, match)
+        if kind == "notify":
+            break
+
+    if "notify" in found:
+        return _notification_from(found["notify"])
+    if "goal" in found:
+        return DailyGoalCommand(_goal_from(found["goal"]))
+    if "study" not in found:
+        return UnknownCommand("format")
+
+    minutes = _study_minutes_from(found["study"])
+    subject = find_subject(normalized)
+    if not subject:
+        return UnknownCommand("subject", minutes)
+    return StudyLogCommand(subject, minutes)
+
+
+# 個別に使う場合の入口（既存の呼び出し元との互換用）
+def parse_notification(text):
+    match = NOTIFY_RE.search(normalize_message(text))
+    if not match:
+        return False, None, None
+    command = _notification_from(match)
+    return True, command.period, command.time
+
+
+def parse_daily_goal(text):
+    match = GOAL_RE.search(normalize_message(text))
+    return _goal_from(match) if match else None
+
+
+def parse_study_minutes(text):
+    match = STUDY_RE.search(normalize_message(text))
+    return _study_minutes_from(match) if match else None
@@ -34,3 +34,27 @@ ALL_SUBJECTS = [
         "プログラミング", "ぷろぐらみんぐ", "タイピング", "たいぴんぐ", "パソコン", "ぱそこん",
         "資料作成", "しりょうさくせい", "Excel", "えくせる", "プレゼン", "ぷれぜん", "ライティング", "らいてぃんぐ"
  ]
+
+# ひらがな表記 → 集計に使う正式名
+SUBJECT_ALIASES = {
+    "りとみっく": "リトミック", "ぴあの": "ピアノ", "ばいおりん": "バイオリン", "しょどう": "書道",
+    "すいえい": "水泳", "だんす": "ダンス", "すいみんぐ": "スイミング", "えいかいわ": "英会話",
+    "からて": "空手", "けんどう": "剣道", "こくご": "国語", "さんすう": "算数",
+    "りか": "理科", "しゃかい": "社会", "おんがく": "音楽", "ずこう": "図工",
+    "たいいく": "体育", "かていか": "家庭科", "どうとく": "道徳", "せいかつ": "生活",
+    "すうがく": "数学", "えいご": "英語", "れきし": "歴史", "ちり": "地理",
+    "こうみん": "公民", "ぎじゅつ": "技術", "びじゅつ": "美術", "ほけんたいいく": "保健体育",
+    "げんだいぶん": "現代文", "こてん": "古典", "かんぶん": "漢文", "すうがく1": "数学I",
+    "すうがくA": "数学A", "すうがく2": "数学II", "すうがくB": "数学B", "すうがく3": "数学III",
+    "えいごひょうげん": "英語表現", "りすにんぐ": "リスニング", "ぶつり": "物理", "かがく": "化学",
+    "せいぶつ": "生物", "ちがく": "地学", "にほんし": "日本史", "せかいし": "世界史",
+    "りんり": "倫理", "せいじけいざい": "政治経済", "じょうほう": "情報", "げいじゅつ": "芸術",
+    "とうけいがく": "統計学", "けいざいがく": "経済学", "しんりがく": "心理学", "てつがく": "哲学",
+    "ぶんがく": "文学", "ほうがく": "法学", "きょういくがく": "教育学", "げんごがく": "言語学",
+    "かんごがく": "看護学", "とーいっく": "TOEIC", "とーふる": "TOEFL", "えいけん": "英検",
+    "かんけん": "漢検", "すうけん": "数検", "にっしょうぼき": "日商簿記", "たっけん": "宅建",
+    "あいてぃーぱすぽーと": "ITパスポート", "きほんじょうほうぎじゅつしゃ": "基本情報技術者", "おうようじょうほうぎじゅつしゃ": "応用情報技術者", "えふぴー": "FP",
+    "ぼき": "簿記", "こうむいんしけん": "公務員試験", "えすぴーあい": "SPI", "ぷろぐらみんぐ": "プログラミング",
+    "たいぴんぐ": "タイピング", "ぱそこん": "パソコン", "しりょうさくせい": "資料作成", "えくせる": "Excel",
+    "ぷれぜん": "プレゼン", "らいてぃんぐ": "ライティング"
+}
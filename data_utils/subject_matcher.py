@@ -0,0 +1,122 @@
+# subject_matcher.py
+# ALL_SUBJECTS を Aho-Corasick オートマトンにして、1回の走査で最長一致の科目を見つける
+
+import unicodedata
+from collections import deque
+
+from data_utils.subject_dict import ALL_SUBJECTS, SUBJECT_ALIASES
+
+
+# 数字で終わる表記（すうがく3 など）の直後にこれが続くときは、数字を時間の一部とみなす
+TIME_FOLLOWERS = set("0123456789時分半")
+
+
+def normalize_text(text):
+    """
+    全角英数・ローマ数字（Ⅲ → III）・半角カナをそろえ、英字は小文字にする。
+    """
+    if not unicodedata.is_normalized("NFKC", text):
+        text = unicodedata.normalize("NFKC", text)
+    return text.casefold()
+
+
+class SubjectMatcher:
+    """
+    パターン集合からオートマトンを一度だけ作る。
+    match() はテキスト中の全出現から「最も長いもの（同じ長さなら先に出たもの）」を選び、
+    ひらがな表記は正式名に置き換えて返す。
+    """
+
+    def __init__(self, subjects, aliases=None):
+        aliases = aliases or {}
+        self._goto = [{}]
+        self._fail = [0]
+        # そのノードで終わる最長パターンの (長さ, 正式名)
+        self._output = [None]
+
+        for word in dict.fromkeys(subjects):
+            canonical = aliases.get(word, word)
+            self._add(normalize_text(word), canonical)
+        self._build_fail_links()
+
+    def _add(self, pattern, canonical):
+        node = 0
+        for ch in pattern:
+            nxt = self._goto[node].get(ch)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[node][ch] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append(None)
+            node = nxt
+        self._output[node] = (len(pattern), canonical)
+
+    def _build_fail_links(self):
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for ch, child in self._goto[node].items():
+                queue.append(child)
+                fail = self._fail[node]
+                while fail and ch not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[child] = self._goto[fail].get(ch, 0)
+                # 接尾辞にあたるより短いパターンも、自分に出力がなければ引き継ぐ
+                if self._output[child] is None:
+                    self._output[child] = self._output[self._fail[child]]
+
+        # 失敗リンクをたどる遷移を前計算して、1文字あたり辞書参照1回の DFA にする
+        self._delta = [None] * len(self._goto)
+        self._delta[0] = dict(self._goto[0])
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            delta = dict(self._delta[self._fail[node]])
+            delta.update(self._goto[node])
+            self._delta[node] = delta
+            queue.extend(self._goto[node].values())
+
+    def find_all(self, text):
+        """
+        (開始位置, 長さ, 正式名) を出現順に返す（各終了位置につき最長のもの）。
+        """
+        text = normalize_text(text)
+        delta, output = self._delta, self._output
+        node = 0
+        matches = []
+        for i, ch in enumerate(text):
+            node = delta[node].get(ch, 0)
+            hit = output[node]
+            if hit is None:
+                continue
+            # 「すうがく30分」の「すうがく3」は数学IIIではない
+            if ch.isdigit() and i + 1 < len(text) and text[i + 1] in TIME_FOLLOWERS:
+                continue
+            matches.append((i - hit[0] + 1, hit[0], hit[1]))
+        return matches
+
+    def match(self, text):
+        # find_all と同じ走査だが、リストを作らずに最長のものだけ残す
+        text = normalize_text(text)
+        delta, output = self._delta, self._output
+        node = 0
+        best_len, best = 0, None
+        last = len(text) - 1
+        for i, ch in enumerate(text):
+            node = delta[node].get(ch, 0)
+            hit = output[node]
+            if hit is None or hit[0] <= best_len:
+                continue
+            if ch.isdigit() and i < last and text[i + 1] in TIME_FOLLOWERS:
+                continue
+            best_len, best = hit
+        return best
+
+
+# import 時に一度だけ構築する
+SUBJECT_MATCHER = SubjectMatcher(ALL_SUBJECTS, SUBJECT_ALIASES)
+
+
+def find_subject(text):
+    return SUBJECT_MATCHER.match(text)
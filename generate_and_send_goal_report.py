@@ -1,50 +1,52 @@
 # generate_and_send_goal_report.py
+# 実行: python generate_and_send_goal_report.py
+# import しただけでは通信しない。pandas / requests は main() の中で読み込む
 
-from spreadsheet_utils.spreadsheet_utils import get_today_goal, get_today_study_minutes, get_all_user_ids
-from linebot import LineBotApi
+from storage import get_storage
+from metrics_utils.metrics import span, dump_metrics
+from spreadsheet_utils.quota_governor import BULK, set_default_priority
 from datetime import datetime
-import os
 
-# LINE Bot API 初期化
-line_bot_api = LineBotApi(os.getenv("LINE_CHANNEL_ACCESS_TOKEN"))
-
-# LINEにメッセージを送信する関数
-def send_line_message(user_id, message):
-    from linebot.models import TextSendMessage
-    from linebot.exceptions import LineBotApiError
-
-    try:
-        line_bot_api.push_message(user_id, TextSendMessage(text=message))
-        print(f"✅ メッセージ送信成功: {user_id}")
-    except LineBotApiError as e:
-        print(f"❌ メッセージ送信失敗: {user_id} → {e}")
-    except Exception as e:
-        print(f"⚠️ 予期しないエラー: {user_id} → {e}")
-
-# メイン処理
+# メイン処理（各シートは1回だけ読み、全ユーザー分を一括で集計する）
 def generate_and_send_goal_report():
+    from goal_manager.report_engine import build_goal_report
+    from line_utils.line_delivery import LineDelivery, text_message
+
+    # webhook の書き込みにクォータを譲る
+    set_default_priority(BULK)
     today = datetime.now().strftime("%Y/%m/%d")
-    user_ids = get_all_user_ids()
+    storage = get_storage()
+    with span("report.fetch"):
+        user_ids = storage.user_ids()
+        goal_rows = storage.goal_rows_on(today)
+        study_rows = storage.study_rows_on(today)
     print(f"🎯 取得したユーザーID一覧: {user_ids}")
     valid_user_ids = [uid for uid in user_ids if uid.startswith("U")]
     print(f"✅ 有効なユーザーID: {valid_user_ids}")
 
-    for user_id in valid_user_ids: 
-        goal_minutes = get_today_goal(user_id, today)
-        study_minutes = get_today_study_minutes(user_id, today)
+    with span("report.build"):
+        report = build_goal_report(valid_user_ids, goal_rows, study_rows)
+    items = [(user_id, [text_message(message)]) for user_id, message in zip(report["user_id"], report["message"])]
 
-        if goal_minutes:
-            rate = int((study_minutes / goal_minutes) * 100) if goal_minutes > 0 else 0
-            diff = goal_minutes - study_minutes
-            if study_minutes >= goal_minutes:
-                comment = "🎉 目標達成！素晴らしい一日でした！"
-            else:
-                comment = f"💡 あと{diff}分で目標達成です！あと少し！"
-            message = f"📊 今日の記録：{study_minutes}分 ／ 目標：{goal_minutes}分（達成率 {rate}%）\n{comment}"
-        else:
-            message = "📌 今日の目標が未設定です。明日はぜひ設定してみましょう！"
+    # 「目標が未設定です」など同じ文面は multicast にまとめて送る
+    delivery = LineDelivery()
+    try:
+        with span("report.send"):
+            stats = delivery.send_all(items)
+    finally:
+        delivery.close()
+    print(f"📨 送信結果: {stats}")
+
+    # 夜のジョブのついでに、同じ日の古い目標行を片付ける（GOAL_RETENTION_DAYS を指定すれば期限切れも）
+    try:
+        with span("report.compact_goals"):
+            storage.compact_goals()
+    except Exception as e:
+        print(f"⚠️ 目標シートの整理に失敗しました: {e}")
+    dump_metrics("goal_report")
 
-        send_line_message(user_id, message)
+def main():
+    generate_and_send_goal_report()
 
 if __name__ == "__main__":
-    generate_and_send_goal_report()
+    main()
@@ -0,0 +1,159 @@
+import os
+import re
+import threading
+from datetime import datetime, timedelta
+
+from spreadsheet_utils.read_replica import normalize_date
+from spreadsheet_utils.study_log_archive import row_ranges
+
+GOAL_COLUMNS = ["user_id", "unit", "type", "value", "start_date", "end_date", "created_at"]
+LAST_COLUMN = "G"
+
+# 指定すると compaction でこの日数より古い目標行も消す（既定の 0 は無効：重複した古い行だけを消す）
+GOAL_RETENTION_DAYS = int(os.getenv("GOAL_RETENTION_DAYS", "0"))
+
+
+# append の応答の updatedRange（"Goals!A5:G5"）から行番号を取り出す
+_UPDATED_ROW = re.compile(r"[A-Z]+(\d+)(?::[A-Z]+\d+)?$")
+
+
+class GoalIndex:
+    """
+    (user_id, start_date) → 行番号 の索引。
+    既存の行はその場で update、新しい行は append で末尾に書く。
+    索引はプロセスごとに持つので、ほかのプロセス（夜間の compact など）が行を動かしても古いまま残る。
+    そのため update の前にその行のキーを読んで確かめ、違っていたら索引を作り直す。
+    """
+
+    def __init__(self, get_worksheet):
+        self._get_worksheet = get_worksheet
+        self._lock = threading.Lock()
+        self._rows = None
+        self._user_col, self._date_col = 0, 4
+
+    def _ensure_index(self):
+        if self._rows is not None:
+            return
+        values = self._get_worksheet().get_all_values()
+        header = values[0] if values else GOAL_COLUMNS
+        self._user_col, self._date_col = header.index("user_id"), header.index("start_date")
+        self._rows = {}
+        for row_no, row in enumerate(values[1:], start=2):
+            if len(row) > self._date_col and row[self._user_col]:
+                # 重複があれば後ろの行を正とする（compaction で片付ける）
+                self._rows[(row[self._user_col], normalize_date(row[self._date_col]))] = row_no
+
+    def _row_has_key(self, ws, row_no, key):
+        row = ws.row_values(row_no)
+        if len(row) <= self._date_col:
+            return False
+        return (row[self._user_col], normalize_date(row[self._date_col])) == key
+
+    def invalidate(self):
+        with self._lock:
+            self._rows = None
+
+    def upsert(self, row_values):
+        """
+        row_values は GOAL_COLUMNS の順。
+        既存の行は「キーの確認1回 + update 1回」、新しい行は append 1回（行の位置は Sheets 側で決まる）。
+        """
+        key = (row_values[0], normalize_date(row_values[4]))
+        with self._lock:
+            self._ensure_index()
+            ws = self._get_worksheet()
+            try:
+                row_no = self._rows.get(key)
+                if row_no is not None and not self._row_has_key(ws, row_no, key):
+                    # 索引が古い（compact で行が消された等）ので作り直してから引き直す
+                    self._rows = None
+                    self._ensure_index()
+                    row_no = self._rows.get(key)
+
+                if row_no is not None:
+                    ws.update(
+                        range_name=f"A{row_no}:{LAST_COLUMN}{row_no}",
+                        values=[row_values],
+                        value_input_option="USER_ENTERED"
+                    )
+                    return row_no
+
+                # 新しい行は append にする（ほかのプロセスと同じ行番号に書いてしまわないように）
+                response = ws.append_row(row_values, value_input_option="USER_ENTERED", table_range="A1")
+            except Exception:
+                self._rows = None
+                raise
+            match = _UPDATED_ROW.search(((response or {}).get("updates") or {}).get("updatedRange", ""))
+            if match is None:
+                self._rows = None
+                return None
+            row_no = int(match.group(1))
+            self._rows[key] = row_no
+            return row_no
+
+    def compact(self, retention_days=GOAL_RETENTION_DAYS, today=None):
+        """
+        同じ (user_id, start_date) の後ろに新しい行がある古い行だけを、下の行から順に消す。
+        シート全体は書き直さないので、ほかのプロセスが同時に行を上書きしても消えない。
+        消す直前にその行を読み直し、読んだときから変わっていれば（上書き・ずれ）その範囲は消さない。
+        retention_days（既定は GOAL_RETENTION_DAYS、0 なら無効）を指定すると、それより古い日付の行も消す。
+        """
+        with self._lock:
+            ws = self._get_worksheet()
+            values = ws.get_all_values()
+            if len(values) <= 1:
+                return 0
+            header = values[0]
+            width = len(header)
+            user_col, date_col = header.index("user_id"), header.index("start_date")
+            cutoff = ""
+            if retention_days:
+                cutoff = ((today or datetime.today()) - timedelta(days=retention_days)).strftime("%Y/%m/%d")
+
+            latest = {}
+            for row_no, row in enumerate(values[1:], start=2):
+                if len(row) > date_col and row[user_col]:
+                    latest[(row[user_col], normalize_date(row[date_col]))] = row_no
+            stale = []
+            for row_no, row in enumerate(values[1:], start=2):
+                if len(row) <= date_col or not row[user_col]:
+                    continue
+                key = (row[user_col], normalize_date(row[date_col]))
+                if latest[key] != row_no or (cutoff and key[1] and key[1] < cutoff):
+                    stale.append(row_no)
+            if not stale:
+                return 0
+
+            ranges = row_ranges(stale)
+            current = ws.batch_get([f"A{start}:{LAST_COLUMN}{end}" for start, end in ranges])
+            removed = 0
+            for (start, end), rows in zip(ranges, current):
+                expected = [_pad(values[row_no - 1], width) for row_no in range(start, end + 1)]
+                if [_pad(row, width) for row in rows] + [[""] * width] * (end - start + 1 - len(rows)) != expected:
+                    print(f"⚠️ 目標シートの {start}〜{end} 行目は読んだあとに変わったので消しません")
+                    continue
+                ws.delete_rows(start, end)
+                removed += end - start + 1
+            self._rows = None
+            print(f"🧹 目標シートを整理しました（{removed} 行削除）")
+            return removed
+
+
+def _pad(row, width):
+    row = [str(v) for v in row[:width]]
+    return row + [""] * (width - len(row))
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_goal_index():
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                from spreadsheet_utils.sheets_client import STUDY_LOG_BOOK, GOAL_SHEET_NAME, get_worksheet
+
+                _index = GoalIndex(lambda: get_worksheet(STUDY_LOG_BOOK, GOAL_SHEET_NAME))
+    return _index
@@ -0,0 +1,43 @@
+import numpy as np
+import pandas as pd
+
+ACHIEVED_COMMENT = "🎉 目標達成！素晴らしい一日でした！"
+NO_GOAL_MESSAGE = "📌 今日の目標が未設定です。明日はぜひ設定してみましょう！"
+
+
+def build_goal_report(user_ids, goal_rows, study_rows):
+    """
+    全ユーザーの目標・学習合計・達成率・コメントを1回の groupby / join で計算する。
+    goal_rows: (row_no, user_id, value) のリスト（同じユーザーは最後の行を使う）
+    study_rows: (user_id, subject, minutes) のリスト
+    戻り値: user_id, goal_minutes, study_minutes, rate, comment, message 列の DataFrame
+    """
+    # 空のリストでも user_id 列を文字列（object）にしておく（float64 になると join で型が合わない）
+    users = pd.DataFrame({"user_id": pd.Series(list(user_ids), dtype=object)})
+
+    goals = pd.DataFrame(goal_rows, columns=["row_no", "user_id", "value"])
+    goals = (goals.sort_values("row_no")
+                  .drop_duplicates("user_id", keep="last")
+                  .set_index("user_id")["value"]
+                  .rename("goal_minutes"))
+
+    logs = pd.DataFrame(study_rows, columns=["user_id", "subject", "minutes"])
+    totals = logs.groupby("user_id")["minutes"].sum().rename("study_minutes")
+
+    report = users.join(goals, on="user_id").join(totals, on="user_id")
+    report["goal_minutes"] = report["goal_minutes"].fillna(0).astype(int)
+    report["study_minutes"] = report["study_minutes"].fillna(0).astype(int)
+
+    has_goal = report["goal_minutes"] > 0
+    safe_goal = report["goal_minutes"].where(has_goal, 1)
+    report["rate"] = np.where(has_goal, (report["study_minutes"] * 100 // safe_goal), 0).astype(int)
+
+    diff = (report["goal_minutes"] - report["study_minutes"]).astype(str)
+    achieved = report["study_minutes"] >= report["goal_minutes"]
+    report["comment"] = np.where(achieved, ACHIEVED_COMMENT, "💡 あと" + diff + "分で目標達成です！あと少し！")
+
+    summary = ("📊 今日の記録：" + report["study_minutes"].astype(str)
+               + "分 ／ 目標：" + report["goal_minutes"].astype(str)
+               + "分（達成率 " + report["rate"].astype(str) + "%）\n" + report["comment"])
+    report["message"] = np.where(has_goal, summary, NO_GOAL_MESSAGE)
+    return report
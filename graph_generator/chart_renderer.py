@@ -0,0 +1,112 @@
+# chart_renderer.py
+# pyplot のグローバル状態を使わずに、Agg バックエンドで図を使い回して描画する
+# matplotlib は最初に描くときに読み込む（タイトルだけ使う呼び出し元には読み込ませない）
+
+import io
+import os
+
+FIGSIZE = (6, 4)
+BAR_COLOR = "skyblue"
+LINE_COLOR = "steelblue"
+
+# プロセスごとに1枚だけ作って使い回す図
+_figure = None
+_axes = None
+
+
+def init_renderer():
+    """
+    ProcessPoolExecutor の initializer。図とキャンバスを1回だけ作る。
+    """
+    global _figure, _axes
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+
+    _figure = Figure(figsize=FIGSIZE)
+    FigureCanvasAgg(_figure)
+    _axes = _figure.add_subplot()
+
+
+def render_bar_chart(subjects, minutes, title, output, dpi=None):
+    """
+    科目別の棒グラフを output（パスまたはファイルオブジェクト）に PNG で保存する。
+    """
+    if _figure is None:
+        init_renderer()
+    _axes.clear()
+    _axes.bar(list(subjects), list(minutes), color=BAR_COLOR)
+    _axes.set_title(title)
+    _axes.set_ylabel("学習時間（分）")
+    _axes.set_xlabel("科目")
+    _axes.tick_params(axis="x", labelrotation=0)
+    _figure.tight_layout()
+    _figure.savefig(output, format="png", dpi=dpi)
+
+
+def render_line_chart(labels, minutes, title, output, dpi=None):
+    """
+    日ごとの学習時間の折れ線グラフを output に PNG で保存する。
+    """
+    if _figure is None:
+        init_renderer()
+    _axes.clear()
+    _axes.plot(list(labels), list(minutes), color=LINE_COLOR, marker="o")
+    _axes.set_title(title)
+    _axes.set_ylabel("学習時間（分）")
+    _axes.set_xlabel("日付")
+    _axes.set_ylim(bottom=0)
+    _axes.tick_params(axis="x", labelrotation=45)
+    _figure.tight_layout()
+    _figure.savefig(output, format="png", dpi=dpi)
+
+
+def bar_chart_title(period_label, minutes):
+    return f"{period_label.upper()}の学習時間 (合計: {sum(minutes)}分)"
+
+
+def trend_chart_title(days):
+    return f"直近{days}日の学習時間の推移"
+
+
+def render_png(kind, labels, minutes, title, dpi=None):
+    """
+    ファイルに書かずに PNG のバイト列を返す（Web の /charts 用）。kind は "bar" か "line"。
+    """
+    buffer = io.BytesIO()
+    render = render_line_chart if kind == "line" else render_bar_chart
+    render(labels, minutes, title, buffer, dpi=dpi)
+    return buffer.getvalue()
+
+
+def render_chart_job(job):
+    """
+    job: (user_id, period_label, subjects, minutes, output_dir)
+    保存したファイル名を返す。
+    """
+    user_id, period_label, subjects, minutes, output_dir = job
+    os.makedirs(output_dir, exist_ok=True)
+    filename = f"study_chart_{period_label}_{user_id}.png"
+    render_bar_chart(subjects, minutes, bar_chart_title(period_label, minutes), os.path.join(output_dir, filename))
+    return filename
+
+
+def render_trend_job(job):
+    """
+    job: (user_id, days, labels, minutes, output_dir)
+    保存したファイル名を返す。
+    """
+    user_id, days, labels, minutes, output_dir = job
+    os.makedirs(output_dir, exist_ok=True)
+    filename = f"study_chart_trend_{user_id}.png"
+    render_line_chart(labels, minutes, trend_chart_title(days), os.path.join(output_dir, filename))
+    return filename
+
+
+def render_job(job):
+    """
+    job: ("bar", ...) なら render_chart_job、("line", ...) なら render_trend_job に渡す。
+    """
+    kind, args = job
+    if kind == "line":
+        return render_trend_job(args)
+    return render_chart_job(args)
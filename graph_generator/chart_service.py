@@ -0,0 +1,226 @@
+# chart_service.py
+# Web の /charts/<user_id>/<period>.png で、見られたときにだけグラフを描く
+# 集計テーブルから1人分のデータを読み、内容のハッシュをキーにした LRU に PNG を置くので、同じ内容は1回しか描かない
+
+import hashlib
+import hmac
+import os
+import threading
+from collections import OrderedDict
+from datetime import date, datetime, timedelta
+from urllib.parse import urlencode
+
+from graph_generator.chart_renderer import bar_chart_title, trend_chart_title
+from graph_generator.graph_settings import BASE_URL, TREND_DAYS, period_starts
+from metrics_utils.metrics import Counter, register, span
+
+PERIODS = ("day", "week", "month", "trend")
+PREVIEW_SUFFIX = ".preview"
+
+# 本体は 600x400px（FIGSIZE 6x4 インチ × 100dpi）、プレビューは 240x160px
+FULL_DPI = 100
+PREVIEW_DPI = 40
+# 描画方法を変えたらここを上げる（古いキャッシュと ETag を無効にする）
+RENDER_VERSION = "1"
+
+CACHE_MAX_ENTRIES = int(os.getenv("CHART_CACHE_MAX_ENTRIES", "512"))
+CACHE_MAX_BYTES = int(os.getenv("CHART_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+MAX_AGE_SECONDS = int(os.getenv("CHART_MAX_AGE_SECONDS", "300"))
+# URL の署名の鍵。署名のない・違う URL には 404 を返す（未設定なら全部 404。ほかの人のグラフを見せない）
+URL_SECRET = os.getenv("CHART_URL_SECRET", "")
+
+CHART_CACHE_REQUESTS = register(Counter(
+    "studymebot_chart_cache_requests_total", "/charts の画像キャッシュの参照数（result=hit/miss）"
+))
+
+
+# =========================
+# 📊 1人分のグラフの中身
+# =========================
+def chart_spec(rows, period, today, trend_days=TREND_DAYS):
+    """
+    rows: 1人分の (user_id, date, subject, minutes)。
+    戻り値: (kind, title, labels, minutes)。その期間に記録がなければ None。
+    """
+    today_str = today.strftime("%Y/%m/%d")
+    if period == "trend":
+        days = [(today - timedelta(days=i)).strftime("%Y/%m/%d") for i in range(trend_days - 1, -1, -1)]
+        totals = dict.fromkeys(days, 0)
+        for _, day, _, minutes in rows:
+            if day in totals:
+                totals[day] += int(minutes)
+        if not any(totals.values()):
+            return None
+        return "line", trend_chart_title(trend_days), [d[5:] for d in days], list(totals.values())
+
+    start = period_starts(today)[period].strftime("%Y/%m/%d")
+    totals = {}
+    for _, day, subject, minutes in rows:
+        if start <= day <= today_str:
+            totals[subject] = totals.get(subject, 0) + int(minutes)
+    if not totals:
+        return None
+    ordered = sorted(totals.items(), key=lambda item: -item[1])
+    subjects, minutes = [s for s, _ in ordered], [m for _, m in ordered]
+    return "bar", bar_chart_title(period, minutes), subjects, minutes
+
+
+def spec_range(today, trend_days=TREND_DAYS):
+    """
+    どの期間のグラフにも足りる読み取り範囲（開始日, 終了日）。
+    """
+    return min(list(period_starts(today).values()) + [today - timedelta(days=trend_days - 1)]), today
+
+
+def content_hash(spec, preview):
+    digest = hashlib.sha256(repr((RENDER_VERSION, preview, spec)).encode("utf-8"))
+    return digest.hexdigest()[:32]
+
+
+# =========================
+# 🔗 URL と署名
+# =========================
+def url_signature(user_id, period, day, secret=URL_SECRET):
+    message = f"{user_id}/{period}/{day.isoformat()}".encode("utf-8")
+    return hmac.new(secret.encode("utf-8"), message, hashlib.sha256).hexdigest()[:16]
+
+
+def chart_url(user_id, period, day, preview=False, base_url=BASE_URL, secret=URL_SECRET):
+    """
+    LINE に送る画像 URL。日付を入れておくので、翌日に開いても送ったときの日のグラフが出る。
+    """
+    query = {"date": day.isoformat(), "sig": url_signature(user_id, period, day, secret)}
+    suffix = PREVIEW_SUFFIX if preview else ""
+    return f"{base_url}/charts/{user_id}/{period}{suffix}.png?{urlencode(query)}"
+
+
+# =========================
+# 🗃️ LRU キャッシュ
+# =========================
+class ChartCache:
+    """
+    {内容のハッシュ: PNG}。件数と合計バイト数の両方で上限を設け、古く使われたものから捨てる。
+    """
+
+    def __init__(self, max_entries=CACHE_MAX_ENTRIES, max_bytes=CACHE_MAX_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._items = OrderedDict()
+        self._bytes = 0
+
+    def get(self, key):
+        with self._lock:
+            png = self._items.get(key)
+            if png is not None:
+                self._items.move_to_end(key)
+            return png
+
+    def put(self, key, png):
+        with self._lock:
+            old = self._items.pop(key, None)
+            if old is not None:
+                self._bytes -= len(old)
+            self._items[key] = png
+            self._bytes += len(png)
+            while self._items and (len(self._items) > self.max_entries or self._bytes > self.max_bytes):
+                _, evicted = self._items.popitem(last=False)
+                self._bytes -= len(evicted)
+
+    def __len__(self):
+        with self._lock:
+            return len(self._items)
+
+    @property
+    def size_bytes(self):
+        with self._lock:
+            return self._bytes
+
+
+class ChartImage:
+    def __init__(self, png, etag, max_age):
+        self.png = png
+        self.etag = etag
+        self.max_age = max_age
+
+
+class ChartService:
+    def __init__(self, storage=None, cache=None, secret=URL_SECRET, renderer=None, clock=datetime.now):
+        self._storage = storage
+        self.cache = cache or ChartCache()
+        self.secret = secret
+        self._renderer = renderer
+        self._clock = clock
+        # chart_renderer は1枚の図を使い回すので、描画は1つずつ
+        self._render_lock = threading.Lock()
+
+    @property
+    def storage(self):
+        if self._storage is None:
+            from storage import get_storage
+
+            self._storage = get_storage()
+        return self._storage
+
+    def _render(self, kind, labels, minutes, title, dpi):
+        if self._renderer is None:
+            from graph_generator.chart_renderer import render_png
+
+            self._renderer = render_png
+        with self._render_lock:
+            return self._renderer(kind, labels, minutes, title, dpi=dpi)
+
+    def chart(self, user_id, period, date_str=None, sig=None):
+        """
+        戻り値: ChartImage。期間・日付・署名が正しくない、またはその期間に記録がなければ None。
+        period が "day.preview" のようにプレビューの印で終わっていれば小さい画像にする。
+        """
+        preview = period.endswith(PREVIEW_SUFFIX)
+        if preview:
+            period = period[:-len(PREVIEW_SUFFIX)]
+        if period not in PERIODS:
+            return None
+
+        today = self._clock().date()
+        try:
+            day = date.fromisoformat(date_str) if date_str else today
+        except ValueError:
+            return None
+        if not self.secret or not hmac.compare_digest(sig or "", url_signature(user_id, period, day, self.secret)):
+            return None
+
+        start, end = spec_range(day)
+        with span("chart.fetch"):
+            rows = self.storage.daily_rows_between(start.strftime("%Y/%m/%d"), end.strftime("%Y/%m/%d"), user_id)
+        spec = chart_spec(rows, period, day)
+        if spec is None:
+            return None
+
+        key = content_hash(spec, preview)
+        png = self.cache.get(key)
+        if png is None:
+            CHART_CACHE_REQUESTS.inc(result="miss")
+            kind, title, labels, minutes = spec
+            with span("chart.render"):
+                png = self._render(kind, labels, minutes, title, PREVIEW_DPI if preview else FULL_DPI)
+            self.cache.put(key, png)
+        else:
+            CHART_CACHE_REQUESTS.inc(result="hit")
+        # 過去の日付のグラフはもう変わりにくいので長めにキャッシュさせる
+        max_age = MAX_AGE_SECONDS if day >= today else MAX_AGE_SECONDS * 12
+        return ChartImage(png, key, max_age)
+
+
+_service = None
+_service_lock = threading.Lock()
+
+
+def get_chart_service():
+    global _service
+    if _service is None:
+        with _service_lock:
+            if _service is None:
+                if not URL_SECRET:
+                    print("⚠️ CHART_URL_SECRET が未設定のため、/charts はすべて 404 を返します")
+                _service = ChartService()
+    return _service
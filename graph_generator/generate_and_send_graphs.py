@@ -1,73 +1,34 @@
+# generate_and_send_graphs.py
+# 実行: python -m graph_generator.generate_and_send_graphs
+# import しただけでは通信しない。pandas / matplotlib / requests は使う段階で読み込む
+
 import os
-import json
-import pandas as pd
-import matplotlib.pyplot as plt
+import sys
 from datetime import datetime, timedelta
-from oauth2client.service_account import ServiceAccountCredentials
-import gspread
-import requests
-import tempfile
-import shutil
-
-# === LINE設定 ===
-LINE_TOKEN = os.getenv("LINE_CHANNEL_ACCESS_TOKEN")  # 環境変数から読み込み
-
-# === Google認証 ===
-def get_credentials_from_env():
-    creds_dict = json.loads(os.environ.get("GOOGLE_CREDS_JSON"))
-    with tempfile.NamedTemporaryFile(mode="w", delete=False, suffix=".json") as f:
-        json.dump(creds_dict, f)
-        return f.name
-
-scope = [
-    'https://spreadsheets.google.com/feeds', 'https://www.googleapis.com/auth/drive'
-]
-cred_path = get_credentials_from_env()
-credentials = ServiceAccountCredentials.from_json_keyfile_name(cred_path, scope)
-gc = gspread.authorize(credentials)
-sh = gc.open("StudyMeBotStudyLog")
-
-# === 日付 ===
-today = datetime.today().date()
-start_of_day = today
-periods = {
-    "day": start_of_day
-}
-
-# === LINE送信関数 ===
-def send_image_to_line(user_id, image_url):
-    headers = {
-        "Authorization": f"Bearer {LINE_TOKEN}",
-        "Content-Type": "application/json"
-    }
-    payload = {
-        "to": user_id,
-        "messages": [{
-            "type": "image",
-            "originalContentUrl": image_url,
-            "previewImageUrl": image_url
-        }]
-    }
-    r = requests.post("https://api.line.me/v2/bot/message/push", headers=headers, json=payload)
-    print(f"Sent to {user_id}: {r.status_code}, {r.text}")
-
-def send_text_to_line(user_id, message):
-    headers = {
-        "Authorization": f"Bearer {LINE_TOKEN}",
-        "Content-Type": "application/json"
-    }
-    payload = {
-        "to": user_id,
-        "messages": [{
-            "type": "text",
-            "text": message
-        }]
-    }
-    r = requests.post("https://api.line.me/v2/bot/message/push", headers=headers, json=payload)
-    print(f"Text sent to {user_id}: {r.status_code}, {r.text}")
-
-# === グラフ生成関数 ===
+from storage import get_storage
+from graph_generator.graph_settings import BASE_URL, TREND_DAYS, period_starts
+from metrics_utils.metrics import span, dump_metrics
+from spreadsheet_utils.quota_governor import BULK, set_default_priority
+
+# === 画像の届け方 ===
+# url：Web サービスの /charts/<user_id>/<period>.png を送り、見られたときに Web 側で描く（既定）
+# static：このジョブで描いて static/ に保存する（Web と同じディスクを使う1台構成向け）
+GRAPH_DELIVERY = os.getenv("GRAPH_DELIVERY", "url")
+
+# === 画像の保存先（公開URL は graph_settings.BASE_URL） ===
+STATIC_DIR = "static"
+NO_RECORD_MESSAGE = "今日は学習記録がありませんでした。明日は忘れずに記録をつけましょう！📚"
+
+# 描画プロセス数（未指定ならコア数）
+RENDER_WORKERS = int(os.getenv("GRAPH_RENDER_WORKERS", "0")) or os.cpu_count() or 1
+
+# 送るグラフ（day：今日 / week：今週 / month：今月 / trend：直近の推移）
+GRAPH_PERIODS = [p.strip() for p in os.getenv("GRAPH_PERIODS", "day,week,month,trend").split(",") if p.strip()]
+
+# === グラフ生成関数（単発用：1ユーザー分を描画） ===
 def generate_graph(df, user_id, period_label, start_date):
+    from graph_generator.chart_renderer import render_chart_job
+
     df_period = df[df["date"] >= start_date]
     summary = df_period.groupby("subject")["minutes"].sum().sort_values(ascending=False)
 
@@ -75,52 +36,177 @@ def generate_graph(df, user_id, period_label, start_date):
         print(f"⚠️ No study data for {user_id} in {period_label}. Skipping.")
         return None
 
-    total = summary.sum()
-
-    plt.figure(figsize=(6, 4))
-    summary.plot(kind="bar", color="skyblue")
-    plt.title(f"{period_label.upper()}の学習時間 (合計: {total}分)")
-    plt.ylabel("学習時間（分）")
-    plt.xlabel("科目")
-    plt.xticks(rotation=0)
-    plt.tight_layout()
-
-    os.makedirs("static", exist_ok=True)
-    filename = f"study_chart_{period_label}_{user_id}.png"
-    path = f"static/{filename}"
-    plt.savefig(path)
-    plt.close()
-    print(f"✅ 保存パス: {path}")
-    print(f"✅ URL: https://studymebot-1lgo.onrender.com/static/{filename}")
-
+    filename = render_chart_job((user_id, period_label, list(summary.index), list(summary.values), STATIC_DIR))
+    print(f"✅ 保存パス: {STATIC_DIR}/{filename}")
+    print(f"✅ URL: {BASE_URL}/static/{filename}")
     return filename
 
-# === user_id → line_user_id のマッピングをStudyLogから取得 ===
-df_log = pd.DataFrame(sh.worksheet("StudyLog").get_all_records())
-id_map = {uid: uid for uid in df_log["user_id"].unique()}
-
-# === 各ユーザーを処理 ===
-for user_id, line_user_id in id_map.items():
-        # LINE ID のバリデーション
-    if not line_user_id or not isinstance(line_user_id, str) or line_user_id.strip() == "":
-        print(f"⚠ 無効な line_user_id をスキップ: {line_user_id}")
-        continue
-    print(f"✅ 送信対象 line_user_id: {line_user_id}")
-    if user_id not in [ws.title for ws in sh.worksheets()]:
-        continue
-
-    sheet = sh.worksheet(user_id)
-    df = pd.DataFrame(sheet.get_all_records())
-    df["datetime"] = pd.to_datetime(df["datetime"])
-    df["date"] = df["datetime"].dt.date
-    df["minutes"] = df["minutes"].astype(int)
-    print(f"📆 最新データ: {df['date'].max()}")
-
-    # === 今日のグラフだけ生成・送信 ===
-    filename = generate_graph(df, user_id, "day", start_of_day)
-    if filename:
-        image_url = f"https://studymebot-1lgo.onrender.com/static/{filename}"
-        send_image_to_line(line_user_id, image_url)
+# =========================
+# ① 取得：対象ユーザーと、集計済みの学習記録をそれぞれ1回だけ
+# =========================
+def fetch_stage(today):
+    storage = get_storage()
+    targets = storage.chart_user_ids()
+    if not targets:
+        return targets, None
+
+    import pandas as pd
+
+    # 一番長い期間の分だけ、日付×科目で集計済みの行を1回で読む
+    start = min(list(period_starts(today).values()) + [today - timedelta(days=TREND_DAYS - 1)])
+    rows = pd.DataFrame(storage.daily_rows_between(start.strftime("%Y/%m/%d"), today.strftime("%Y/%m/%d")),
+                        columns=["user_id", "date", "subject", "minutes"])
+    return targets, rows
+
+# =========================
+# ② 集計：全ユーザー・全期間を1回の groupby で
+# =========================
+def aggregate_stage(rows, today, periods=GRAPH_PERIODS):
+    """
+    戻り値: {(user_id, period): 描画ジョブ}
+    date は "YYYY/MM/DD" なので、期間の判定は文字列の比較でまとめて行う。
+    """
+    import pandas as pd
+
+    jobs = {}
+    starts = {label: start.strftime("%Y/%m/%d") for label, start in period_starts(today).items() if label in periods}
+    frames = [rows[rows["date"] >= start].assign(period=label) for label, start in starts.items()]
+    if frames:
+        summary = (pd.concat(frames)
+                     .groupby(["period", "user_id", "subject"])["minutes"].sum()
+                     .reset_index()
+                     .sort_values(["period", "user_id", "minutes"], ascending=[True, True, False]))
+        for (period, user_id), group in summary.groupby(["period", "user_id"], sort=False):
+            jobs[(user_id, period)] = ("bar", (user_id, period, list(group["subject"]),
+                                               [int(m) for m in group["minutes"]], STATIC_DIR))
+
+    if "trend" in periods:
+        days = [(today - timedelta(days=i)).strftime("%Y/%m/%d") for i in range(TREND_DAYS - 1, -1, -1)]
+        daily = (rows[rows["date"] >= days[0]]
+                 .groupby(["user_id", "date"])["minutes"].sum()
+                 .unstack(fill_value=0)
+                 .reindex(columns=days, fill_value=0))
+        labels = [d[5:] for d in days]
+        for user_id, minutes in zip(daily.index, daily.to_numpy()):
+            jobs[(user_id, "trend")] = ("line", (user_id, TREND_DAYS, labels, [int(m) for m in minutes], STATIC_DIR))
+    return jobs
+
+# =========================
+# ③ 描画：プロセスプールで並列に
+# =========================
+def render_stage(jobs):
+    if not jobs:
+        return {}
+    from concurrent.futures import ProcessPoolExecutor
+    from graph_generator.chart_renderer import init_renderer, render_job
+
+    keys = list(jobs)
+    workers = min(RENDER_WORKERS, len(keys))
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_renderer) as pool:
+        filenames = pool.map(render_job, [jobs[key] for key in keys], chunksize=8)
+        return dict(zip(keys, filenames))
+
+def static_images(filenames):
+    """
+    render_stage のファイル名を (画像 URL, プレビュー URL) にする（static 配信ではどちらも同じ画像）。
+    """
+    return {key: (f"{BASE_URL}/static/{name}",) * 2 for key, name in filenames.items() if name}
+
+# =========================
+# ③' リンク：描かずに、記録のある期間の /charts の URL だけ決める
+# =========================
+def fetch_rows(today):
+    storage = get_storage()
+    targets = storage.chart_user_ids()
+    if not targets:
+        return targets, []
+    from graph_generator.chart_service import spec_range
+
+    start, end = spec_range(today, TREND_DAYS)
+    return targets, storage.daily_rows_between(start.strftime("%Y/%m/%d"), end.strftime("%Y/%m/%d"))
+
+def link_stage(targets, rows, today, periods=GRAPH_PERIODS):
+    """
+    戻り値: {(user_id, period): (画像 URL, プレビュー URL)}
+    """
+    from graph_generator.chart_service import chart_spec, chart_url
+
+    by_user = {}
+    for row in rows:
+        by_user.setdefault(row[0], []).append(row)
+    images = {}
+    for user_id in targets:
+        user_rows = by_user.get(user_id, [])
+        for period in periods:
+            if chart_spec(user_rows, period, today) is not None:
+                images[(user_id, period)] = (chart_url(user_id, period, today),
+                                             chart_url(user_id, period, today, preview=True))
+    return images
+
+# =========================
+# ④ 送信（1回のプッシュで期間ごとの画像をまとめて送る）
+# =========================
+def send_stage(targets, images, periods=GRAPH_PERIODS):
+    """
+    images: {(user_id, period): (画像 URL, プレビュー URL)}
+    """
+    from line_utils.line_delivery import LineDelivery, image_message, text_message
+
+    items = []
+    for user_id in targets:
+        messages = []
+        if "day" in periods and (user_id, "day") not in images:
+            messages.append(text_message(NO_RECORD_MESSAGE))
+        for period in periods:
+            urls = images.get((user_id, period))
+            if urls:
+                messages.append(image_message(*urls))
+        if messages:
+            items.append((user_id, messages))
+
+    delivery = LineDelivery()
+    try:
+        stats = delivery.send_all(items)
+    finally:
+        delivery.close()
+    print(f"📨 送信結果: {stats}")
+    return stats
+
+def main():
+    # webhook の書き込みにクォータを譲る
+    set_default_priority(BULK)
+    if GRAPH_DELIVERY != "static":
+        from graph_generator.chart_service import URL_SECRET
+
+        if not URL_SECRET:
+            # 署名のない URL は Web 側が 404 にするので、送っても開けない
+            print("❌ CHART_URL_SECRET が未設定です（url 配信には Web サービスと同じ値が必要です）")
+            sys.exit(1)
+    today = datetime.today().date()
+    if GRAPH_DELIVERY == "static":
+        with span("graph.fetch"):
+            targets, rows = fetch_stage(today)
+    else:
+        with span("graph.fetch"):
+            targets, rows = fetch_rows(today)
+    if not targets:
+        # 描画するものがなければ pandas / matplotlib も読み込まずに終わる
+        print("ℹ️ グラフを送る対象のユーザーがいません")
+        dump_metrics("daily_graph")
+        return
+
+    if GRAPH_DELIVERY == "static":
+        with span("graph.aggregate"):
+            jobs = aggregate_stage(rows[rows["user_id"].isin(targets)], today)
+        with span("graph.render"):
+            images = static_images(render_stage(jobs))
     else:
-        message = "今日は学習記録がありませんでした。明日は忘れずに記録をつけましょう！📚"
-        send_text_to_line(line_user_id, message)
+        # 画像は Web サービスが見られたときに描く（このジョブでは pandas も matplotlib も使わない）
+        with span("graph.link"):
+            images = link_stage(targets, rows, today)
+    with span("graph.send"):
+        send_stage(targets, images)
+    dump_metrics("daily_graph")
+
+if __name__ == "__main__":
+    main()
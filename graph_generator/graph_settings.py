@@ -0,0 +1,22 @@
+# graph_settings.py
+# グラフの公開 URL と期間の決め方（日次ジョブと Web の /charts で共通に使う）
+
+import os
+from datetime import timedelta
+
+# === 画像の公開URL ===
+BASE_URL = "https://studymebot-1lgo.onrender.com"
+
+# 推移グラフの日数
+TREND_DAYS = int(os.getenv("GRAPH_TREND_DAYS", "14"))
+
+
+def period_starts(today):
+    """
+    各期間の開始日（週は月曜はじまり）。
+    """
+    return {
+        "day": today,
+        "week": today - timedelta(days=today.weekday()),
+        "month": today.replace(day=1)
+    }
@@ -1,47 +1,223 @@
-import gspread
-import os
-import json
-import pandas as pd
-import tempfile
-from oauth2client.service_account import ServiceAccountCredentials
-
-# 環境変数から credentials.json を読み込む（Render用）
-def get_credentials_from_env():
-    creds_dict = json.loads(os.environ.get("GOOGLE_CREDS_JSON"))
-    with tempfile.NamedTemporaryFile(mode="w", delete=False, suffix=".json") as f:
-        json.dump(creds_dict, f)
-        return f.name
-
-# 認証とクライアント生成
-scope = ['https://spreadsheets.google.com/feeds', 'https://www.googleapis.com/auth/drive']
-cred_path = get_credentials_from_env()
-creds = ServiceAccountCredentials.from_json_keyfile_name(cred_path, scope)
-client = gspread.authorize(creds)
-
-# 以降は今まで通りの処理でOK
-spreadsheet = client.open("StudyMeBotStudyLog")
-main_sheet = spreadsheet.worksheet("StudyLog")
-data = main_sheet.get_all_records()
-df = pd.DataFrame(data)
-df.columns = [col.strip() for col in df.columns]
-df = df.dropna(subset=["user_id"])
-
-# ユーザーごとに分割
-for user_id in df['user_id'].unique():
-    user_df = df[df['user_id'] == user_id]
+# split_by_user.py
+# StudyLog の行を各 user_id シートへ差分コピーする（ユーザーごとのウォーターマークで再開可能）
+# 実行: python -m graph_generator.split_by_user
+# import しただけでは認証も通信もしない（gspread は使うときに読み込む）
 
+import sys
+from bisect import bisect_right
+from collections import Counter
+
+from metrics_utils.metrics import span, dump_metrics
+from spreadsheet_utils.quota_governor import BULK, set_default_priority
+from spreadsheet_utils.study_log_archive import SheetsBook
+
+STATE_SHEET = "SplitWatermarks"
+# sheet_rows: 前回確認したときのユーザーシートの行数（次回はその少し手前から末尾だけ読む）
+STATE_HEADER = ["user_id", "last_row", "sheet_rows"]
+USER_SHEET_HEADER = ["datetime", "subject", "minutes", "raw_message"]
+
+# 1回の append_rows で書く行数
+CHUNK_ROWS = 500
+# webhook はユーザーシートと StudyLog に少しずれて書くので、前回の末尾よりこの行数だけ手前から読み直す
+TAIL_OVERLAP_ROWS = 100
+
+
+class QuotaExhausted(Exception):
+    pass
+
+
+def guard_quota(fn, *args, **kwargs):
+    """
+    429 / 5xx の待機と再試行はクライアント（quota_governor）が行う。
+    それでも通らなければ QuotaExhausted にする（進んだ分はウォーターマークに残っている）。
+    gspread の APIError は response.status_code で見分ける（ここでは gspread を読み込まない）。
+    """
     try:
-        ws = spreadsheet.worksheet(user_id)
-        spreadsheet.del_worksheet(ws)
-        print(f"🔁 既存シート '{user_id}' を削除しました")
-    except gspread.exceptions.WorksheetNotFound:
-        print(f"✅ 新規シート '{user_id}' を作成します")
-
-    new_sheet = spreadsheet.add_worksheet(title=user_id, rows="1000", cols="5")
-    new_sheet.append_row(["datetime", "subject", "minutes", "raw_message"])
-    for _, row in user_df.iterrows():
-        new_sheet.append_row([
-            row["datetime"], row["subject"], row["minutes"], row["raw_message"]
+        return fn(*args, **kwargs)
+    except Exception as e:
+        code = getattr(getattr(e, "response", None), "status_code", None)
+        if code is not None and (code == 429 or code >= 500):
+            raise QuotaExhausted(str(e)) from e
+        raise
+
+
+# =========================
+# 📍 ウォーターマーク（StudyLog の何行目までコピー済みか）
+# =========================
+class Watermarks:
+    def __init__(self, worksheet=None):
+        if worksheet is None:
+            from spreadsheet_utils.sheets_client import STUDY_LOG_BOOK, get_or_create_worksheet
+
+            worksheet = get_or_create_worksheet(STUDY_LOG_BOOK, STATE_SHEET, rows=1000, cols=len(STATE_HEADER),
+                                                header=STATE_HEADER)
+        self.ws = worksheet
+        # sheet_rows の列を足す前に作ったシートは2列しかない
+        if getattr(self.ws, "col_count", len(STATE_HEADER)) < len(STATE_HEADER):
+            guard_quota(self.ws.add_cols, len(STATE_HEADER) - self.ws.col_count)
+        values = guard_quota(self.ws.get_all_values)
+        self.rows = {}
+        self.marks = {}
+        self.sheet_rows = {}
+        for row_no, row in enumerate(values[1:], start=2):
+            if row and row[0]:
+                self.rows[row[0]] = row_no
+                self.marks[row[0]] = int(row[1] or 1)
+                # 列を足す前のシートには sheet_rows がない（0 = 次回は全部読む）
+                self.sheet_rows[row[0]] = int(row[2] or 0) if len(row) > 2 else 0
+        self._next_row = len(values) + 1
+
+    def get(self, user_id):
+        # 1 はヘッダー行＝まだ何もコピーしていない
+        return self.marks.get(user_id, 1)
+
+    def set_many(self, updates):
+        """
+        {user_id: StudyLog の行番号} を1回の batch_update で保存する（sheet_rows も一緒に書く）。
+        """
+        data = []
+        for user_id, last_row in updates.items():
+            row_no = self.rows.get(user_id)
+            if row_no is None:
+                row_no = self.rows[user_id] = self._next_row
+                self._next_row += 1
+            data.append({"range": f"A{row_no}:C{row_no}",
+                         "values": [[user_id, last_row, self.sheet_rows.get(user_id, 0)]]})
+        if self._next_row - 1 > self.ws.row_count:
+            guard_quota(self.ws.add_rows, self._next_row - 1 - self.ws.row_count)
+        guard_quota(self.ws.batch_update, data)
+        self.marks.update(updates)
+
+    def shift(self, deleted_rows):
+        """
+        StudyLog から行を消す前に呼ぶ（study_log_archive）。消える行の分だけ各ウォーターマークを下げる。
+        """
+        deleted_rows = sorted(deleted_rows)
+        updates = {}
+        for user_id, last_row in self.marks.items():
+            removed = bisect_right(deleted_rows, last_row)
+            if removed:
+                updates[user_id] = max(last_row - removed, 1)
+        if updates:
+            self.set_many(updates)
+
+    def forget_sheet_rows(self, user_ids):
+        """
+        ユーザーシートの行を消したあとに呼ぶ（study_log_archive）。次回はそのシートを全部読み直す。
+        """
+        user_ids = [uid for uid in user_ids if uid in self.marks]
+        for user_id in user_ids:
+            self.sheet_rows[user_id] = 0
+        if user_ids:
+            self.set_many({uid: self.marks[uid] for uid in user_ids})
+
+
+# =========================
+# 🚚 コピー
+# =========================
+def read_new_rows(book, start_row):
+    """
+    StudyLog の start_row 行目以降を (行番号, レコード) で返す。ヘッダーと本体を1回で読む。
+    """
+    main_sheet = book.worksheet("StudyLog")
+    header_range, body = guard_quota(main_sheet.batch_get, ["A1:E1", f"A{start_row}:E"])
+    header = [h.strip() for h in header_range[0]]
+    records = []
+    for offset, values in enumerate(body):
+        record = dict(zip(header, values + [""] * (len(header) - len(values))))
+        if record.get("user_id"):
+            records.append((start_row + offset, record))
+    return records, start_row + len(body) - 1
+
+
+def _user_row_key(datetime_, subject, minutes):
+    return str(datetime_), str(subject), str(minutes)
+
+
+def existing_rows(ws, known_rows):
+    """
+    ユーザーシートの datetime / subject / minutes 列を、前回確認した末尾（known_rows）の少し手前から最後まで読む。
+    戻り値: ({(datetime, subject, minutes): 行数}, シートの行数)。known_rows が 0 なら全部読む。
+    """
+    start = max(known_rows - TAIL_OVERLAP_ROWS + 1, 2) if known_rows else 1
+    values = guard_quota(ws.get, f"A{start}:C")
+    existing = Counter(_user_row_key(*(row + ["", "", ""])[:3]) for row in values if row)
+    sheet_rows = start + len(values) - 1 if values else max(start - 1, 1)
+    return existing, sheet_rows
+
+
+def copy_user_rows(book, user_id, rows, watermarks):
+    """
+    rows: (StudyLog の行番号, レコード)。すでにユーザーシートにある行（webhook が書いた分）は飛ばす。
+    """
+    ws = book.create_worksheet(user_id, rows=1000, cols=4, header=USER_SHEET_HEADER)
+    existing, sheet_rows = existing_rows(ws, watermarks.sheet_rows.get(user_id, 0))
+    watermarks.sheet_rows[user_id] = sheet_rows
+    # 同じ時刻の別の記録もあるので、時刻だけでなく科目・時間まで同じ行を、その件数だけ飛ばす
+    pending = []
+    for row_no, r in rows:
+        key = _user_row_key(r["datetime"], r["subject"], r["minutes"])
+        if existing[key]:
+            existing[key] -= 1
+        else:
+            pending.append((row_no, r))
+
+    for i in range(0, len(pending), CHUNK_ROWS):
+        chunk = pending[i:i + CHUNK_ROWS]
+        guard_quota(ws.append_rows, [
+            [r["datetime"], r["subject"], r["minutes"], r["raw_message"]] for _, r in chunk
         ])
+        watermarks.sheet_rows[user_id] += len(chunk)
+        watermarks.set_many({user_id: chunk[-1][0]})
+    return len(pending)
+
+
+def split_study_log(book, watermarks):
+    """
+    StudyLog の新しい行を各ユーザーシートへコピーする。戻り値: {user_id: コピーした行数}
+    途中で QuotaExhausted になっても、次回の実行で続きから再開できる。
+    """
+    start_row = min(watermarks.marks.values(), default=1) + 1
+    with span("split.read"):
+        records, last_row = read_new_rows(book, start_row)
+    print(f"📥 StudyLog {start_row} 行目以降の {len(records)} 行を確認します")
+
+    by_user = {}
+    for row_no, record in records:
+        user_id = str(record["user_id"]).strip()
+        if row_no > watermarks.get(user_id):
+            by_user.setdefault(user_id, []).append((row_no, record))
+
+    # 初めて見るユーザーは「今回読み始めた行の手前まで済み」にしておく
+    # （コピー前に中断しても、次回の読み始めがこのユーザーの行より後ろにならないように）
+    new_users = {uid: start_row - 1 for uid in by_user if uid not in watermarks.marks}
+    if new_users:
+        watermarks.set_many(new_users)
+
+    copied = {}
+    for user_id, rows in by_user.items():
+        with span("split.copy_user"):
+            copied[user_id] = copy_user_rows(book, user_id, rows, watermarks)
+        print(f"✅ '{user_id}' に {copied[user_id]} 行をコピーしました")
+
+    # 全員ここまで確認済み（次回は last_row の次から読む）
+    if last_row >= start_row:
+        watermarks.set_many({uid: last_row for uid in set(watermarks.marks) | set(by_user)})
+    return copied
+
+
+def main():
+    set_default_priority(BULK)
+    book = SheetsBook()
+    try:
+        split_study_log(book, Watermarks())
+    except QuotaExhausted as e:
+        print(f"⛔ API 制限で中断しました。次回は続きから再開します: {e}")
+        dump_metrics("split_by_user")
+        sys.exit(1)
+    print("✅ 全ユーザーのシート分割が完了しました！")
+    dump_metrics("split_by_user")
+
 
-print("✅ 全ユーザーのシート分割が完了しました！")
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+# line_delivery.py
+# LINE へのプッシュ送信をまとめて行う共通部品（接続プール・multicast・429/5xx の再試行）
+
+import json
+import os
+import random
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+DEFAULT_API_BASE = "https://api.line.me"
+MULTICAST_LIMIT = 500
+
+
+def text_message(text):
+    return {"type": "text", "text": text}
+
+
+def image_message(image_url, preview_url=None):
+    return {
+        "type": "image",
+        "originalContentUrl": image_url,
+        "previewImageUrl": preview_url or image_url
+    }
+
+
+class DeliveryStats:
+    """
+    1回の実行分の送信統計。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.retries = 0
+        self.delivered = 0
+        self.failed = 0
+        self.status_counts = {}
+        self.started_at = time.time()
+
+    def record_response(self, status_code):
+        with self._lock:
+            self.requests += 1
+            self.status_counts[status_code] = self.status_counts.get(status_code, 0) + 1
+
+    def record_retry(self):
+        with self._lock:
+            self.retries += 1
+
+    def record_result(self, recipients, ok):
+        with self._lock:
+            if ok:
+                self.delivered += recipients
+            else:
+                self.failed += recipients
+
+    def as_dict(self):
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "retries": self.retries,
+                "delivered": self.delivered,
+                "failed": self.failed,
+                "status_counts": dict(self.status_counts),
+                "elapsed_seconds": round(time.time() - self.started_at, 3)
+            }
+
+
+class LineDelivery:
+    """
+    requests.Session を使い回し、同じ内容のメッセージは multicast（最大500人）にまとめて送る。
+    LINE_API_BASE を変えるとローカルのモックに向けられる。
+    """
+
+    def __init__(self, token=None, api_base=None, max_concurrency=8, max_retries=5,
+                 backoff_base=1.0, backoff_max=30.0, timeout=10):
+        self.api_base = (api_base or os.getenv("LINE_API_BASE", DEFAULT_API_BASE)).rstrip("/")
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.timeout = timeout
+        self.stats = DeliveryStats()
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_concurrency)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.headers.update({
+            "Authorization": f"Bearer {token or os.getenv('LINE_CHANNEL_ACCESS_TOKEN')}",
+            "Content-Type": "application/json"
+        })
+
+    # =========================
+    # 🔁 送信（再試行つき）
+    # =========================
+    def _backoff(self, attempt, retry_after=None):
+        if retry_after is not None:
+            return min(retry_after, self.backoff_max)
+        delay = min(self.backoff_base * (2 ** attempt), self.backoff_max)
+        return random.uniform(0, delay)
+
+    def _post(self, path, payload):
+        # 同じ Retry Key で再送すると LINE 側で重複送信にならない
+        headers = {"X-Line-Retry-Key": str(uuid.uuid4())}
+        for attempt in range(self.max_retries + 1):
+            retry_after = None
+            try:
+                r = self.session.post(f"{self.api_base}{path}", json=payload, headers=headers, timeout=self.timeout)
+            except requests.RequestException as e:
+                status, detail = None, str(e)
+            else:
+                self.stats.record_response(r.status_code)
+                # 409 は同じ Retry Key の送信がすでに受け付け済み
+                if r.ok or r.status_code == 409:
+                    return True
+                status, detail = r.status_code, r.text
+                if status == 429 and r.headers.get("Retry-After", "").isdigit():
+                    retry_after = int(r.headers["Retry-After"])
+                if status != 429 and status < 500:
+                    break
+            if attempt < self.max_retries:
+                self.stats.record_retry()
+                time.sleep(self._backoff(attempt, retry_after))
+        print(f"❌ LINE送信失敗 {path}: {status} {detail}")
+        return False
+
+    def push(self, user_id, messages):
+        ok = self._post("/v2/bot/message/push", {"to": user_id, "messages": messages})
+        self.stats.record_result(1, ok)
+        return ok
+
+    def multicast(self, user_ids, messages):
+        ok_all = True
+        for i in range(0, len(user_ids), MULTICAST_LIMIT):
+            chunk = user_ids[i:i + MULTICAST_LIMIT]
+            ok = self._post("/v2/bot/message/multicast", {"to": chunk, "messages": messages})
+            self.stats.record_result(len(chunk), ok)
+            ok_all = ok_all and ok
+        return ok_all
+
+    # =========================
+    # 📦 まとめて送信
+    # =========================
+    def send_all(self, items):
+        """
+        items: (user_id, messages) のリスト。
+        同じ messages のユーザーは multicast にまとめ、呼び出しは max_concurrency 並列で行う。
+        """
+        groups = {}
+        for user_id, messages in items:
+            key = json.dumps(messages, ensure_ascii=False, sort_keys=True)
+            groups.setdefault(key, (messages, []))[1].append(user_id)
+
+        calls = []
+        for messages, user_ids in groups.values():
+            if len(user_ids) == 1:
+                calls.append((self.push, user_ids[0], messages))
+            else:
+                for i in range(0, len(user_ids), MULTICAST_LIMIT):
+                    calls.append((self.multicast, user_ids[i:i + MULTICAST_LIMIT], messages))
+
+        with ThreadPoolExecutor(max_workers=self.max_concurrency) as pool:
+            list(pool.map(lambda call: call[0](call[1], call[2]), calls))
+        return self.stats.as_dict()
+
+    def close(self):
+        self.session.close()
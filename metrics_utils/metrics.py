@@ -0,0 +1,174 @@
+# metrics.py
+# 処理段階ごとの所要時間（ヒストグラム）と回数（カウンター）を集め、Prometheus のテキスト形式で出す
+
+import os
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+# 秒。webhook の1段階（数 ms）から Sheets の遅い呼び出し（数秒）まで
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _label_text(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels) + "}"
+
+
+class Counter:
+    def __init__(self, name, help_text):
+        self.name = name
+        self.help = help_text
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def inc(self, amount=1, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        with self._lock:
+            return self._values.get(tuple(sorted(labels.items())), 0)
+
+    def total(self):
+        with self._lock:
+            return sum(self._values.values())
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_label_text(key)} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help_text, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        # ラベル -> [各バケットの件数..., 合計秒, 件数]
+        self._values = {}
+
+    def observe(self, seconds, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    state[i] += 1
+            state[-2] += seconds
+            state[-1] += 1
+
+    def count(self, **labels):
+        with self._lock:
+            state = self._values.get(tuple(sorted(labels.items())))
+        return state[-1] if state else 0
+
+    def totals(self):
+        """
+        {ラベルの dict を tuple にしたもの: (合計秒, 件数)}
+        """
+        with self._lock:
+            return {key: (state[-2], state[-1]) for key, state in self._values.items()}
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, state in sorted(self._values.items()):
+                for bound, count in zip(self.buckets, state):
+                    lines.append(f"{self.name}_bucket{_label_text(key + (('le', bound),))} {count}")
+                lines.append(f"{self.name}_bucket{_label_text(key + (('le', '+Inf'),))} {state[-1]}")
+                lines.append(f"{self.name}_sum{_label_text(key)} {state[-2]:.6f}")
+                lines.append(f"{self.name}_count{_label_text(key)} {state[-1]}")
+        return lines
+
+
+# =========================
+# 📈 共通のメトリクス
+# =========================
+STAGE_SECONDS = Histogram("studymebot_stage_seconds", "処理段階ごとの所要時間（秒）")
+STAGE_ERRORS = Counter("studymebot_stage_errors_total", "例外で終わった処理段階の数")
+GOOGLE_API_REQUESTS = Counter("studymebot_google_api_requests_total", "Google API へのリクエスト数")
+GOOGLE_API_SECONDS = Histogram("studymebot_google_api_seconds", "Google API 1回あたりの所要時間（秒）")
+
+REGISTRY = [STAGE_SECONDS, STAGE_ERRORS, GOOGLE_API_REQUESTS, GOOGLE_API_SECONDS]
+
+
+def register(metric):
+    REGISTRY.append(metric)
+    return metric
+
+
+@contextmanager
+def span(stage):
+    """
+    with span("parse"): ... の所要時間を studymebot_stage_seconds{stage="parse"} に記録する。
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    except BaseException:
+        STAGE_ERRORS.inc(stage=stage)
+        raise
+    finally:
+        STAGE_SECONDS.observe(time.perf_counter() - started, stage=stage)
+
+
+def timed(stage):
+    """
+    関数全体を span で囲むデコレーター。
+    """
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(stage):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def record_google_api_call(method, status, seconds):
+    GOOGLE_API_REQUESTS.inc(method=method, status=status)
+    GOOGLE_API_SECONDS.observe(seconds, method=method)
+
+
+# =========================
+# 📤 出力
+# =========================
+def render_prometheus():
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+def dump_metrics(job):
+    """
+    cron ジョブの最後に呼ぶ。METRICS_TEXTFILE があればそこへ（node_exporter の textfile 形式）、
+    なければ段階ごとの合計時間をログに出す。
+    """
+    path = os.getenv("METRICS_TEXTFILE")
+    if path:
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(f"# job {job}\n")
+            f.write(render_prometheus())
+        os.replace(tmp_path, path)
+        print(f"📈 メトリクスを {path} に書き出しました")
+        return
+
+    stages = {dict(key).get("stage"): totals for key, totals in STAGE_SECONDS.totals().items()}
+    api_calls = GOOGLE_API_REQUESTS.total()
+    summary = ", ".join(f"{stage}={total:.3f}s×{count}" for stage, (total, count) in sorted(stages.items()))
+    print(f"📈 [{job}] {summary} / Google API {api_calls} 回")
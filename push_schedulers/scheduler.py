@@ -0,0 +1,184 @@
+# scheduler.py
+# StudyMeBotNotify の通知時刻をもとに、全ユーザーへの定時通知を1プロセスで送る
+# 実行: python -m push_schedulers.scheduler
+
+import heapq
+import os
+import re
+import time
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
+
+from metrics_utils.metrics import span
+
+JST = ZoneInfo("Asia/Tokyo")
+
+# 時間帯ごとの通知メッセージ
+PERIOD_MESSAGES = {
+    "morning": "🕗 おはようございます！今日も少しずつ前に進もう💪",
+    "noon": "🍱 お昼です！午後も集中して取り組んでいきましょう✍️",
+    "evening": "🌇 お疲れさまです！夕方のひと踏ん張り、一緒に頑張りましょう🔥",
+    "night": "🌙 こんばんは！今日の勉強を少しだけでも振り返ってみましょう📘"
+}
+
+# シートを読み直す間隔（秒）
+REFRESH_SECONDS = int(os.getenv("NOTIFY_REFRESH_SECONDS", "300"))
+
+_TIME_PATTERN = re.compile(r"^\s*(\d{1,2}):(\d{2})")
+
+
+def parse_time(value):
+    """
+    "07:30" / "7:30" を (時, 分) に。"OFF" や不正な値は None。
+    """
+    match = _TIME_PATTERN.match(str(value))
+    if not match:
+        return None
+    hour, minute = int(match.group(1)), int(match.group(2))
+    if hour > 23 or minute > 59:
+        return None
+    return hour, minute
+
+
+def next_fire_at(hour_minute, now):
+    hour, minute = hour_minute
+    fire_at = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
+    if fire_at <= now:
+        fire_at += timedelta(days=1)
+    return fire_at
+
+
+class NotificationSchedule:
+    """
+    (次回送信時刻, user_id, 時間帯) のヒープ。
+    設定が変わったら世代番号を上げ、古いエントリは取り出したときに捨てる（遅延削除）。
+    追加・取り出しとも O(log n)。
+    """
+
+    def __init__(self):
+        self._heap = []
+        # (user_id, period) -> (時刻文字列, 世代)
+        self._entries = {}
+
+    def set_user(self, user_id, times, now):
+        """
+        times: {"morning": "07:30", "noon": "OFF", ...}。変わった時間帯だけ入れ直す。
+        """
+        changed = 0
+        for period in PERIOD_MESSAGES:
+            time_str = str(times.get(period, "OFF")).strip()
+            current = self._entries.get((user_id, period))
+            if current is not None and current[0] == time_str:
+                continue
+            version = (current[1] + 1) if current else 0
+            self._entries[(user_id, period)] = (time_str, version)
+            hour_minute = parse_time(time_str)
+            if hour_minute:
+                heapq.heappush(self._heap, (next_fire_at(hour_minute, now), user_id, period, version))
+            changed += 1
+        return changed
+
+    def remove_user(self, user_id):
+        for period in PERIOD_MESSAGES:
+            current = self._entries.get((user_id, period))
+            if current is not None:
+                self._entries[(user_id, period)] = ("OFF", current[1] + 1)
+
+    def user_ids(self):
+        return {user_id for user_id, _ in self._entries}
+
+    def next_fire_time(self):
+        return self._heap[0][0] if self._heap else None
+
+    def pop_due(self, now):
+        """
+        now までに送るべき (user_id, period) を返し、それぞれ翌日分を入れ直す。
+        """
+        due = []
+        while self._heap and self._heap[0][0] <= now:
+            fire_at, user_id, period, version = heapq.heappop(self._heap)
+            time_str, current_version = self._entries.get((user_id, period), (None, -1))
+            if version != current_version:
+                continue
+            due.append((user_id, period))
+            heapq.heappush(self._heap, (fire_at + timedelta(days=1), user_id, period, version))
+        return due
+
+
+# =========================
+# 📄 通知設定の読み込み
+# =========================
+def load_settings():
+    from storage import get_storage
+
+    return get_storage().notification_settings()
+
+
+def sheet_modified_time():
+    from storage import get_storage
+
+    return get_storage().notification_settings_version()
+
+
+def refresh_schedule(schedule, now, last_modified=None):
+    """
+    シートが更新されていれば読み直し、差分だけをスケジュールに反映する。
+    """
+    modified = sheet_modified_time()
+    if modified is not None and modified == last_modified:
+        return last_modified
+    settings = load_settings()
+    changed = sum(schedule.set_user(uid, times, now) for uid, times in settings.items())
+    for user_id in schedule.user_ids() - set(settings):
+        schedule.remove_user(user_id)
+    print(f"🔄 通知設定を更新しました（{len(settings)}人、変更 {changed} 件）")
+    return modified
+
+
+# =========================
+# 📨 送信
+# =========================
+def send_due(delivery, due):
+    from line_utils.line_delivery import text_message
+
+    # 同じ時間帯の通知は同じ文面なので multicast にまとまる
+    items = [(user_id, [text_message(PERIOD_MESSAGES[period])]) for user_id, period in due]
+    with span("scheduler.send"):
+        stats = delivery.send_all(items)
+    print(f"📨 {len(due)} 件の通知を送信しました: {stats}")
+
+
+def main():
+    from dotenv import load_dotenv
+    from line_utils.line_delivery import LineDelivery
+    from spreadsheet_utils.quota_governor import BULK, set_default_priority
+
+    load_dotenv()
+    # 通知設定の読み込みは webhook の書き込みより後回しでよい
+    set_default_priority(BULK)
+    schedule = NotificationSchedule()
+    delivery = LineDelivery()
+    now = datetime.now(JST)
+    last_modified = refresh_schedule(schedule, now)
+    last_refresh = time.monotonic()
+
+    while True:
+        # 次の分の頭まで待つ
+        now = datetime.now(JST)
+        time.sleep(60 - now.second - now.microsecond / 1e6)
+        now = datetime.now(JST)
+
+        if time.monotonic() - last_refresh >= REFRESH_SECONDS:
+            try:
+                last_modified = refresh_schedule(schedule, now, last_modified)
+            except Exception as e:
+                print(f"⚠️ 通知設定の読み込みに失敗しました: {e}")
+            last_refresh = time.monotonic()
+
+        due = schedule.pop_due(now)
+        if due:
+            send_due(delivery, due)
+
+
+if __name__ == "__main__":
+    main()
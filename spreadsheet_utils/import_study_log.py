@@ -0,0 +1,274 @@
+# import_study_log.py
+# 過去の学習記録を CSV から一括で取り込む（StudyLog と各 user_id シートへ、チャンクごとに append_rows 1回）
+# 実行: python -m spreadsheet_utils.import_study_log school.csv [--chunk-rows 500] [--dry-run]
+# CSV の列: user_id, datetime と、subject + minutes または raw_message（「英語30分」など LINE と同じ書き方）
+# 途中で止まっても、同じコマンドをもう一度実行すればチェックポイントの続きから再開する
+
+import argparse
+import csv
+import hashlib
+import json
+import os
+import re
+import sys
+import time
+from datetime import datetime
+
+from data_utils.message_router import StudyLogCommand, UnknownCommand, route_message
+from metrics_utils.metrics import span, dump_metrics
+from spreadsheet_utils.quota_governor import BULK, set_default_priority
+from spreadsheet_utils.study_log_writer import STUDY_LOG_SHEET, study_log_row, user_sheet_row
+
+DEFAULT_CHUNK_ROWS = 500
+STORAGE_TARGET = "storage"
+
+_DATETIME_PATTERN = re.compile(
+    r"^\s*(\d{4})[-/](\d{1,2})[-/](\d{1,2})(?:[ T](\d{1,2}):(\d{2})(?::(\d{2}))?)?"
+)
+
+
+def parse_datetime(value):
+    """
+    "2026/1/5 8:00" / "2026-01-05T08:00:00" などを isoformat にそろえる（webhook の記録と同じ形）。
+    CSV にない値（秒未満など）は足さない。
+    """
+    match = _DATETIME_PATTERN.match(str(value or ""))
+    if not match:
+        return None
+    parts = [int(p) if p else 0 for p in match.groups()]
+    try:
+        return datetime(*parts).isoformat()
+    except ValueError:
+        return None
+
+
+def validate_row(row, record_id=None):
+    """
+    戻り値: (学習記録の dict, None) または (None, 理由)。
+    科目と時間は handle_message と同じ route_message で判定する。
+    """
+    user_id = (row.get("user_id") or "").strip()
+    if not user_id:
+        return None, "user_id がありません"
+    stamp = parse_datetime(row.get("datetime"))
+    if not stamp:
+        return None, "日時が読み取れません"
+
+    subject = (row.get("subject") or "").strip()
+    minutes = (row.get("minutes") or "").strip()
+    raw_message = (row.get("raw_message") or "").strip()
+    text = f"{subject}{minutes}分" if subject and minutes else raw_message
+    command = route_message(text)
+    if isinstance(command, UnknownCommand):
+        return None, "科目名が見つかりません" if command.reason == "subject" else "時間が読み取れません"
+    if not isinstance(command, StudyLogCommand):
+        return None, "学習記録ではありません"
+    if command.minutes <= 0:
+        return None, "時間が0分です"
+    return {
+        "datetime": stamp,
+        "user_id": user_id,
+        "subject": command.subject,
+        "minutes": command.minutes,
+        "raw_message": raw_message or text,
+        "record_id": record_id,
+    }, None
+
+
+# =========================
+# 🚚 書き込み先
+# =========================
+class SheetsImportSink:
+    """
+    1チャンクを StudyLog 1回 + 登場ユーザーごとに1回の append_rows にまとめる。
+    """
+
+    def __init__(self, sink=None):
+        if sink is None:
+            from spreadsheet_utils.study_log_writer import SheetsSink
+
+            sink = SheetsSink()
+        self.sink = sink
+
+    def batches(self, records):
+        batches = {STUDY_LOG_SHEET: [study_log_row(r) for r in records]}
+        for r in records:
+            batches.setdefault(r["user_id"], []).append(user_sheet_row(r))
+        return batches
+
+    def write(self, target, rows):
+        self.sink.append_rows(target, rows)
+
+
+class StorageImportSink:
+    """
+    Sheets 以外の保存先（ローカル SQLite）には append_study_logs でまとめて書く。
+    """
+
+    def __init__(self, storage):
+        self.storage = storage
+
+    def batches(self, records):
+        return {STORAGE_TARGET: records}
+
+    def write(self, target, rows):
+        self.storage.append_study_logs(rows)
+
+
+def default_sink():
+    from storage import get_storage
+    from storage.sheets_backend import SheetsStorage
+
+    storage = get_storage()
+    return SheetsImportSink() if isinstance(storage, SheetsStorage) else StorageImportSink(storage)
+
+
+# =========================
+# 📍 チェックポイント
+# =========================
+class Checkpoint:
+    """
+    line: 書き込みまで終わった CSV のデータ行数。
+    targets: 書きかけのチャンクで、書き終えたシートごとの行数（全シート終われば line に進めて空にする）。
+    """
+
+    def __init__(self, path, fingerprint):
+        self.path = path
+        self.fingerprint = fingerprint
+        self.line, self.targets, self.imported, self.rejected = 0, {}, 0, 0
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                state = json.load(f)
+            if state.get("fingerprint") != fingerprint:
+                raise ValueError(f"{path} は別の CSV のチェックポイントです（消してからやり直してください）")
+            self.line, self.targets = state["line"], state["targets"]
+            self.imported, self.rejected = state["imported"], state["rejected"]
+
+    def save(self):
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"fingerprint": self.fingerprint, "line": self.line, "targets": self.targets,
+                       "imported": self.imported, "rejected": self.rejected}, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+
+
+def import_record_id(fingerprint, line):
+    """
+    CSV の行ごとの record_id。同じ CSV を取り込み直しても同じ ID になる（同じ時刻の別の行とは違う ID）。
+    """
+    return f"csv-{hashlib.sha1(fingerprint.encode('utf-8')).hexdigest()[:12]}-{line}"
+
+
+def file_fingerprint(path):
+    # 追記された CSV は別物として扱う（行番号がずれないとは限らないため）
+    return f"{os.path.abspath(path)}:{os.path.getsize(path)}"
+
+
+def _chunks(reader, size, skip):
+    chunk, line = [], 0
+    for row in reader:
+        line += 1
+        if line <= skip:
+            continue
+        chunk.append((line, row))
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+# =========================
+# 📥 取り込み
+# =========================
+def import_csv(csv_path, sink, chunk_rows=DEFAULT_CHUNK_ROWS, checkpoint_path=None, rejects_path=None,
+               dry_run=False, clock=time.perf_counter):
+    """
+    CSV を chunk_rows 行ずつ読み、検証してから書き込む。戻り値: {"imported", "rejected", "seconds"}
+    """
+    checkpoint = Checkpoint(checkpoint_path or csv_path + ".ckpt", file_fingerprint(csv_path))
+    if dry_run:
+        # 検証だけなら最初から読み、チェックポイントは使わない
+        checkpoint.line, checkpoint.targets, checkpoint.imported, checkpoint.rejected = 0, {}, 0, 0
+    elif checkpoint.line:
+        print(f"🔁 {checkpoint.line} 行目まで取り込み済みなので続きから再開します")
+    rejects_path = rejects_path or csv_path + ".rejects.csv"
+    if checkpoint.line == 0 and not checkpoint.targets and os.path.exists(rejects_path):
+        os.remove(rejects_path)
+
+    started = clock()
+    processed = 0
+    with open(csv_path, encoding="utf-8-sig", newline="") as f:
+        for chunk in _chunks(csv.DictReader(f), chunk_rows, checkpoint.line):
+            records, rejects = [], []
+            for line, row in chunk:
+                record, reason = validate_row(row, import_record_id(checkpoint.fingerprint, line))
+                if record:
+                    records.append(record)
+                else:
+                    rejects.append((line, reason, row))
+
+            last_line = chunk[-1][0]
+            if not dry_run and records:
+                with span("import.chunk"):
+                    for target, rows in sink.batches(records).items():
+                        # 前回このチャンクの途中で止まっていたら、書き終えたシートは飛ばす
+                        if checkpoint.targets.get(target, 0) >= last_line:
+                            continue
+                        sink.write(target, rows)
+                        checkpoint.targets[target] = last_line
+                        checkpoint.save()
+
+            _write_rejects(rejects_path, rejects)
+            checkpoint.line, checkpoint.targets = last_line, {}
+            checkpoint.imported += len(records)
+            checkpoint.rejected += len(rejects)
+            if not dry_run:
+                checkpoint.save()
+
+            processed += len(chunk)
+            elapsed = max(clock() - started, 1e-9)
+            print(f"📥 {last_line} 行目まで：取り込み {checkpoint.imported} 件 / 除外 {checkpoint.rejected} 件"
+                  f"（{processed / elapsed:,.0f} 行/秒）")
+
+    return {"imported": checkpoint.imported, "rejected": checkpoint.rejected, "seconds": clock() - started}
+
+
+def _write_rejects(path, rejects):
+    if not rejects:
+        return
+    new_file = not os.path.exists(path)
+    with open(path, "a", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f)
+        if new_file:
+            writer.writerow(["line", "reason", "row"])
+        for line, reason, row in rejects:
+            writer.writerow([line, reason, json.dumps(row, ensure_ascii=False)])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="過去の学習記録を CSV から一括で取り込む")
+    parser.add_argument("csv_path")
+    parser.add_argument("--chunk-rows", type=int, default=DEFAULT_CHUNK_ROWS, help="1回の append_rows で書く行数")
+    parser.add_argument("--checkpoint", help="チェックポイントのファイル（既定: <csv>.ckpt）")
+    parser.add_argument("--rejects", help="取り込めなかった行を書き出す CSV（既定: <csv>.rejects.csv）")
+    parser.add_argument("--dry-run", action="store_true", help="検証だけ行い、書き込まない")
+    args = parser.parse_args(argv)
+
+    # webhook の書き込みにクォータを譲る
+    set_default_priority(BULK)
+    try:
+        result = import_csv(args.csv_path, None if args.dry_run else default_sink(), chunk_rows=args.chunk_rows,
+                            checkpoint_path=args.checkpoint, rejects_path=args.rejects, dry_run=args.dry_run)
+    except ValueError as e:
+        print(f"❌ {e}")
+        return 1
+    print(f"✅ {result['imported']} 件を取り込みました（除外 {result['rejected']} 件、{result['seconds']:.1f} 秒）")
+    dump_metrics("import_study_log")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
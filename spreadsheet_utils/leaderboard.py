@@ -0,0 +1,194 @@
+# leaderboard.py
+# 今週（月曜始まり）の学習時間ランキング。ユーザーごとの合計を「分の多い順」に並べた配列で持ち、
+# record_study_log のたびにその場で並べ替えるので、「ランキング」への返信は保存先を読まずに返せる
+
+import threading
+from bisect import bisect_left, insort
+from datetime import date, datetime, timedelta
+
+from metrics_utils.metrics import span
+
+TOP_K = 10
+
+
+def week_start(day):
+    return day - timedelta(days=day.weekday())
+
+
+def _to_date(value):
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    text = str(value).strip()
+    return datetime.strptime(text[:10].replace("/", "-"), "%Y-%m-%d").date()
+
+
+class _RankIndex:
+    """
+    {user_id: 合計分} と、(-合計分, user_id) の昇順リスト。
+    合計が変わったユーザーだけ抜き差しするので、順位は二分探索で求まる。
+    """
+
+    def __init__(self):
+        self.totals = {}
+        self.order = []
+
+    def add(self, user_id, minutes):
+        old = self.totals.get(user_id)
+        if old is not None:
+            del self.order[bisect_left(self.order, (-old, user_id))]
+        total = (old or 0) + minutes
+        self.totals[user_id] = total
+        insort(self.order, (-total, user_id))
+
+    def top(self, k):
+        return [(user_id, -neg) for neg, user_id in self.order[:k]]
+
+    def rank(self, user_id):
+        """
+        同じ分数は同じ順位（1位, 2位, 2位, 4位 …）。記録がなければ None。
+        """
+        total = self.totals.get(user_id)
+        if total is None:
+            return None
+        return bisect_left(self.order, (-total, "")) + 1, total
+
+
+class WeeklyLeaderboard:
+    """
+    全科目の順位と、科目ごとの順位を持つ。今週より前の記録は無視し、週が変わったら空にする。
+    """
+
+    def __init__(self, today=None, clock=datetime.now):
+        self._clock = clock
+        self._lock = threading.Lock()
+        self.week = week_start(today or clock().date())
+        self._overall = _RankIndex()
+        self._subjects = {}
+
+    def _roll(self, day):
+        # 呼び出し側でロックを取っておく
+        start = week_start(day)
+        if start > self.week:
+            self.week = start
+            self._overall = _RankIndex()
+            self._subjects = {}
+
+    def add(self, user_id, subject, minutes, when=None):
+        day = _to_date(when) if when is not None else self._clock().date()
+        minutes = int(minutes or 0)
+        if not user_id or minutes <= 0:
+            return False
+        with self._lock:
+            self._roll(day)
+            if week_start(day) != self.week:
+                return False
+            self._overall.add(user_id, minutes)
+            self._subjects.setdefault(subject, _RankIndex()).add(user_id, minutes)
+        return True
+
+    def rebuild(self, rows, today=None):
+        """
+        rows: 今週分の (user_id, date, subject, minutes)（集計テーブルの daily_rows_between の形）
+        """
+        today = today or self._clock().date()
+        with self._lock:
+            self.week = week_start(today)
+            self._overall = _RankIndex()
+            self._subjects = {}
+        for user_id, day, subject, minutes in rows:
+            self.add(user_id, subject, minutes, when=day)
+
+    def top(self, k=TOP_K, subject=None):
+        with self._lock:
+            self._roll(self._clock().date())
+            index = self._subjects.get(subject) if subject else self._overall
+            return index.top(k) if index else []
+
+    def rank(self, user_id, subject=None):
+        with self._lock:
+            self._roll(self._clock().date())
+            index = self._subjects.get(subject) if subject else self._overall
+            return index.rank(user_id) if index else None
+
+
+# =========================
+# 💬 返信文
+# =========================
+def mask_user_id(user_id):
+    # ほかのユーザーの ID をそのまま見せない
+    return f"ユーザー…{user_id[-4:]}"
+
+
+def format_leaderboard(leaderboard, user_id, subject=None, k=TOP_K):
+    title = f"🏆 今週のランキング（{subject}）" if subject else "🏆 今週のランキング"
+    lines = [title]
+    top = leaderboard.top(k, subject)
+    if not top:
+        lines.append("今週の記録はまだありません。")
+        return "\n".join(lines)
+
+    rank = 0
+    previous = None
+    for i, (uid, minutes) in enumerate(top, start=1):
+        if minutes != previous:
+            rank, previous = i, minutes
+        name = "あなた" if uid == user_id else mask_user_id(uid)
+        lines.append(f"{rank}位 {name} {minutes}分")
+
+    mine = leaderboard.rank(user_id, subject)
+    if mine:
+        lines.append(f"\nあなたは {mine[0]}位（{mine[1]}分）です！")
+    else:
+        lines.append("\nあなたの今週の記録はまだありません。")
+    return "\n".join(lines)
+
+
+# =========================
+# 🧩 プロセス共有のランキング
+# =========================
+_leaderboard = None
+_leaderboard_lock = threading.Lock()
+
+
+def get_leaderboard():
+    """
+    初回に今週分を集計テーブルから作る。record_study_log は保存の前にこれを呼ぶので、
+    作り直しと記録が重なっても同じ記録を二重に数えない。
+    """
+    global _leaderboard
+    if _leaderboard is None:
+        with _leaderboard_lock:
+            if _leaderboard is None:
+                from storage import get_storage
+
+                today = datetime.now().date()
+                with span("leaderboard.rebuild"):
+                    rows = get_storage().daily_rows_between(week_start(today).strftime("%Y/%m/%d"),
+                                                            today.strftime("%Y/%m/%d"))
+                    leaderboard = WeeklyLeaderboard(today)
+                    leaderboard.rebuild(rows, today)
+                _leaderboard = leaderboard
+    return _leaderboard
+
+
+def reset_leaderboard():
+    global _leaderboard
+    with _leaderboard_lock:
+        _leaderboard = None
+
+
+def warm_leaderboard():
+    """
+    起動時にバックグラウンドで作っておく（失敗しても最初の利用時にもう一度試す）。
+    """
+    def run():
+        try:
+            get_leaderboard()
+        except Exception as e:
+            print(f"⚠️ ランキングの作成に失敗しました: {e}")
+
+    thread = threading.Thread(target=run, name="leaderboard-warmup", daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,172 @@
+# notify_settings.py
+# StudyMeBotNotify の「見出し→列」「user_id→行」をキャッシュし、変更をまとめて batch_update する
+
+import atexit
+import os
+import threading
+
+from metrics_utils.metrics import span
+
+DEFAULT_VALUE = "OFF"
+RETRY_SECONDS = 5
+
+
+def _column_letter(n):
+    letters = ""
+    while n > 0:
+        n, rem = divmod(n - 1, 26)
+        letters = chr(65 + rem) + letters
+    return letters
+
+
+class NotifySettingsStore:
+    """
+    set_time() は変更をメモリにためるだけで、coalesce_ms 以内に来た変更は
+    1回の batch_update にまとめて書き込む。新規ユーザーの行も同じ呼び出しで書く。
+    """
+
+    def __init__(self, get_worksheet, coalesce_ms=200):
+        self._get_worksheet = get_worksheet
+        self.coalesce = coalesce_ms / 1000
+        self._lock = threading.RLock()
+        self._header = None
+        self._columns = None
+        self._rows = None
+        self._next_row = None
+        # user_id -> {列名: 値}
+        self._pending = {}
+        self._timer = None
+
+    # =========================
+    # 📇 インデックス
+    # =========================
+    def _ensure_index(self):
+        if self._rows is not None:
+            return
+        values = self._get_worksheet().get_all_values()
+        self._header = [str(h).strip() for h in values[0]] if values else ["user_id"]
+        self._columns = {label: i + 1 for i, label in enumerate(self._header)}
+        user_col = self._columns["user_id"] - 1
+        self._rows = {}
+        for row_no, row in enumerate(values[1:], start=2):
+            if len(row) > user_col and row[user_col]:
+                self._rows[row[user_col]] = row_no
+        self._next_row = len(values) + 1
+
+    def invalidate(self):
+        with self._lock:
+            self._rows = None
+
+    def has_column(self, label):
+        with self._lock:
+            self._ensure_index()
+            return label in self._columns
+
+    def has_user(self, user_id):
+        with self._lock:
+            self._ensure_index()
+            return user_id in self._rows
+
+    # =========================
+    # ✍️ 変更
+    # =========================
+    def set_time(self, user_id, label, value):
+        """
+        変更を予約する。既存ユーザーなら True、新規登録になるなら False を返す。
+        """
+        with self._lock:
+            self._ensure_index()
+            if label not in self._columns:
+                raise KeyError(f"列 '{label}' が見つかりません")
+            existed = user_id in self._rows
+            self._pending.setdefault(user_id, {})[label] = value
+            if self._timer is None:
+                self._timer = threading.Timer(self.coalesce, self._flush_from_timer)
+                self._timer.daemon = True
+                self._timer.start()
+            return existed
+
+    def _flush_from_timer(self):
+        try:
+            self.flush()
+        except Exception as e:
+            print(f"❌ 通知設定の書き込みに失敗しました（{RETRY_SECONDS}秒後に再試行）: {e}")
+            with self._lock:
+                if self._timer is None and self._pending:
+                    self._timer = threading.Timer(RETRY_SECONDS, self._flush_from_timer)
+                    self._timer.daemon = True
+                    self._timer.start()
+
+    def flush(self):
+        """
+        たまった変更を1回の batch_update で書き込む。
+        """
+        with self._lock:
+            self._timer = None
+            pending, self._pending = self._pending, {}
+            if not pending:
+                return 0
+            self._ensure_index()
+
+            data = []
+            new_rows = {}
+            next_row = self._next_row
+            last_col = _column_letter(len(self._header))
+            for user_id, changes in pending.items():
+                row_no = self._rows.get(user_id)
+                if row_no is None:
+                    # 新規ユーザー：指定以外の時間帯は OFF で1行まるごと書く
+                    row_no = new_rows[user_id] = next_row
+                    next_row += 1
+                    values = [user_id if col == "user_id" else changes.get(col, DEFAULT_VALUE)
+                              for col in self._header]
+                    data.append({"range": f"A{row_no}:{last_col}{row_no}", "values": [values]})
+                    continue
+                for label, value in changes.items():
+                    cell = f"{_column_letter(self._columns[label])}{row_no}"
+                    data.append({"range": cell, "values": [[value]]})
+
+            ws = self._get_worksheet()
+            try:
+                with span("notify_settings.batch_update"):
+                    if next_row - 1 > ws.row_count:
+                        ws.add_rows(next_row - 1 - ws.row_count)
+                    ws.batch_update(data)
+            except Exception:
+                # 書けなかった分は戻し、インデックスも読み直す
+                for user_id, changes in pending.items():
+                    self._pending.setdefault(user_id, {}).update(changes)
+                self._rows = None
+                raise
+
+            self._rows.update(new_rows)
+            self._next_row = next_row
+            return len(data)
+
+    def close(self):
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+        try:
+            self.flush()
+        except Exception as e:
+            print(f"⚠️ 終了時の通知設定の書き込みに失敗しました: {e}")
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_notify_settings_store():
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                from spreadsheet_utils.sheets_client import NOTIFY_BOOK, get_spreadsheet
+
+                _store = NotifySettingsStore(
+                    lambda: get_spreadsheet(NOTIFY_BOOK).sheet1,
+                    coalesce_ms=int(os.getenv("NOTIFY_COALESCE_MS", "200"))
+                )
+                atexit.register(_store.close)
+    return _store
@@ -0,0 +1,192 @@
+# quota_governor.py
+# Sheets API のクォータ（1分あたりの読み取り・書き込み回数）を、同じホストの全プロセスで分け合う
+# トークンバケットは読み取り / 書き込みの2つ。状態はファイルに置き、fcntl のロックで排他する
+
+import contextvars
+import json
+import os
+import random
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows など：プロセス内だけで制御する
+    fcntl = None
+
+READ = "read"
+WRITE = "write"
+
+INTERACTIVE = "interactive"
+BULK = "bulk"
+
+# 1分あたりの上限（サービスアカウント1つ＝1ユーザーの既定クォータ）
+READS_PER_MINUTE = float(os.getenv("SHEETS_READS_PER_MINUTE", "60"))
+WRITES_PER_MINUTE = float(os.getenv("SHEETS_WRITES_PER_MINUTE", "60"))
+# 続けて使える回数（バケットの容量）
+BURST = float(os.getenv("SHEETS_BURST", "10"))
+# cron の一括処理は、この数だけ webhook 用にトークンを残して待つ
+INTERACTIVE_RESERVE = float(os.getenv("SHEETS_INTERACTIVE_RESERVE", "3"))
+
+MAX_RETRIES = int(os.getenv("SHEETS_MAX_RETRIES", "5"))
+BACKOFF_BASE_SECONDS = 1.0
+BACKOFF_MAX_SECONDS = 64.0
+# 待ち時間は細かく区切って、ほかのプロセスが返した分をすぐ使えるようにする
+MAX_SLEEP_STEP = 1.0
+
+_priority = contextvars.ContextVar("sheets_priority", default=None)
+_default_priority = os.getenv("SHEETS_PRIORITY", INTERACTIVE)
+
+
+def set_default_priority(priority):
+    """
+    プロセス全体の優先度。cron ジョブは main() の最初に BULK にする。
+    """
+    global _default_priority
+    _default_priority = priority
+
+
+@contextmanager
+def request_priority(priority):
+    token = _priority.set(priority)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+def current_priority():
+    return _priority.get() or _default_priority
+
+
+def backoff_delay(attempt):
+    """
+    full jitter：0〜base×2^attempt（上限あり）の一様乱数。
+    """
+    return random.uniform(0, min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * (2 ** attempt)))
+
+
+class QuotaGovernor:
+    """
+    acquire() でトークンを1つ取ってから API を呼ぶ。足りなければ補充されるまで待つ。
+    BULK の要求は INTERACTIVE_RESERVE 個を残して待つので、webhook の書き込みが先に通る。
+    429 を受けたら penalize() でバケットを空にし、同じホストのほかのプロセスも待たせる。
+    """
+
+    def __init__(self, state_path, rates=None, burst=BURST, reserve=INTERACTIVE_RESERVE,
+                 clock=time.time, sleep=time.sleep):
+        self.state_path = state_path
+        # 1秒あたりの補充量
+        self.rates = rates or {READ: READS_PER_MINUTE / 60, WRITE: WRITES_PER_MINUTE / 60}
+        self.burst = burst
+        self.reserve = reserve
+        self._clock = clock
+        self._sleep = sleep
+        self._thread_lock = threading.Lock()
+
+    # =========================
+    # 🔒 共有状態
+    # =========================
+    @contextmanager
+    def _locked_state(self):
+        with self._thread_lock:
+            fd = os.open(self.state_path, os.O_RDWR | os.O_CREAT, 0o600)
+            try:
+                if fcntl is not None:
+                    fcntl.flock(fd, fcntl.LOCK_EX)
+                raw = b""
+                while True:
+                    chunk = os.read(fd, 4096)
+                    if not chunk:
+                        break
+                    raw += chunk
+                try:
+                    state = json.loads(raw) if raw else {}
+                except ValueError:
+                    state = {}
+                yield state
+                data = json.dumps(state).encode()
+                os.lseek(fd, 0, os.SEEK_SET)
+                os.ftruncate(fd, 0)
+                os.write(fd, data)
+            finally:
+                os.close(fd)  # ロックも一緒に外れる
+
+    def _refill(self, state, quota_class, now):
+        tokens, updated_at = state.get(quota_class, (self.burst, now))
+        tokens = min(self.burst, tokens + max(now - updated_at, 0) * self.rates[quota_class])
+        return tokens
+
+    # =========================
+    # 🪙 トークン
+    # =========================
+    def acquire(self, quota_class, priority=None):
+        """
+        トークンを1つ取る。待った秒数を返す。
+        """
+        priority = priority or current_priority()
+        floor = self.reserve if priority == BULK else 0
+        waited = 0.0
+        while True:
+            with self._locked_state() as state:
+                now = self._clock()
+                tokens = self._refill(state, quota_class, now)
+                if tokens - 1 >= floor:
+                    state[quota_class] = (tokens - 1, now)
+                    return waited
+                state[quota_class] = (tokens, now)
+                wait = (1 + floor - tokens) / self.rates[quota_class]
+            # 同時に起きて取り合わないよう少し揺らす
+            delay = min(wait, MAX_SLEEP_STEP) * random.uniform(1.0, 1.2)
+            self._sleep(delay)
+            waited += delay
+
+    def penalize(self, quota_class):
+        with self._locked_state() as state:
+            now = self._clock()
+            state[quota_class] = (min(0.0, self._refill(state, quota_class, now)), now)
+
+    def tokens(self, quota_class):
+        with self._locked_state() as state:
+            return self._refill(state, quota_class, self._clock())
+
+
+def quota_class_for(method, endpoint):
+    """
+    Sheets の GET は読み取り、それ以外は書き込み。Drive は別クォータなので対象外（None）。
+    """
+    if "/drive/" in endpoint:
+        return None
+    return READ if method.upper() == "GET" else WRITE
+
+
+def is_idempotent(method, endpoint):
+    """
+    同じ要求をもう一度送っても結果が変わらないか（5xx を再試行してよいか）。
+    GET と、値の上書き（values の PUT / values:batchUpdate）・消去だけ。
+    values:append や spreadsheets:batchUpdate（行の追加など）は、届いていたら二重になるので False。
+    """
+    method = method.upper()
+    path = endpoint.split("?", 1)[0]
+    if method == "GET":
+        return True
+    if method == "PUT":
+        return "/values/" in path
+    return method == "POST" and path.endswith(("/values:batchUpdate", "/values:batchClear", ":clear"))
+
+
+_governor = None
+_governor_lock = threading.Lock()
+
+
+def get_quota_governor():
+    global _governor
+    if _governor is None:
+        with _governor_lock:
+            if _governor is None:
+                path = os.getenv("SHEETS_QUOTA_STATE",
+                                 os.path.join(tempfile.gettempdir(), "studymebot_sheets_quota.json"))
+                _governor = QuotaGovernor(path)
+    return _governor
@@ -0,0 +1,317 @@
+# read_replica.py
+# StudyLog / Goals のローカル読み取りレプリカ（SQLite、(user_id, date) にインデックス）
+
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+
+from spreadsheet_utils.study_log_writer import STUDY_LOG_HEADER
+
+STUDY_LOG_SHEET = "StudyLog"
+GOALS_TABLE = "goals"
+STUDY_LOG_TABLE = "study_log"
+
+# 同じシートを続けて同期しない間隔（秒）
+SYNC_INTERVAL_SECONDS = float(os.getenv("REPLICA_SYNC_SECONDS", "5"))
+# 目標シートは上書き更新されるので、この間隔で全件読み直す
+GOAL_FULL_SYNC_SECONDS = float(os.getenv("REPLICA_GOAL_FULL_SYNC_SECONDS", "600"))
+
+_DATE_PATTERN = re.compile(r"(\d{4})[-/](\d{1,2})[-/](\d{1,2})")
+
+
+def normalize_date(value):
+    """
+    "2026-10-18T20:00:00" / "2026/10/18" / "2026/1/5 8:00" などを "YYYY/MM/DD" にそろえる。
+    """
+    match = _DATE_PATTERN.search(str(value))
+    if not match:
+        return ""
+    year, month, day = match.groups()
+    return f"{year}/{int(month):02}/{int(day):02}"
+
+
+def _to_int(value):
+    try:
+        return int(float(value))
+    except (TypeError, ValueError):
+        return 0
+
+
+class ReadReplica:
+    """
+    シートの「同期済み行数」をウォーターマークにして、増えた行だけを取り込む。
+    最後に取り込んだ行が変わっていたら（削除・並べ替えなど）全件を取り込み直す。
+    rollup を渡すと、取り込んだ学習記録を集計テーブルにも反映する（全件取り込み時はシートにある期間だけ作り直す）。
+    """
+
+    def __init__(self, path=":memory:", rollup=None):
+        self.rollup = rollup
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS study_log (
+                row_no INTEGER PRIMARY KEY,
+                user_id TEXT NOT NULL,
+                date TEXT NOT NULL,
+                datetime TEXT,
+                subject TEXT,
+                minutes INTEGER NOT NULL DEFAULT 0,
+                record_id TEXT
+            );
+            CREATE INDEX IF NOT EXISTS idx_study_log_user_date ON study_log (user_id, date);
+            CREATE INDEX IF NOT EXISTS idx_study_log_date ON study_log (date);
+
+            CREATE TABLE IF NOT EXISTS goals (
+                row_no INTEGER PRIMARY KEY,
+                user_id TEXT NOT NULL,
+                start_date TEXT NOT NULL,
+                unit TEXT,
+                type TEXT,
+                value INTEGER NOT NULL DEFAULT 0
+            );
+            CREATE INDEX IF NOT EXISTS idx_goals_user_date ON goals (user_id, start_date);
+            CREATE INDEX IF NOT EXISTS idx_goals_date ON goals (start_date);
+
+            CREATE TABLE IF NOT EXISTS watermarks (
+                tbl TEXT PRIMARY KEY,
+                rows INTEGER NOT NULL,
+                header TEXT NOT NULL,
+                last_row TEXT NOT NULL,
+                synced_at REAL NOT NULL,
+                full_synced_at REAL NOT NULL
+            );
+        """)
+        # record_id 列を足す前に作ったファイル
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(study_log)")}
+        if "record_id" not in columns:
+            self._conn.execute("ALTER TABLE study_log ADD COLUMN record_id TEXT")
+            self._conn.commit()
+        self._checked_at = {}
+
+    # =========================
+    # 🔄 同期
+    # =========================
+    def sync_study_log(self, worksheet, force=False):
+        return self._sync(STUDY_LOG_TABLE, worksheet, self._study_log_row, force=force, columns=STUDY_LOG_HEADER)
+
+    def sync_goals(self, worksheet, force=False):
+        return self._sync(GOALS_TABLE, worksheet, self._goal_row, force=force,
+                          full_sync_seconds=GOAL_FULL_SYNC_SECONDS)
+
+    @staticmethod
+    def _study_log_row(record):
+        return (
+            "INSERT OR REPLACE INTO study_log (row_no, user_id, date, datetime, subject, minutes, record_id) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (str(record.get("user_id", "")), normalize_date(record.get("datetime", "")),
+             record.get("datetime", ""), record.get("subject", ""), _to_int(record.get("minutes")),
+             record.get("record_id", ""))
+        )
+
+    @staticmethod
+    def _goal_row(record):
+        return (
+            "INSERT OR REPLACE INTO goals (row_no, user_id, start_date, unit, type, value) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (str(record.get("user_id", "")), normalize_date(record.get("start_date", "")),
+             record.get("unit", ""), record.get("type", ""), _to_int(record.get("value")))
+        )
+
+    def _sync(self, table, worksheet, to_row, force=False, full_sync_seconds=None, columns=None):
+        with self._lock:
+            now = time.time()
+            if not force and now - self._checked_at.get(table, 0) < SYNC_INTERVAL_SECONDS:
+                return 0
+            self._checked_at[table] = now
+
+            mark = self._conn.execute(
+                "SELECT rows, header, last_row, full_synced_at FROM watermarks WHERE tbl = ?", (table,)
+            ).fetchone()
+            if mark and full_sync_seconds is not None and now - mark[3] >= full_sync_seconds:
+                mark = None
+
+            if mark and mark[0] > 0:
+                rows, header, last_row = mark[0], _with_columns(json.loads(mark[1]), columns), json.loads(mark[2])
+                # 最後に取り込んだ行（シート上は rows + 1 行目）から読む
+                values = worksheet.get(f"A{rows + 1}:{_column_letter(len(header))}")
+                if values and _pad(values[0], len(header)) == last_row:
+                    return self._apply(table, header, rows, values[1:], to_row, now, mark_full=False)
+                print(f"🔁 {table} の末尾が変わっていたため全件を取り込み直します")
+
+            values = worksheet.get("A1:Z")
+            if not values:
+                return 0
+            header = _with_columns([str(h).strip() for h in values[0]], columns)
+            self._conn.execute(f"DELETE FROM {table}")
+            return self._apply(table, header, 0, values[1:], to_row, now, mark_full=True)
+
+    def _apply(self, table, header, rows, new_values, to_row, now, mark_full):
+        statements = []
+        records = []
+        row_no = rows
+        last_row = None
+        for values in new_values:
+            row_no += 1
+            last_row = _pad(values, len(header))
+            record = dict(zip(header, last_row))
+            sql, params = to_row(record)
+            statements.append((sql, (row_no,) + params))
+            # record_id のない行（列を足す前の行）は、集計テーブルで行番号を ID の代わりにする
+            records.append(dict(record, row_no=row_no))
+
+        if table == STUDY_LOG_TABLE and self.rollup is not None:
+            if mark_full:
+                # アーカイブで先頭の月がシートから消えても、それより前の集計は残す
+                dates = [d for d in (normalize_date(r.get("datetime", "")) for r in records) if d]
+                if dates:
+                    self.rollup.rebuild(records, since=min(dates))
+            else:
+                self.rollup.apply(records)
+
+        if last_row is None:
+            # 新しい行なし：同期時刻だけ更新
+            self._conn.execute("UPDATE watermarks SET synced_at = ? WHERE tbl = ?", (now, table))
+            if mark_full:
+                self._save_watermark(table, 0, header, [], now, now)
+            self._conn.commit()
+            return 0
+
+        for sql, params in statements:
+            self._conn.execute(sql, params)
+        full_synced_at = now if mark_full else self._conn.execute(
+            "SELECT full_synced_at FROM watermarks WHERE tbl = ?", (table,)
+        ).fetchone()[0]
+        self._save_watermark(table, row_no, header, last_row, now, full_synced_at)
+        self._conn.commit()
+        return len(statements)
+
+    def apply_goal(self, row_no, record):
+        """
+        目標シートの row_no 行目に書いた内容をそのまま反映する（GoalIndex の上書きは増分同期では拾えないため）。
+        record: 目標シートの列名 -> 値
+        """
+        sql, params = self._goal_row(record)
+        with self._lock:
+            self._conn.execute(sql, (row_no,) + params)
+            self._conn.commit()
+
+    def invalidate(self, table):
+        """
+        ウォーターマークを消し、次の同期で全件を取り込み直させる。
+        """
+        with self._lock:
+            self._conn.execute("DELETE FROM watermarks WHERE tbl = ?", (table,))
+            self._conn.commit()
+            self._checked_at.pop(table, None)
+
+    def _save_watermark(self, table, rows, header, last_row, synced_at, full_synced_at):
+        self._conn.execute(
+            "INSERT OR REPLACE INTO watermarks (tbl, rows, header, last_row, synced_at, full_synced_at) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (table, rows, json.dumps(header, ensure_ascii=False), json.dumps(last_row, ensure_ascii=False),
+             synced_at, full_synced_at)
+        )
+
+    # =========================
+    # 🔎 参照
+    # =========================
+    def study_minutes(self, user_id, date_str):
+        with self._lock:
+            return self._conn.execute(
+                "SELECT COALESCE(SUM(minutes), 0) FROM study_log WHERE user_id = ? AND date = ?",
+                (user_id, normalize_date(date_str))
+            ).fetchone()[0]
+
+    def study_records(self):
+        """
+        取り込み済みの学習記録を全件 dict で返す（集計テーブルの作り直し用）。
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT datetime, user_id, subject, minutes, record_id, row_no FROM study_log ORDER BY row_no"
+            ).fetchall()
+        return [dict(zip(("datetime", "user_id", "subject", "minutes", "record_id", "row_no"), row))
+                for row in rows]
+
+    def goal(self, user_id, date_str):
+        """
+        同じ日の目標が複数行あれば最後の行を使う。
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value FROM goals WHERE user_id = ? AND start_date = ? ORDER BY row_no DESC LIMIT 1",
+                (user_id, normalize_date(date_str))
+            ).fetchone()
+        return row[0] if row else None
+
+    def study_rows_on(self, date_str):
+        """
+        指定日の (user_id, subject, minutes) を全ユーザー分まとめて返す。
+        """
+        with self._lock:
+            return self._conn.execute(
+                "SELECT user_id, subject, minutes FROM study_log WHERE date = ?", (normalize_date(date_str),)
+            ).fetchall()
+
+    def goal_rows_on(self, date_str):
+        """
+        指定日の (row_no, user_id, value) を全ユーザー分まとめて返す。
+        """
+        with self._lock:
+            return self._conn.execute(
+                "SELECT row_no, user_id, value FROM goals WHERE start_date = ?", (normalize_date(date_str),)
+            ).fetchall()
+
+    def user_ids(self):
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT user_id FROM study_log UNION SELECT user_id FROM goals"
+            ).fetchall()
+        return [r[0] for r in rows if r[0]]
+
+
+def _with_columns(header, columns):
+    """
+    シートのヘッダーが columns の先頭だけ（列を足す前）なら、後ろの列名を補って読めるようにする。
+    """
+    if columns and len(header) < len(columns) and header == list(columns[:len(header)]):
+        return header + list(columns[len(header):])
+    return header
+
+
+def _pad(values, width):
+    values = [str(v) for v in values[:width]]
+    return values + [""] * (width - len(values))
+
+
+def _column_letter(n):
+    letters = ""
+    while n > 0:
+        n, rem = divmod(n - 1, 26)
+        letters = chr(65 + rem) + letters
+    return letters or "A"
+
+
+_replica = None
+_replica_lock = threading.Lock()
+
+
+def get_read_replica():
+    """
+    プロセス共有のレプリカ。REPLICA_PATH を指定すると再起動後もウォーターマークを引き継ぐ。
+    """
+    global _replica
+    if _replica is None:
+        with _replica_lock:
+            if _replica is None:
+                from spreadsheet_utils.study_rollup import get_study_rollup
+
+                rollup = get_study_rollup()
+                _replica = ReadReplica(os.getenv("REPLICA_PATH", "study_replica.sqlite3"), rollup=rollup)
+                # 集計テーブルだけ失われていたら、取り込み済みの行から作り直す
+                if rollup.is_empty():
+                    rollup.rebuild(_replica.study_records())
+    return _replica
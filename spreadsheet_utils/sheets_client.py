@@ -0,0 +1,250 @@
+# sheets_client.py
+# プロセス全体で共有する Google Sheets クライアントとハンドルのレジストリ
+
+import datetime
+import json
+import os
+import threading
+import time
+
+import gspread
+from google.auth.transport.requests import Request
+from google.oauth2.service_account import Credentials
+from gspread.http_client import HTTPClient
+
+from metrics_utils.metrics import record_google_api_call, span
+from spreadsheet_utils.quota_governor import (
+    MAX_RETRIES as QUOTA_MAX_RETRIES, backoff_delay, get_quota_governor, is_idempotent, quota_class_for
+)
+
+SCOPES = [
+    "https://spreadsheets.google.com/feeds",
+    "https://www.googleapis.com/auth/drive"
+]
+
+# スプレッドシート名と、名前検索（Drive API）を省略するための任意のキー
+STUDY_LOG_BOOK = "StudyMeBotStudyLog"
+NOTIFY_BOOK = "StudyMeBotNotify"
+# 目標シート名（実際のタブ名は全角の「（」＋半角の「)」）
+GOAL_SHEET_NAME = "Goals（daily)"
+BOOK_KEY_ENV = {
+    STUDY_LOG_BOOK: "STUDY_LOG_SHEET_KEY",
+    NOTIFY_BOOK: "NOTIFY_SHEET_KEY"
+}
+
+# トークン失効の何秒前にバックグラウンドで更新するか
+REFRESH_MARGIN_SECONDS = 300
+REFRESH_RETRY_SECONDS = 30
+
+_lock = threading.RLock()
+_credentials = None
+_client = None
+_spreadsheets = {}
+_worksheets = {}
+_worksheet_titles = {}
+_refresh_thread = None
+
+
+# =========================
+# 📈 API 呼び出しの計測とクォータ制御
+# =========================
+class GovernedHTTPClient(HTTPClient):
+    """
+    gspread の HTTP 呼び出しを1回ずつ
+    ・クォータのトークンを取ってから送り（読み取り / 書き込み別、同じホストの全プロセスで共有）
+    ・429 と、冪等な要求（GET・値の上書き）の 5xx は揺らぎつき指数バックオフで再試行し
+      （values:append などの 5xx は届いている場合があるので呼び出し側に返し、WAL / チェックポイントでやり直す）
+    ・回数と所要時間を記録する。
+    """
+
+    def request(self, method, endpoint, *args, **kwargs):
+        api = "drive" if "/drive/" in endpoint else "sheets"
+        quota_class = quota_class_for(method, endpoint)
+        idempotent = is_idempotent(method, endpoint)
+        governor = get_quota_governor()
+        for attempt in range(QUOTA_MAX_RETRIES + 1):
+            if quota_class is not None:
+                governor.acquire(quota_class)
+            status = "error"
+            started = time.perf_counter()
+            try:
+                response = super().request(method, endpoint, *args, **kwargs)
+                status = response.status_code
+                return response
+            except gspread.exceptions.APIError as e:
+                status = e.response.status_code
+                retryable = status == 429 or (status >= 500 and idempotent)
+                if not retryable or attempt == QUOTA_MAX_RETRIES:
+                    raise
+                if status == 429 and quota_class is not None:
+                    governor.penalize(quota_class)
+            finally:
+                record_google_api_call(f"{api}.{method.upper()}", status, time.perf_counter() - started)
+            delay = backoff_delay(attempt)
+            print(f"⏳ Google API {status} のため {delay:.1f} 秒待って再試行します（{attempt + 1}/{QUOTA_MAX_RETRIES}）")
+            time.sleep(delay)
+
+
+# =========================
+# 🔐 認証
+# =========================
+def load_credentials():
+    """
+    GOOGLE_CREDS_JSON（なければローカルの credentials.json）から認証情報を作る。
+    一時ファイルは作らない。
+    """
+    creds_json = os.getenv("GOOGLE_CREDS_JSON")
+    if creds_json:
+        return Credentials.from_service_account_info(json.loads(creds_json), scopes=SCOPES)
+    return Credentials.from_service_account_file("credentials.json", scopes=SCOPES)
+
+
+def get_client():
+    """
+    プロセス内で一度だけ authorize した gspread クライアントを返す。
+    """
+    global _credentials, _client
+    if _client is not None:
+        return _client
+    with _lock:
+        if _client is None:
+            with span("sheets.auth"):
+                _credentials = load_credentials()
+                _credentials.refresh(Request())
+                _client = gspread.authorize(_credentials, http_client=GovernedHTTPClient)
+            _start_refresh_thread(_credentials)
+    return _client
+
+
+def _seconds_until_refresh(creds):
+    expiry = creds.expiry
+    if expiry is None:
+        return REFRESH_RETRY_SECONDS
+    # google-auth の expiry は naive な UTC
+    remaining = (expiry - datetime.datetime.utcnow()).total_seconds()
+    return max(remaining - REFRESH_MARGIN_SECONDS, 0)
+
+
+def _refresh_loop(creds, stop_event):
+    while not stop_event.wait(_seconds_until_refresh(creds)):
+        try:
+            with _lock:
+                creds.refresh(Request())
+        except Exception as e:
+            print(f"⚠️ アクセストークンの更新に失敗しました: {e}")
+            if stop_event.wait(REFRESH_RETRY_SECONDS):
+                break
+
+
+def _start_refresh_thread(creds):
+    global _refresh_thread
+    stop_event = threading.Event()
+    thread = threading.Thread(
+        target=_refresh_loop, args=(creds, stop_event), name="sheets-token-refresh", daemon=True
+    )
+    thread.stop_event = stop_event
+    thread.start()
+    _refresh_thread = thread
+
+
+# =========================
+# 📄 ハンドルのキャッシュ
+# =========================
+def get_spreadsheet(book=STUDY_LOG_BOOK):
+    """
+    Spreadsheet をキャッシュから返す。キーが環境変数にあれば open_by_key で開く。
+    """
+    sh = _spreadsheets.get(book)
+    if sh is not None:
+        return sh
+    with _lock:
+        sh = _spreadsheets.get(book)
+        if sh is None:
+            client = get_client()
+            key = os.getenv(BOOK_KEY_ENV.get(book, ""), "")
+            sh = client.open_by_key(key) if key else client.open(book)
+            _spreadsheets[book] = sh
+    return sh
+
+
+def list_worksheets(book=STUDY_LOG_BOOK, refresh=False):
+    """
+    ワークシート一覧を1回の API 呼び出しで取得し、各ハンドルもキャッシュする。
+    """
+    with _lock:
+        titles = _worksheet_titles.get(book)
+        if titles is not None and not refresh:
+            return [_worksheets[(book, t)] for t in titles]
+        worksheets = get_spreadsheet(book).worksheets()
+        for ws in worksheets:
+            _worksheets[(book, ws.title)] = ws
+        _worksheet_titles[book] = [ws.title for ws in worksheets]
+        return worksheets
+
+
+def get_worksheet(book, title):
+    """
+    Worksheet をキャッシュから返す。存在しなければ gspread.exceptions.WorksheetNotFound。
+    """
+    ws = _worksheets.get((book, title))
+    if ws is not None:
+        return ws
+    with _lock:
+        ws = _worksheets.get((book, title))
+        if ws is None:
+            ws = get_spreadsheet(book).worksheet(title)
+            _register_worksheet(book, ws)
+    return ws
+
+
+def get_or_create_worksheet(book, title, rows=1000, cols=4, header=None):
+    """
+    Worksheet を返す。なければ作成し、header があれば1行目に書き込む。
+    """
+    try:
+        return get_worksheet(book, title)
+    except gspread.exceptions.WorksheetNotFound:
+        pass
+    with _lock:
+        ws = _worksheets.get((book, title))
+        if ws is not None:
+            return ws
+        ws = get_spreadsheet(book).add_worksheet(title=title, rows=str(rows), cols=str(cols))
+        if header:
+            ws.append_row(header)
+        _register_worksheet(book, ws)
+        return ws
+
+
+def _register_worksheet(book, ws):
+    _worksheets[(book, ws.title)] = ws
+    titles = _worksheet_titles.get(book)
+    if titles is not None and ws.title not in titles:
+        titles.append(ws.title)
+
+
+def forget_worksheet(book, title):
+    """
+    削除したワークシートをキャッシュから外す。
+    """
+    with _lock:
+        _worksheets.pop((book, title), None)
+        titles = _worksheet_titles.get(book)
+        if titles is not None and title in titles:
+            titles.remove(title)
+
+
+def reset():
+    """
+    クライアントとキャッシュを破棄する（認証情報の差し替え時など）。
+    """
+    global _credentials, _client, _refresh_thread
+    with _lock:
+        if _refresh_thread is not None:
+            _refresh_thread.stop_event.set()
+        _credentials = None
+        _client = None
+        _refresh_thread = None
+        _spreadsheets.clear()
+        _worksheets.clear()
+        _worksheet_titles.clear()
@@ -1,22 +1,7 @@
-import gspread
-from google.oauth2.service_account import Credentials
+from spreadsheet_utils.sheets_client import NOTIFY_BOOK, get_spreadsheet
 
-# スコープ設定（Google Sheets & Drive）
-SCOPES = [
-    "https://www.googleapis.com/auth/spreadsheets",
-    "https://www.googleapis.com/auth/drive"
-]
-
-# 認証情報を読み込み
-creds = Credentials.from_service_account_file(
-    "credentials.json", scopes=SCOPES
-)
-
-# スプレッドシートにアクセス
-gc = gspread.authorize(creds)
-
-# スプレッドシート名を指定して開く
-sh = gc.open("StudyMeBotNotify")
+# 共有クライアントで開く（GOOGLE_CREDS_JSON がなければ credentials.json を使う）
+sh = get_spreadsheet(NOTIFY_BOOK)
 worksheet = sh.sheet1
 
 # 中身を確認（全行）
@@ -0,0 +1,263 @@
+# study_log_archive.py
+# 締まった月の StudyLog を月ごとのアーカイブシート（StudyLog_YYYY_MM）へ移し、ホットなシートを直近だけに保つ
+# どの月がどのシートにあるかは ArchiveManifest に残し、過去の記録はそこからたどる
+# 実行（毎月1日）: python -m spreadsheet_utils.study_log_archive
+
+import os
+from collections import Counter
+from datetime import datetime
+
+from metrics_utils.metrics import span, dump_metrics
+from spreadsheet_utils.quota_governor import BULK, set_default_priority
+from spreadsheet_utils.read_replica import normalize_date
+
+STUDY_LOG_SHEET = "StudyLog"
+MANIFEST_SHEET = "ArchiveManifest"
+MANIFEST_HEADER = ["month", "worksheet", "rows", "first_datetime", "last_datetime", "archived_at"]
+PARTITION_PREFIX = "StudyLog_"
+
+# 今月を含めて何か月分をホットに残すか。グラフ（週・月・14日推移）と目標レポートが読む範囲が収まるよう2か月
+KEEP_MONTHS = int(os.getenv("ARCHIVE_KEEP_MONTHS", "2"))
+# 1回の append_rows で書く行数
+CHUNK_ROWS = 500
+
+
+def month_of(value):
+    """
+    "2026-10-18T20:00:00" -> "2026/10"（日付でなければ ""）
+    """
+    date = normalize_date(value)
+    return date[:7] if date else ""
+
+
+def first_hot_month(today, keep_months=KEEP_MONTHS):
+    """
+    ホットに残す最初の月（"YYYY/MM"）。これより前の月がアーカイブの対象。
+    """
+    index = today.year * 12 + today.month - 1 - (max(keep_months, 1) - 1)
+    return f"{index // 12:04}/{index % 12 + 1:02}"
+
+
+def partition_title(month):
+    return PARTITION_PREFIX + month.replace("/", "_")
+
+
+def closed_rows(values, hot_from, column="datetime"):
+    """
+    values: シートの全セル（1行目はヘッダー）。
+    戻り値: {月: [(行番号, 行の値)]}（hot_from より前の月の行だけ）
+    """
+    if not values:
+        return {}
+    header = [str(h).strip() for h in values[0]]
+    col = header.index(column)
+    closed = {}
+    for row_no, row in enumerate(values[1:], start=2):
+        month = month_of(row[col] if col < len(row) else "")
+        if month and month < hot_from:
+            closed.setdefault(month, []).append((row_no, row))
+    return closed
+
+
+def row_ranges(row_nos):
+    """
+    行番号を連続した (start, end) にまとめ、下から順に返す（上の行を消しても下の番号がずれないように）。
+    """
+    ranges = []
+    for row_no in sorted(set(row_nos)):
+        if ranges and ranges[-1][1] == row_no - 1:
+            ranges[-1][1] = row_no
+        else:
+            ranges.append([row_no, row_no])
+    return [tuple(r) for r in reversed(ranges)]
+
+
+def delete_row_ranges(ws, row_nos):
+    for start, end in row_ranges(row_nos):
+        ws.delete_rows(start, end)
+
+
+def _entry_key(header, row):
+    # 行の値すべて（record_id も含む）。同じ時刻の別の記録を同じ行とみなさない
+    return tuple(str(v) for v in row[:len(header)]) + ("",) * (len(header) - len(row))
+
+
+# =========================
+# 📒 マニフェスト（月 -> アーカイブシート）
+# =========================
+class ArchiveManifest:
+    def __init__(self, ws):
+        self.ws = ws
+        values = ws.get_all_values()
+        self.rows = {}
+        self.entries = {}
+        for row_no, row in enumerate(values[1:], start=2):
+            if row and row[0]:
+                self.rows[row[0]] = row_no
+                self.entries[row[0]] = dict(zip(MANIFEST_HEADER, row))
+        self._next_row = len(values) + 1
+
+    def record(self, month, worksheet, rows, first_datetime, last_datetime):
+        entry = [month, worksheet, rows, first_datetime, last_datetime, datetime.now().isoformat(timespec="seconds")]
+        row_no = self.rows.get(month)
+        if row_no is None:
+            row_no = self.rows[month] = self._next_row
+            self._next_row += 1
+        self.ws.batch_update([{"range": f"A{row_no}:F{row_no}", "values": [entry]}])
+        self.entries[month] = dict(zip(MANIFEST_HEADER, [str(v) for v in entry]))
+
+    def partitions_between(self, start_str=None, end_str=None):
+        """
+        start〜end（"YYYY/MM/DD"、省略すると全期間）と重なる月のアーカイブシート名を古い順に返す。
+        """
+        first = month_of(start_str) if start_str else ""
+        last = month_of(end_str) if end_str else "9999/99"
+        return [self.entries[m]["worksheet"] for m in sorted(self.entries) if first <= m <= last]
+
+
+# =========================
+# 📦 アーカイブ
+# =========================
+def archive_month(book, header, month, rows):
+    """
+    1か月分の行をアーカイブシートに追記する。すでにある行（前回途中で止まった分）は書かない。
+    戻り値: (シート名, シート上の全行数, 最初の datetime, 最後の datetime)
+    """
+    title = partition_title(month)
+    ws = book.create_worksheet(title, rows=len(rows) + 1, cols=len(header), header=header)
+    existing = ws.get_all_values()[1:]
+    # 同じ値の行が複数あってもよいように、すでに書いた行は件数で差し引く
+    seen = Counter(_entry_key(header, r) for r in existing)
+    pending = []
+    for _, row in rows:
+        key = _entry_key(header, row)
+        if seen[key]:
+            seen[key] -= 1
+        else:
+            pending.append(row)
+    for i in range(0, len(pending), CHUNK_ROWS):
+        ws.append_rows(pending[i:i + CHUNK_ROWS])
+
+    col = header.index("datetime")
+    stamps = sorted(r[col] for r in existing + pending if col < len(r) and r[col])
+    return title, len(existing) + len(pending), stamps[0] if stamps else "", stamps[-1] if stamps else ""
+
+
+def trim_user_sheet(ws, hot_from):
+    """
+    ユーザーシート（1列目が datetime）から締まった月の行を消す。中身はアーカイブシートにある。
+    """
+    dates = ws.col_values(1)
+    stale = [row_no for row_no, value in enumerate(dates[1:], start=2) if "" < month_of(value) < hot_from]
+    delete_row_ranges(ws, stale)
+    return len(stale)
+
+
+def archive_study_log(book, today, watermarks=None, keep_months=KEEP_MONTHS):
+    """
+    1. 締まった月の行を月ごとのアーカイブシートへ追記し、マニフェストに記録する
+    2. split_by_user のウォーターマークを消す行の分だけ下げる（下げすぎても再コピーは重複を飛ばす）
+    3. StudyLog から行を消す（追記は末尾にしか来ないので、読んだときの行番号のまま消せる）
+    4. 各ユーザーシートからも同じ月の行を消す（split_by_user が覚えているシートの行数も忘れさせる）
+    途中で止まっても、もう一度実行すれば続きから終わる。戻り値: {月: 行数}
+    """
+    hot_from = first_hot_month(today, keep_months)
+    study_log = book.worksheet(STUDY_LOG_SHEET)
+    with span("archive.read"):
+        values = study_log.get_all_values()
+    closed = closed_rows(values, hot_from)
+    if not closed:
+        return {}
+
+    header = [str(h).strip() for h in values[0]]
+    manifest = ArchiveManifest(book.create_worksheet(MANIFEST_SHEET, rows=100, cols=len(MANIFEST_HEADER),
+                                                     header=MANIFEST_HEADER))
+    with span("archive.write"):
+        for month, rows in sorted(closed.items()):
+            manifest.record(month, *archive_month(book, header, month, rows))
+
+    deleted = sorted(row_no for rows in closed.values() for row_no, _ in rows)
+    if watermarks is not None:
+        watermarks.shift(deleted)
+    with span("archive.delete"):
+        delete_row_ranges(study_log, deleted)
+
+        col = header.index("user_id")
+        user_ids = sorted({str(row[col]).strip() for rows in closed.values() for _, row in rows if col < len(row)})
+        trimmed = []
+        for user_id in user_ids:
+            ws = book.worksheet(user_id) if user_id else None
+            if ws is not None and trim_user_sheet(ws, hot_from):
+                trimmed.append(user_id)
+    if watermarks is not None and trimmed:
+        # ユーザーシートの行数が変わったので、split_by_user は次回そのシートを全部読み直す
+        watermarks.forget_sheet_rows(trimmed)
+    return {month: len(rows) for month, rows in closed.items()}
+
+
+def load_archived_records(book, start_str=None, end_str=None):
+    """
+    マニフェストから start〜end と重なる月のアーカイブシートを探し、行を dict で返す。
+    """
+    ws = book.worksheet(MANIFEST_SHEET)
+    if ws is None:
+        return []
+    first, last = normalize_date(start_str or ""), normalize_date(end_str or "")
+    records = []
+    for title in ArchiveManifest(ws).partitions_between(start_str, end_str):
+        partition = book.worksheet(title)
+        if partition is None:
+            continue
+        values = partition.get_all_values()
+        header = [str(h).strip() for h in values[0]] if values else []
+        for row_no, row in enumerate(values[1:], start=2):
+            record = dict(zip(header, row))
+            date = normalize_date(record.get("datetime", ""))
+            if (not first or date >= first) and (not last or date <= last):
+                # record_id のない行は「シート名!行番号」で見分ける（集計テーブルの作り直し用）
+                records.append(dict(record, row_no=f"{title}!{row_no}"))
+    return records
+
+
+# =========================
+# 📄 Sheets 上のブック
+# =========================
+class SheetsBook:
+    """
+    sheets_client のキャッシュ越しに StudyLog のブックを扱う（テストでは同じ形の偽物を渡す）。
+    """
+
+    def worksheet(self, title):
+        from gspread.exceptions import WorksheetNotFound
+        from spreadsheet_utils.sheets_client import STUDY_LOG_BOOK, get_worksheet
+
+        try:
+            return get_worksheet(STUDY_LOG_BOOK, title)
+        except WorksheetNotFound:
+            return None
+
+    def create_worksheet(self, title, rows, cols, header):
+        from spreadsheet_utils.sheets_client import STUDY_LOG_BOOK, get_or_create_worksheet
+
+        return get_or_create_worksheet(STUDY_LOG_BOOK, title, rows=rows, cols=cols, header=header)
+
+
+def archived_records(start_str=None, end_str=None):
+    return load_archived_records(SheetsBook(), start_str, end_str)
+
+
+def main():
+    from graph_generator.split_by_user import Watermarks
+
+    set_default_priority(BULK)
+    archived = archive_study_log(SheetsBook(), datetime.now().date(), watermarks=Watermarks())
+    if archived:
+        for month, count in sorted(archived.items()):
+            print(f"📦 {month} の {count} 行を {partition_title(month)} に移しました")
+    else:
+        print("ℹ️ アーカイブする月はありません")
+    dump_metrics("study_log_archive")
+
+
+if __name__ == "__main__":
+    main()
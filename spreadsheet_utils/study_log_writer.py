@@ -0,0 +1,273 @@
+# study_log_writer.py
+# 学習記録の write-behind バッファ（ローカル WAL に書いてから、まとめて append_rows する）
+
+import atexit
+import json
+import os
+import threading
+import uuid
+
+from metrics_utils.metrics import span
+
+STUDY_LOG_SHEET = "StudyLog"
+# record_id: 1件の記録の ID（集計テーブルはこれで同じ記録を見分ける。列を足す前の行は空）
+STUDY_LOG_HEADER = ["datetime", "user_id", "subject", "minutes", "raw_message", "record_id"]
+USER_SHEET_HEADER = ["datetime", "subject", "minutes", "raw_message"]
+
+FLUSH_RETRY_MAX_SECONDS = 60
+
+
+def new_record_id():
+    return uuid.uuid4().hex
+
+
+def study_log_row(data):
+    return [data["datetime"], data["user_id"], data["subject"], data["minutes"], data["raw_message"],
+            data.get("record_id") or ""]
+
+
+def user_sheet_row(data):
+    return [data["datetime"], data["subject"], data["minutes"], data["raw_message"]]
+
+
+class SheetsSink:
+    """
+    StudyLog と各 user_id シートへの書き込み先。1回の flush で1シートにつき append_rows 1回。
+    """
+
+    def __init__(self):
+        self._header_checked = False
+
+    def append_rows(self, target, rows):
+        # gspread は書き込み時にだけ必要なので遅延 import
+        from spreadsheet_utils.sheets_client import STUDY_LOG_BOOK, get_worksheet, get_or_create_worksheet
+
+        if target == STUDY_LOG_SHEET:
+            ws = get_worksheet(STUDY_LOG_BOOK, STUDY_LOG_SHEET)
+            if not self._header_checked:
+                ensure_header(ws, STUDY_LOG_HEADER)
+                self._header_checked = True
+        else:
+            ws = get_or_create_worksheet(STUDY_LOG_BOOK, target, rows=1000, cols=4, header=USER_SHEET_HEADER)
+        ws.append_rows(rows)
+
+
+def ensure_header(ws, header):
+    """
+    列を足す前に作ったシート（ヘッダーが短い）に、足りない列名を書き足す。
+    """
+    current = [str(h).strip() for h in ws.row_values(1)]
+    if len(current) >= len(header):
+        return
+    if ws.col_count < len(header):
+        ws.add_cols(len(header) - ws.col_count)
+    ws.update(range_name="A1", values=[current + header[len(current):]])
+
+
+def _parse_wal_line(line):
+    """
+    WAL の1行を entry にする。読めなければ None。
+    以前の版で書きかけの行の後ろに追記されてしまった行は、後ろの entry だけを拾う。
+    """
+    try:
+        return json.loads(line)
+    except ValueError:
+        start = line.rfind(b'{"seq"')
+        if start > 0:
+            try:
+                return json.loads(line[start:])
+            except ValueError:
+                pass
+    return None
+
+
+class StudyLogWriter:
+    """
+    submit() は WAL に追記して fsync したらすぐ戻る。
+    バックグラウンドスレッドが flush_interval_ms ごと、または flush_rows 件たまったら書き込む。
+    チェックポイントは書き込み先シートごとの「反映済み seq」で、再起動時は未反映分を WAL から再生する。
+    """
+
+    def __init__(self, wal_path="study_log.wal", sink=None, flush_interval_ms=1000, flush_rows=50,
+                 start_thread=True):
+        self.wal_path = wal_path
+        self.checkpoint_path = wal_path + ".ckpt"
+        self.sink = sink or SheetsSink()
+        self.flush_interval = flush_interval_ms / 1000
+        self.flush_rows = flush_rows
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._retry_delay = 0
+        self._seq, self._targets, self._pending = self._replay()
+        self._wal = open(self.wal_path, "a", encoding="utf-8")
+        self._thread = None
+        if start_thread:
+            self._thread = threading.Thread(target=self._run, name="study-log-writer", daemon=True)
+            self._thread.start()
+
+    # =========================
+    # 📜 WAL / チェックポイント
+    # =========================
+    def _replay(self):
+        seq, targets = 0, {}
+        if os.path.exists(self.checkpoint_path):
+            with open(self.checkpoint_path, encoding="utf-8") as f:
+                checkpoint = json.load(f)
+            seq, targets = checkpoint["seq"], checkpoint["targets"]
+
+        pending = []
+        if os.path.exists(self.wal_path):
+            with open(self.wal_path, "rb+") as f:
+                complete = 0
+                for line in f:
+                    if not line.endswith(b"\n"):
+                        # 書き込み途中で落ちた最終行（改行なし）
+                        break
+                    complete += len(line)
+                    entry = _parse_wal_line(line)
+                    if entry is None:
+                        continue
+                    seq = max(seq, entry["seq"])
+                    if not self._is_done(entry, targets):
+                        pending.append(entry)
+                # 途中の行を残したまま追記すると、次の行がその続きになって読めなくなるので切り詰める
+                if f.seek(0, os.SEEK_END) > complete:
+                    print("⚠️ WAL の末尾の書きかけの行を捨てました")
+                    f.truncate(complete)
+                    f.flush()
+                    os.fsync(f.fileno())
+        if pending:
+            print(f"🔁 未反映の学習記録 {len(pending)} 件を WAL から再生します")
+        return seq, targets, pending
+
+    @staticmethod
+    def _is_done(entry, targets):
+        user_id = entry["data"]["user_id"]
+        return (targets.get(STUDY_LOG_SHEET, 0) >= entry["seq"]
+                and targets.get(user_id, 0) >= entry["seq"])
+
+    def _write_checkpoint(self):
+        tmp_path = self.checkpoint_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"seq": self._seq, "targets": self._targets}, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.checkpoint_path)
+
+    def _truncate_wal(self):
+        # すべて反映済みなら WAL を空にし、チェックポイントも seq だけ残す
+        self._targets = {}
+        self._write_checkpoint()
+        self._wal.close()
+        self._wal = open(self.wal_path, "w", encoding="utf-8")
+
+    # =========================
+    # ✍️ 追加
+    # =========================
+    def submit(self, data):
+        with self._lock:
+            self._seq += 1
+            entry = {"seq": self._seq, "data": data}
+            self._wal.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            self._wal.flush()
+            os.fsync(self._wal.fileno())
+            self._pending.append(entry)
+            if len(self._pending) >= self.flush_rows:
+                self._wakeup.set()
+        return entry["seq"]
+
+    def pending_count(self):
+        with self._lock:
+            return len(self._pending)
+
+    # =========================
+    # 🚚 flush
+    # =========================
+    def flush(self):
+        """
+        未反映分をシートごとにまとめて書き込む。失敗したシートは次回に持ち越す。
+        """
+        with self._flush_lock:
+            with self._lock:
+                entries = list(self._pending)
+                targets = dict(self._targets)
+            if not entries:
+                return 0
+
+            batches = {}
+            for entry in entries:
+                data = entry["data"]
+                if targets.get(STUDY_LOG_SHEET, 0) < entry["seq"]:
+                    batches.setdefault(STUDY_LOG_SHEET, []).append((entry["seq"], study_log_row(data)))
+                if targets.get(data["user_id"], 0) < entry["seq"]:
+                    batches.setdefault(data["user_id"], []).append((entry["seq"], user_sheet_row(data)))
+
+            errors = []
+            for target, rows in batches.items():
+                try:
+                    with span("study_log.append_rows"):
+                        self.sink.append_rows(target, [row for _, row in rows])
+                except Exception as e:
+                    errors.append((target, e))
+                    continue
+                with self._lock:
+                    self._targets[target] = rows[-1][0]
+                    self._write_checkpoint()
+                if target != STUDY_LOG_SHEET:
+                    print(f"✅ {target} に {len(rows)} 件の記録を追加しました")
+
+            with self._lock:
+                self._pending = [e for e in self._pending if not self._is_done(e, self._targets)]
+                if not self._pending:
+                    self._truncate_wal()
+
+            if errors:
+                target, e = errors[0]
+                raise RuntimeError(f"{len(errors)} シートへの書き込みに失敗しました（{target}: {e}）")
+            return len(entries)
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wakeup.wait(self.flush_interval + self._retry_delay)
+            self._wakeup.clear()
+            try:
+                self.flush()
+                self._retry_delay = 0
+            except Exception as e:
+                self._retry_delay = min(max(self._retry_delay * 2, 1), FLUSH_RETRY_MAX_SECONDS)
+                print(f"❌ 学習記録の書き込みに失敗しました（{self._retry_delay}秒後に再試行）: {e}")
+
+    def close(self):
+        self._stop.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+        try:
+            self.flush()
+        except Exception as e:
+            print(f"⚠️ 終了時の書き込みに失敗しました（WAL に残しました）: {e}")
+        with self._lock:
+            self._wal.close()
+
+
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def get_study_log_writer():
+    """
+    プロセス共有の writer を返す。終了時に残りを flush する。
+    """
+    global _writer
+    if _writer is None:
+        with _writer_lock:
+            if _writer is None:
+                _writer = StudyLogWriter(
+                    wal_path=os.getenv("STUDY_LOG_WAL_PATH", "study_log.wal"),
+                    flush_interval_ms=int(os.getenv("STUDY_LOG_FLUSH_MS", "1000")),
+                    flush_rows=int(os.getenv("STUDY_LOG_FLUSH_ROWS", "50"))
+                )
+                atexit.register(_writer.close)
+    return _writer
@@ -0,0 +1,191 @@
+# study_rollup.py
+# (user_id, date, subject) ごとの学習合計（分）と記録件数を書き込み時に積み上げる集計テーブル
+# 全件から作り直す: python -m spreadsheet_utils.study_rollup
+
+import os
+import sqlite3
+import threading
+
+from spreadsheet_utils.read_replica import normalize_date, _to_int
+
+
+def entry_key(record):
+    """
+    1件の学習記録を識別するキー（"user_id|datetime|ID"）。
+    ID は record_id（webhook の記録と、それをシートから取り込んだ行で同じ）。
+    record_id 列を足す前の行は、シート上の行番号（row_no）を代わりに使う。
+    同じ時刻の別の記録を1件にまとめないよう、時刻だけでは見分けない。
+    """
+    identity = record.get("record_id") or record.get("row_no")
+    if identity in (None, ""):
+        identity = f"{record.get('subject', '')}:{record.get('minutes', '')}"
+    return f"{str(record.get('user_id', '')).strip()}|{record.get('datetime', '')}|{identity}"
+
+
+class StudyRollup:
+    """
+    record_study_log とレプリカの同期の両方から同じ記録が届くので、
+    反映済みキーを覚えておき、同じ記録は二重に足さない（冪等）。
+    参照は集計済みの行だけを見るので、履歴の長さではなく科目数に比例する。
+    """
+
+    def __init__(self, path=":memory:"):
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS rollups (
+                user_id TEXT NOT NULL,
+                date TEXT NOT NULL,
+                subject TEXT NOT NULL,
+                minutes INTEGER NOT NULL DEFAULT 0,
+                entries INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (user_id, date, subject)
+            );
+            CREATE INDEX IF NOT EXISTS idx_rollups_date ON rollups (date);
+
+            CREATE TABLE IF NOT EXISTS applied (
+                key TEXT PRIMARY KEY
+            );
+        """)
+        # applied のキー（user_id|datetime|ID）から日付を取り出して、期間を区切った作り直しに使う
+        self._conn.create_function("key_date", 1, lambda key: normalize_date(key.split("|", 1)[-1]))
+
+    # =========================
+    # ➕ 積み上げ
+    # =========================
+    def apply(self, records):
+        """
+        records: datetime / user_id / subject / minutes を持つ dict。反映した件数を返す。
+        """
+        applied = 0
+        with self._lock:
+            for record in records:
+                user_id = str(record.get("user_id", "")).strip()
+                date = normalize_date(record.get("datetime", ""))
+                if not user_id or not date:
+                    continue
+                inserted = self._conn.execute(
+                    "INSERT OR IGNORE INTO applied (key) VALUES (?)", (entry_key(record),)
+                ).rowcount
+                if not inserted:
+                    continue
+                self._conn.execute(
+                    "INSERT INTO rollups (user_id, date, subject, minutes, entries) VALUES (?, ?, ?, ?, 1) "
+                    "ON CONFLICT (user_id, date, subject) DO UPDATE SET "
+                    "minutes = minutes + excluded.minutes, entries = entries + 1",
+                    (user_id, date, str(record.get("subject", "")), _to_int(record.get("minutes")))
+                )
+                applied += 1
+            self._conn.commit()
+        return applied
+
+    def rebuild(self, records, since=None):
+        """
+        StudyLog の全件から作り直す（シートの行が消えた・書き換わったとき用）。
+        since（"YYYY/MM/DD"）を渡すと、その日以降だけを作り直し、それより前（アーカイブ済みの月）は残す。
+        """
+        with self._lock:
+            if since is None:
+                self._conn.execute("DELETE FROM rollups")
+                self._conn.execute("DELETE FROM applied")
+            else:
+                since = normalize_date(since)
+                self._conn.execute("DELETE FROM rollups WHERE date >= ?", (since,))
+                self._conn.execute("DELETE FROM applied WHERE key_date(key) >= ?", (since,))
+            self._conn.commit()
+            return self.apply(records)
+
+    # =========================
+    # 🔎 参照
+    # =========================
+    def user_ids(self):
+        with self._lock:
+            return [r[0] for r in self._conn.execute("SELECT DISTINCT user_id FROM rollups").fetchall()]
+
+    def is_empty(self):
+        with self._lock:
+            return self._conn.execute("SELECT 1 FROM applied LIMIT 1").fetchone() is None
+
+    def minutes(self, user_id, date_str):
+        with self._lock:
+            return self._conn.execute(
+                "SELECT COALESCE(SUM(minutes), 0) FROM rollups WHERE user_id = ? AND date = ?",
+                (user_id, normalize_date(date_str))
+            ).fetchone()[0]
+
+    def rows_on(self, date_str):
+        """
+        指定日の (user_id, subject, minutes) を全ユーザー分返す（科目ごとに集計済み）。
+        """
+        return self.rows_between(date_str, date_str)
+
+    def rows_between(self, start_str, end_str):
+        """
+        start〜end（両端を含む）の (user_id, subject, minutes) を科目ごとに合計して返す。
+        """
+        with self._lock:
+            return self._conn.execute(
+                "SELECT user_id, subject, SUM(minutes) FROM rollups WHERE date BETWEEN ? AND ? "
+                "GROUP BY user_id, subject",
+                (normalize_date(start_str), normalize_date(end_str))
+            ).fetchall()
+
+    def daily_rows_between(self, start_str, end_str, user_id=None):
+        """
+        start〜end の (user_id, date, subject, minutes) を日付ごとのまま返す（期間別の集計用）。
+        user_id を渡すとその人の分だけ（主キーの先頭なので1人分の範囲だけ読む）。
+        """
+        params = (normalize_date(start_str), normalize_date(end_str))
+        if user_id is None:
+            sql = "SELECT user_id, date, subject, minutes FROM rollups WHERE date BETWEEN ? AND ?"
+        else:
+            sql = ("SELECT user_id, date, subject, minutes FROM rollups "
+                   "WHERE user_id = ? AND date BETWEEN ? AND ?")
+            params = (user_id,) + params
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    def subject_totals(self, user_id, start_str, end_str):
+        """
+        1ユーザーの科目別合計を多い順に [(subject, minutes, entries)] で返す。
+        """
+        with self._lock:
+            return self._conn.execute(
+                "SELECT subject, SUM(minutes), SUM(entries) FROM rollups "
+                "WHERE user_id = ? AND date BETWEEN ? AND ? GROUP BY subject ORDER BY SUM(minutes) DESC",
+                (user_id, normalize_date(start_str), normalize_date(end_str))
+            ).fetchall()
+
+
+_rollup = None
+_rollup_lock = threading.Lock()
+
+
+def get_study_rollup():
+    """
+    プロセス共有の集計テーブル。ROLLUP_PATH を指定すると再起動後も引き継ぐ。
+    """
+    global _rollup
+    if _rollup is None:
+        with _rollup_lock:
+            if _rollup is None:
+                _rollup = StudyRollup(os.getenv("ROLLUP_PATH", "study_rollup.sqlite3"))
+    return _rollup
+
+
+def main():
+    from spreadsheet_utils.sheets_client import STUDY_LOG_BOOK, get_worksheet
+    from spreadsheet_utils.read_replica import get_read_replica
+    from spreadsheet_utils.quota_governor import BULK, set_default_priority
+    from spreadsheet_utils.study_log_archive import archived_records
+
+    set_default_priority(BULK)
+    replica = get_read_replica()
+    replica.sync_study_log(get_worksheet(STUDY_LOG_BOOK, "StudyLog"), force=True)
+    # アーカイブ済みの月もマニフェストからたどって含める
+    count = get_study_rollup().rebuild(archived_records() + replica.study_records())
+    print(f"✅ 集計テーブルを {count} 件の記録から作り直しました")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,44 @@
+import os
+import threading
+
+from storage.base import StudyStorage, NOTIFY_COLUMNS
+
+_storage = None
+_storage_lock = threading.Lock()
+
+
+def create_storage(backend=None, path=None):
+    """
+    backend: "sheets"（既定）/ "local"（SQLite、path 省略時はメモリ上）
+    """
+    backend = backend or os.getenv("STORAGE_BACKEND", "sheets")
+    if backend == "sheets":
+        from storage.sheets_backend import SheetsStorage
+
+        return SheetsStorage()
+    if backend == "local":
+        from storage.local_backend import LocalStorage
+
+        return LocalStorage(path or os.getenv("STORAGE_PATH", ":memory:"))
+    raise ValueError(f"STORAGE_BACKEND '{backend}' は使えません（sheets / local）")
+
+
+def get_storage():
+    """
+    プロセス共有の保存先。STORAGE_BACKEND で切り替える。
+    """
+    global _storage
+    if _storage is None:
+        with _storage_lock:
+            if _storage is None:
+                _storage = create_storage()
+    return _storage
+
+
+def set_storage(storage):
+    """
+    保存先を差し替える（テスト・ベンチマーク用）。
+    """
+    global _storage
+    with _storage_lock:
+        _storage = storage
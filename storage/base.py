@@ -0,0 +1,112 @@
+# base.py
+# 保存先（Google Sheets / ローカル SQLite）で共通の操作。webhook・cron・ベンチマークはこれだけを使う
+
+# 通知設定の列（StudyMeBotNotify の見出しと同じ）
+NOTIFY_COLUMNS = ["morning", "noon", "evening", "night"]
+NOTIFY_DEFAULT_VALUE = "OFF"
+
+
+class StudyStorage:
+    """
+    学習記録・目標・通知設定の読み書き。
+    日付はすべて "YYYY/MM/DD"（normalize_date で受け付ける形式ならそろえてから扱う）。
+    """
+
+    # =========================
+    # 📝 学習記録
+    # =========================
+    def append_study_logs(self, records):
+        """
+        records: datetime / user_id / subject / minutes / raw_message を持つ dict のリスト。
+        """
+        raise NotImplementedError
+
+    def append_study_log(self, data):
+        self.append_study_logs([data])
+
+    def study_minutes(self, user_id, date_str):
+        """
+        その日の学習合計（分）。
+        """
+        raise NotImplementedError
+
+    def study_rows_on(self, date_str):
+        """
+        その日の (user_id, subject, minutes) を全ユーザー分、科目ごとに合計して返す。
+        """
+        raise NotImplementedError
+
+    def daily_rows_between(self, start_str, end_str, user_id=None):
+        """
+        start〜end（両端を含む）の (user_id, date, subject, minutes) を返す。user_id を渡すとその人の分だけ。
+        """
+        raise NotImplementedError
+
+    # =========================
+    # 🎯 目標
+    # =========================
+    def upsert_goal(self, row_values):
+        """
+        row_values は GOAL_COLUMNS の順。同じ (user_id, start_date) があれば上書きする。
+        """
+        raise NotImplementedError
+
+    def goal(self, user_id, date_str):
+        raise NotImplementedError
+
+    def goal_rows_on(self, date_str):
+        """
+        その日の (row_no, user_id, value)。同じユーザーは row_no の大きい方が新しい。
+        """
+        raise NotImplementedError
+
+    def compact_goals(self):
+        """
+        古い・重複した目標を片付け、消した件数を返す。
+        """
+        return 0
+
+    # =========================
+    # ⏰ 通知設定
+    # =========================
+    def has_notification_column(self, label):
+        return label in NOTIFY_COLUMNS
+
+    def set_notification_time(self, user_id, label, value):
+        """
+        既存ユーザーなら True、新規登録になったら False を返す。
+        """
+        raise NotImplementedError
+
+    def notification_settings(self):
+        """
+        {user_id: {"morning": "07:30", ...}}
+        """
+        raise NotImplementedError
+
+    def notification_settings_version(self):
+        """
+        通知設定が変わると変わる値。分からなければ None（毎回読み直す）。
+        """
+        return None
+
+    # =========================
+    # 👥 ユーザー
+    # =========================
+    def user_ids(self):
+        """
+        学習記録または目標に登場する全 user_id。
+        """
+        raise NotImplementedError
+
+    def chart_user_ids(self):
+        """
+        夜のグラフを送る対象の user_id。
+        """
+        return self.user_ids()
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.flush()
@@ -0,0 +1,186 @@
+# local_backend.py
+# ローカル SQLite を保存先にする実装（":memory:" ならプロセス内だけ）。オフライン実行・ベンチマーク用
+
+import sqlite3
+import threading
+from datetime import datetime, timedelta
+
+from goal_manager.goal_index import GOAL_RETENTION_DAYS
+from spreadsheet_utils.read_replica import normalize_date, _to_int
+from storage.base import StudyStorage, NOTIFY_COLUMNS, NOTIFY_DEFAULT_VALUE
+
+
+class LocalStorage(StudyStorage):
+    """
+    Sheets 版と同じ意味で動く：目標は (user_id, start_date) で上書き、
+    通知設定の新規ユーザーは指定以外の時間帯を OFF で登録する。
+    """
+
+    def __init__(self, path=":memory:"):
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.executescript(f"""
+            CREATE TABLE IF NOT EXISTS study_log (
+                row_no INTEGER PRIMARY KEY AUTOINCREMENT,
+                datetime TEXT,
+                user_id TEXT NOT NULL,
+                date TEXT NOT NULL,
+                subject TEXT,
+                minutes INTEGER NOT NULL DEFAULT 0,
+                raw_message TEXT
+            );
+            CREATE INDEX IF NOT EXISTS idx_study_log_user_date ON study_log (user_id, date);
+            CREATE INDEX IF NOT EXISTS idx_study_log_date ON study_log (date);
+
+            CREATE TABLE IF NOT EXISTS goals (
+                row_no INTEGER PRIMARY KEY AUTOINCREMENT,
+                user_id TEXT NOT NULL,
+                unit TEXT,
+                type TEXT,
+                value INTEGER NOT NULL DEFAULT 0,
+                start_date TEXT NOT NULL,
+                end_date TEXT,
+                created_at TEXT,
+                UNIQUE (user_id, start_date)
+            );
+            CREATE INDEX IF NOT EXISTS idx_goals_date ON goals (start_date);
+
+            CREATE TABLE IF NOT EXISTS notify_settings (
+                user_id TEXT PRIMARY KEY,
+                {", ".join(f"{col} TEXT NOT NULL DEFAULT '{NOTIFY_DEFAULT_VALUE}'" for col in NOTIFY_COLUMNS)}
+            );
+
+            CREATE TABLE IF NOT EXISTS meta (
+                key TEXT PRIMARY KEY,
+                value INTEGER NOT NULL
+            );
+        """)
+
+    # =========================
+    # 📝 学習記録
+    # =========================
+    def append_study_logs(self, records):
+        with self._lock:
+            self._conn.executemany(
+                "INSERT INTO study_log (datetime, user_id, date, subject, minutes, raw_message) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                [(r["datetime"], str(r["user_id"]), normalize_date(r["datetime"]), r["subject"],
+                  _to_int(r["minutes"]), r.get("raw_message", "")) for r in records]
+            )
+            self._conn.commit()
+
+    def study_minutes(self, user_id, date_str):
+        with self._lock:
+            return self._conn.execute(
+                "SELECT COALESCE(SUM(minutes), 0) FROM study_log WHERE user_id = ? AND date = ?",
+                (user_id, normalize_date(date_str))
+            ).fetchone()[0]
+
+    def study_rows_on(self, date_str):
+        with self._lock:
+            return self._conn.execute(
+                "SELECT user_id, subject, SUM(minutes) FROM study_log WHERE date = ? GROUP BY user_id, subject",
+                (normalize_date(date_str),)
+            ).fetchall()
+
+    def daily_rows_between(self, start_str, end_str, user_id=None):
+        params = (normalize_date(start_str), normalize_date(end_str))
+        user_filter = ""
+        if user_id is not None:
+            user_filter, params = " AND user_id = ?", params + (user_id,)
+        with self._lock:
+            return self._conn.execute(
+                "SELECT user_id, date, subject, SUM(minutes) FROM study_log WHERE date BETWEEN ? AND ?"
+                f"{user_filter} GROUP BY user_id, date, subject",
+                params
+            ).fetchall()
+
+    # =========================
+    # 🎯 目標
+    # =========================
+    def upsert_goal(self, row_values):
+        user_id, unit, type_, value, start_date, end_date, created_at = row_values
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO goals (user_id, unit, type, value, start_date, end_date, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT (user_id, start_date) DO UPDATE SET unit = excluded.unit, type = excluded.type, "
+                "value = excluded.value, end_date = excluded.end_date, created_at = excluded.created_at",
+                (user_id, unit, type_, _to_int(value), normalize_date(start_date), end_date, created_at)
+            )
+            self._conn.commit()
+            return self._conn.execute(
+                "SELECT row_no FROM goals WHERE user_id = ? AND start_date = ?",
+                (user_id, normalize_date(start_date))
+            ).fetchone()[0]
+
+    def goal(self, user_id, date_str):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value FROM goals WHERE user_id = ? AND start_date = ?", (user_id, normalize_date(date_str))
+            ).fetchone()
+        return row[0] if row else None
+
+    def goal_rows_on(self, date_str):
+        with self._lock:
+            return self._conn.execute(
+                "SELECT row_no, user_id, value FROM goals WHERE start_date = ?", (normalize_date(date_str),)
+            ).fetchall()
+
+    def compact_goals(self, retention_days=GOAL_RETENTION_DAYS, today=None):
+        # (user_id, start_date) は一意なので重複はない。期限切れの削除は指定したときだけ
+        if not retention_days:
+            return 0
+        cutoff = ((today or datetime.today()) - timedelta(days=retention_days)).strftime("%Y/%m/%d")
+        with self._lock:
+            removed = self._conn.execute("DELETE FROM goals WHERE start_date < ?", (cutoff,)).rowcount
+            self._conn.commit()
+        return removed
+
+    # =========================
+    # ⏰ 通知設定
+    # =========================
+    def set_notification_time(self, user_id, label, value):
+        if label not in NOTIFY_COLUMNS:
+            raise KeyError(f"列 '{label}' が見つかりません")
+        with self._lock:
+            existed = self._conn.execute(
+                "SELECT 1 FROM notify_settings WHERE user_id = ?", (user_id,)
+            ).fetchone() is not None
+            self._conn.execute(
+                f"INSERT INTO notify_settings (user_id, {label}) VALUES (?, ?) "
+                f"ON CONFLICT (user_id) DO UPDATE SET {label} = excluded.{label}",
+                (user_id, value)
+            )
+            self._conn.execute(
+                "INSERT INTO meta (key, value) VALUES ('notify_version', 1) "
+                "ON CONFLICT (key) DO UPDATE SET value = value + 1"
+            )
+            self._conn.commit()
+        return existed
+
+    def notification_settings(self):
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT user_id, {', '.join(NOTIFY_COLUMNS)} FROM notify_settings"
+            ).fetchall()
+        return {row[0]: dict(zip(["user_id"] + NOTIFY_COLUMNS, row)) for row in rows}
+
+    def notification_settings_version(self):
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM meta WHERE key = 'notify_version'").fetchone()
+        return row[0] if row else 0
+
+    # =========================
+    # 👥 ユーザー
+    # =========================
+    def user_ids(self):
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT user_id FROM study_log UNION SELECT user_id FROM goals"
+            ).fetchall()
+        return [r[0] for r in rows if r[0]]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,127 @@
+# sheets_backend.py
+# Google Sheets を保存先にする実装（書き込みは WAL 経由、読み取りはローカルレプリカと集計テーブルから）
+
+from metrics_utils.metrics import span
+from storage.base import StudyStorage
+
+
+class SheetsStorage(StudyStorage):
+    """
+    既存の部品（StudyLogWriter / GoalIndex / NotifySettingsStore / ReadReplica / StudyRollup）をまとめる。
+    gspread は各部品の中で必要になったときにだけ読み込む。
+    """
+
+    # =========================
+    # 📝 学習記録
+    # =========================
+    def append_study_logs(self, records):
+        from spreadsheet_utils.study_log_writer import get_study_log_writer, new_record_id
+        from spreadsheet_utils.study_rollup import get_study_rollup
+
+        writer = get_study_log_writer()
+        # StudyLog の行にも同じ record_id を書くので、あとでシートから同期しても同じ記録だとわかる
+        records = [data if data.get("record_id") else dict(data, record_id=new_record_id()) for data in records]
+        for data in records:
+            writer.submit(data)
+        # 集計テーブルにもその場で足しておく（あとでシートから同期しても二重にはならない）
+        get_study_rollup().apply(records)
+
+    def sync(self):
+        """
+        ローカルレプリカを最新にする（増えた行だけ取り込む）。
+        """
+        from spreadsheet_utils.sheets_client import STUDY_LOG_BOOK, GOAL_SHEET_NAME, get_worksheet
+        from spreadsheet_utils.read_replica import get_read_replica
+
+        replica = get_read_replica()
+        with span("storage.sync"):
+            replica.sync_study_log(get_worksheet(STUDY_LOG_BOOK, "StudyLog"))
+            replica.sync_goals(get_worksheet(STUDY_LOG_BOOK, GOAL_SHEET_NAME))
+        return replica
+
+    def study_minutes(self, user_id, date_str):
+        return self.sync().rollup.minutes(user_id, date_str)
+
+    def study_rows_on(self, date_str):
+        return self.sync().rollup.rows_on(date_str)
+
+    def daily_rows_between(self, start_str, end_str, user_id=None):
+        return self.sync().rollup.daily_rows_between(start_str, end_str, user_id)
+
+    # =========================
+    # 🎯 目標
+    # =========================
+    def upsert_goal(self, row_values):
+        from goal_manager.goal_index import GOAL_COLUMNS, get_goal_index
+        from spreadsheet_utils.read_replica import GOALS_TABLE, get_read_replica
+
+        row_no = get_goal_index().upsert(row_values)
+        # その場の上書きは増分同期では拾えないので、レプリカの目標行も書き換えておく
+        replica = get_read_replica()
+        if row_no is None:
+            replica.invalidate(GOALS_TABLE)
+        else:
+            replica.apply_goal(row_no, dict(zip(GOAL_COLUMNS, row_values)))
+        return row_no
+
+    def goal(self, user_id, date_str):
+        return self.sync().goal(user_id, date_str)
+
+    def goal_rows_on(self, date_str):
+        return self.sync().goal_rows_on(date_str)
+
+    def compact_goals(self):
+        from goal_manager.goal_index import get_goal_index
+
+        return get_goal_index().compact()
+
+    # =========================
+    # ⏰ 通知設定
+    # =========================
+    def has_notification_column(self, label):
+        from spreadsheet_utils.notify_settings import get_notify_settings_store
+
+        return get_notify_settings_store().has_column(label)
+
+    def set_notification_time(self, user_id, label, value):
+        from spreadsheet_utils.notify_settings import get_notify_settings_store
+
+        return get_notify_settings_store().set_time(user_id, label, value)
+
+    def notification_settings(self):
+        from spreadsheet_utils.sheets_client import NOTIFY_BOOK, get_spreadsheet
+
+        with span("storage.notification_settings"):
+            records = get_spreadsheet(NOTIFY_BOOK).sheet1.get_all_records()
+        return {str(r["user_id"]): r for r in records if str(r.get("user_id", "")).startswith("U")}
+
+    def notification_settings_version(self):
+        from spreadsheet_utils.sheets_client import NOTIFY_BOOK, get_spreadsheet
+
+        try:
+            return get_spreadsheet(NOTIFY_BOOK).get_lastUpdateTime()
+        except Exception:
+            # 取得できなければ毎回読み直す
+            return None
+
+    # =========================
+    # 👥 ユーザー
+    # =========================
+    def user_ids(self):
+        replica = self.sync()
+        # アーカイブ済みの月にしか記録のないユーザーも集計テーブルには残っている
+        return sorted(set(replica.user_ids()) | set(replica.rollup.user_ids()))
+
+    def chart_user_ids(self):
+        from spreadsheet_utils.sheets_client import STUDY_LOG_BOOK, list_worksheets
+
+        sheet_titles = {ws.title for ws in list_worksheets(STUDY_LOG_BOOK)}
+        # これまで通り、個別シートのあるユーザーだけを対象にする
+        return [uid for uid in self.user_ids() if isinstance(uid, str) and uid.strip() and uid in sheet_titles]
+
+    def flush(self):
+        from spreadsheet_utils.study_log_writer import get_study_log_writer
+        from spreadsheet_utils.notify_settings import get_notify_settings_store
+
+        get_study_log_writer().flush()
+        get_notify_settings_store().flush()
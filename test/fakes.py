@@ -0,0 +1,149 @@
+# テスト共通の偽物（gspread の Worksheet / Spreadsheet と時計）
+import re
+
+_CELL = re.compile(r"([A-Z]+)(\d*)")
+
+
+def _column_index(letters):
+    index = 0
+    for ch in letters:
+        index = index * 26 + ord(ch) - 64
+    return index
+
+
+def parse_range(range_name):
+    """
+    "A2:G5" / "A3:F" / "B2" を (最初の行, 最後の行 or None, 最初の列, 最後の列) にする（1始まり）。
+    """
+    first, _, last = range_name.split("!")[-1].partition(":")
+    first_col, first_row = _CELL.fullmatch(first).groups()
+    last_col, last_row = _CELL.fullmatch(last or first).groups()
+    return (int(first_row or 1), int(last_row) if last_row else None,
+            _column_index(first_col), _column_index(last_col))
+
+
+class FakeWorksheet:
+    """
+    rows は見出しを含むシート全体（文字列のリストのリスト）。読んだ範囲・書いた範囲を記録する。
+    """
+
+    def __init__(self, rows):
+        self.rows = [list(r) for r in rows]
+        self.row_count = 1000
+        self.col_count = max((len(r) for r in self.rows), default=0)
+        self.reads = 0
+        self.row_reads = 0
+        self.ranges = []
+        self.writes = []
+        self.batches = []
+        self.before_batch_get = None
+
+    def _slice(self, range_name):
+        first_row, last_row, first_col, last_col = parse_range(range_name)
+        return [list(r[first_col - 1:last_col]) for r in self.rows[first_row - 1:last_row]]
+
+    def _write(self, range_name, values):
+        first_row, _, first_col, _ = parse_range(range_name)
+        for offset, values_row in enumerate(values):
+            index = first_row - 1 + offset
+            while len(self.rows) <= index:
+                self.rows.append([])
+            row = self.rows[index]
+            row.extend([""] * (first_col - 1 + len(values_row) - len(row)))
+            row[first_col - 1:first_col - 1 + len(values_row)] = [str(v) for v in values_row]
+
+    def get_all_values(self):
+        self.reads += 1
+        return [list(r) for r in self.rows]
+
+    def get(self, range_name):
+        self.ranges.append(range_name)
+        return self._slice(range_name)
+
+    def batch_get(self, ranges):
+        if self.before_batch_get:
+            self.before_batch_get()
+        return [self._slice(r) for r in ranges]
+
+    def col_values(self, col):
+        return [r[col - 1] if len(r) >= col else "" for r in self.rows]
+
+    def row_values(self, row_no):
+        self.row_reads += 1
+        return list(self.rows[row_no - 1]) if row_no <= len(self.rows) else []
+
+    def update(self, range_name, values, value_input_option=None):
+        self.writes.append(range_name)
+        self._write(range_name, values)
+
+    def batch_update(self, data):
+        self.batches.append(data)
+        for item in data:
+            self._write(item["range"], item["values"])
+
+    def append_row(self, values, value_input_option=None, table_range=None):
+        row_no = len(self.rows) + 1
+        cells = f"A{row_no}:{chr(64 + len(values))}{row_no}"
+        self.writes.append(cells)
+        self.rows.append([str(v) for v in values])
+        return {"updates": {"updatedRange": f"Sheet!{cells}"}}
+
+    def append_rows(self, rows):
+        self.rows.extend([str(v) for v in r] for r in rows)
+
+    def delete_rows(self, start, end):
+        del self.rows[start - 1:end]
+
+    def add_rows(self, n):
+        self.row_count += n
+
+    def add_cols(self, n):
+        self.col_count += n
+
+
+class FakeBook:
+    def __init__(self, sheets):
+        self.sheets = sheets
+
+    def worksheet(self, title):
+        return self.sheets.get(title)
+
+    def create_worksheet(self, title, rows, cols, header):
+        if title not in self.sheets:
+            self.sheets[title] = FakeWorksheet([header])
+        return self.sheets[title]
+
+
+class FakeSink:
+    """
+    StudyLogWriter / 取り込みの書き込み先。fail_targets のシートへの書き込みはクォータ切れで失敗させる。
+    """
+
+    def __init__(self, fail_targets=()):
+        self.calls = []
+        self.rows = {}
+        self.fail_targets = set(fail_targets)
+
+    def append_rows(self, target, rows):
+        if target in self.fail_targets:
+            raise RuntimeError("quota exceeded")
+        self.calls.append((target, rows))
+        self.rows.setdefault(target, []).extend(rows)
+
+
+class FakeClock:
+    """
+    clock=clock（呼び出し）でも clock=clock.time / sleep=clock.sleep でも使える。now を進めて時間を動かす。
+    """
+
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
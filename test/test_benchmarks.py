@@ -0,0 +1,25 @@
+import json
+
+from benchmarks import run
+from benchmarks.datasets import synthetic_study_log
+
+
+def test_synthetic_log_is_reproducible_and_unique():
+    first = synthetic_study_log(500, seed=1)
+    assert first == synthetic_study_log(500, seed=1)
+    assert len({(r["user_id"], r["datetime"]) for r in first}) == 500
+
+
+def test_run_and_compare(tmp_path, capsys):
+    old = tmp_path / "old.json"
+    assert run.main(["--sizes", "200", "--repeat", "1", "--only", "route_message,rollup_apply",
+                     "--output", str(old)]) == 0
+    report = json.loads(old.read_text(encoding="utf-8"))
+    assert {r["name"] for r in report["results"]} == {"route_message", "rollup_apply"}
+
+    slower = dict(report)
+    slower["results"] = [dict(r, median_s=r["median_s"] * 2) for r in report["results"]]
+    new = tmp_path / "new.json"
+    new.write_text(json.dumps(slower), encoding="utf-8")
+    assert run.main(["--compare", str(old), str(new)]) == 1
+    assert run.main(["--compare", str(old), str(old)]) == 0
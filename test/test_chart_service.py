@@ -0,0 +1,102 @@
+from datetime import date, datetime
+
+from graph_generator.chart_service import ChartCache, ChartService, chart_spec, chart_url, url_signature
+from graph_generator.generate_and_send_graphs import link_stage
+from storage.local_backend import LocalStorage
+
+SECRET = "s3cret"
+ROWS = [
+    ("U1", "2026/10/18", "英語", 30),
+    ("U1", "2026/10/14", "英語", 60),
+    ("U1", "2026/10/01", "数学", 45),
+]
+
+
+class FakeRenderer:
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, kind, labels, minutes, title, dpi=None):
+        self.calls.append((kind, dpi))
+        return f"{kind}:{title}:{dpi}".encode()
+
+
+def service(secret=SECRET):
+    storage = LocalStorage()
+    storage.append_study_logs([
+        {"datetime": d.replace("/", "-") + "T08:00:00", "user_id": u, "subject": s, "minutes": m}
+        for u, d, s, m in ROWS
+    ])
+    renderer = FakeRenderer()
+    return ChartService(storage=storage, secret=secret, renderer=renderer,
+                        clock=lambda: datetime(2026, 10, 18, 22, 0)), renderer
+
+
+def signed(charts, user_id, period, date_str="2026-10-18"):
+    sig = url_signature(user_id, period.split(".")[0], date.fromisoformat(date_str), SECRET)
+    return charts.chart(user_id, period, date_str, sig)
+
+
+def test_chart_spec_per_period():
+    today = date(2026, 10, 18)
+    assert chart_spec(ROWS, "day", today)[2:] == (["英語"], [30])
+    assert chart_spec(ROWS, "month", today)[2:] == (["英語", "数学"], [90, 45])
+    kind, _, labels, minutes = chart_spec(ROWS, "trend", today)
+    assert kind == "line" and labels[-1] == "10/18" and minutes[-1] == 30
+    assert chart_spec(ROWS, "day", date(2026, 10, 17)) is None
+
+
+def test_renders_once_and_serves_preview():
+    charts, renderer = service()
+    first = signed(charts, "U1", "week")
+    second = signed(charts, "U1", "week")
+    assert first.png == second.png and first.etag == second.etag
+    assert len(renderer.calls) == 1
+
+    preview = signed(charts, "U1", "week.preview")
+    assert preview.etag != first.etag
+    assert renderer.calls[-1] == ("bar", 40)
+    assert signed(charts, "U1", "year") is None
+    assert signed(charts, "U1", "day", "2026-10-17") is None
+    # 過去の日付は長めにキャッシュさせる
+    assert signed(charts, "U1", "month", "2026-10-14").max_age > first.max_age
+
+
+def test_signed_urls():
+    charts, _ = service(secret="s3cret")
+    url = chart_url("U1", "day", date(2026, 10, 18), preview=True, base_url="https://bot", secret="s3cret")
+    assert url.startswith("https://bot/charts/U1/day.preview.png?date=2026-10-18&sig=")
+    sig = url.rsplit("sig=", 1)[1]
+    # 本体とプレビューは同じ署名で開ける
+    assert charts.chart("U1", "day.preview", "2026-10-18", sig) is not None
+    assert charts.chart("U1", "day", "2026-10-18", sig) is not None
+    assert charts.chart("U1", "week", "2026-10-18", sig) is None
+    assert charts.chart("U2", "day", "2026-10-18", sig) is None
+    assert charts.chart("U1", "day", "2026-10-18") is None
+
+
+def test_empty_secret_serves_nothing():
+    charts, renderer = service(secret="")
+    sig = url_signature("U1", "day", date(2026, 10, 18), "")
+    assert charts.chart("U1", "day", "2026-10-18", sig) is None
+    assert charts.chart("U1", "day") is None
+    assert renderer.calls == []
+
+
+def test_lru_evicts_by_entries_and_bytes():
+    cache = ChartCache(max_entries=2, max_bytes=10)
+    cache.put("a", b"1234")
+    cache.put("b", b"1234")
+    assert cache.get("a") == b"1234"
+    cache.put("c", b"1234")
+    assert cache.get("b") is None and len(cache) == 2
+    cache.put("d", b"123456789")
+    assert len(cache) == 1 and cache.size_bytes == 9
+
+
+def test_link_stage_only_links_periods_with_records():
+    images = link_stage(["U1", "U2"], ROWS, date(2026, 10, 18), periods=["day", "week", "trend"])
+    assert set(images) == {("U1", "day"), ("U1", "week"), ("U1", "trend")}
+    full, preview = images[("U1", "day")]
+    assert "/charts/U1/day.png?date=2026-10-18" in full
+    assert "/charts/U1/day.preview.png?date=2026-10-18" in preview
@@ -0,0 +1,69 @@
+from fakes import FakeClock
+from webhook_queue.dedupe import DUPLICATES_DROPPED, EventDeduper, EventJournal
+
+
+def test_duplicates_are_dropped_until_ttl_expires():
+    clock = FakeClock()
+    deduper = EventDeduper(ttl_seconds=60, clock=clock)
+    before = DUPLICATES_DROPPED.total()
+
+    assert deduper.check_and_mark("ev1")
+    assert not deduper.check_and_mark("ev1")
+    assert DUPLICATES_DROPPED.total() == before + 1
+
+    clock.now += 61
+    assert deduper.check_and_mark("ev1")
+    assert len(deduper) == 1
+
+
+def test_events_without_id_are_always_processed():
+    deduper = EventDeduper()
+    assert deduper.check_and_mark(None)
+    assert deduper.check_and_mark(None)
+
+
+def test_forget_allows_redelivery():
+    deduper = EventDeduper()
+    deduper.check_and_mark("ev1")
+    deduper.forget("ev1")
+    assert deduper.check_and_mark("ev1")
+
+
+def test_max_entries_bounds_memory():
+    deduper = EventDeduper(max_entries=3)
+    for i in range(10):
+        deduper.check_and_mark(f"ev{i}")
+    assert len(deduper) <= 4
+
+
+def test_disk_store_survives_restart_and_is_shared(tmp_path):
+    clock = FakeClock()
+    path = str(tmp_path / "dedupe.sqlite3")
+    first = EventDeduper(ttl_seconds=60, path=path, clock=clock)
+    assert first.check_and_mark("ev1")
+
+    # 再起動後・別プロセスでも同じ ID は捨てる
+    second = EventDeduper(ttl_seconds=60, path=path, clock=clock)
+    assert not second.check_and_mark("ev1")
+
+    third = EventDeduper(ttl_seconds=60, path=path, clock=clock)
+    clock.now += 61
+    assert third.check_and_mark("ev1")
+
+
+def test_journal_returns_saved_reply_until_ttl_expires(tmp_path):
+    clock = FakeClock()
+    path = str(tmp_path / "dedupe.sqlite3")
+    journal = EventJournal(ttl_seconds=60, path=path, clock=clock)
+    assert journal.get("ev1") is None
+    journal.put("ev1", "✅ 「数学」を10分 記録しました！")
+    journal.put(None, "ignored")
+
+    # 再起動後の再送でも、保存をやり直さず同じ返信を使える
+    restarted = EventJournal(ttl_seconds=60, path=path, clock=clock)
+    assert restarted.get("ev1") == "✅ 「数学」を10分 記録しました！"
+    assert restarted.get(None) is None
+
+    clock.now += 61
+    assert journal.get("ev1") is None
+    assert restarted.get("ev1") is None
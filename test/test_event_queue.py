@@ -0,0 +1,51 @@
+import time
+
+from webhook_queue.event_queue import EventQueue
+
+
+def make_queue(tmp_path, **kwargs):
+    return EventQueue(str(tmp_path / "events.sqlite3"), **kwargs)
+
+
+def test_same_user_events_are_claimed_in_order(tmp_path):
+    q = make_queue(tmp_path)
+    q.enqueue([("U1", {"n": 1}), ("U1", {"n": 2}), ("U2", {"n": 3})])
+
+    first = q.claim(timeout=0)
+    second = q.claim(timeout=0)
+    assert first[1] == {"n": 1}
+    # U1 の2件目は1件目が終わるまで出てこない
+    assert second[1] == {"n": 3}
+    assert q.claim(timeout=0) is None
+
+    q.complete(first[0])
+    assert q.claim(timeout=0)[1] == {"n": 2}
+
+
+def test_failed_event_is_retried_then_dead(tmp_path):
+    q = make_queue(tmp_path, max_attempts=2)
+    q.enqueue([("U1", {"n": 1})])
+
+    event_id, _, attempts = q.claim(timeout=0)
+    assert attempts == 0
+    q.fail(event_id, "boom")
+    assert q.stats()["pending"] == 1
+
+    q._conn.execute("UPDATE events SET available_at = ?", (time.time(),))
+    event_id, _, attempts = q.claim(timeout=0)
+    assert attempts == 1
+    q.fail(event_id, "boom")
+    stats = q.stats()
+    assert stats["dead"] == 1 and stats["depth"] == 0
+
+
+def test_running_events_are_recovered_after_restart(tmp_path):
+    q = make_queue(tmp_path)
+    q.enqueue([("U1", {"n": 1})])
+    assert q.claim(timeout=0) is not None
+    q.close()
+
+    q = make_queue(tmp_path)
+    stats = q.stats()
+    assert stats["pending"] == 1 and stats["lag_seconds"] >= 0
+    assert q.claim(timeout=0)[1] == {"n": 1}
@@ -0,0 +1,99 @@
+from datetime import datetime
+
+from fakes import FakeWorksheet
+from goal_manager.goal_index import GOAL_COLUMNS, GoalIndex
+
+
+def goal_sheet(rows):
+    return FakeWorksheet([list(GOAL_COLUMNS)] + rows)
+
+
+def goal(user_id, value, date="2026/10/18"):
+    return [user_id, "daily", "time", value, date, date, date]
+
+
+def test_upsert_updates_in_place_then_appends():
+    ws = goal_sheet([[str(v) for v in goal("U1", 30)]])
+    index = GoalIndex(lambda: ws)
+
+    assert index.upsert(goal("U1", 60)) == 2
+    assert index.upsert(goal("U2", 90)) == 3
+    assert index.upsert(goal("U2", 120)) == 3
+
+    assert ws.reads == 1
+    assert ws.writes == ["A2:G2", "A3:G3", "A3:G3"]
+    assert [row[3] for row in ws.rows[1:]] == ["60", "120"]
+
+
+def test_compact_drops_duplicates_and_expired_rows():
+    ws = goal_sheet([
+        [str(v) for v in goal("U1", 30, "2026/01/01")],
+        [str(v) for v in goal("U1", 30)],
+        [str(v) for v in goal("U1", 45)],
+        [str(v) for v in goal("U2", 60)],
+    ])
+    index = GoalIndex(lambda: ws)
+
+    removed = index.compact(retention_days=90, today=datetime(2026, 10, 18))
+    assert removed == 2
+    assert [(row[0], row[3]) for row in ws.rows[1:]] == [("U1", "45"), ("U2", "60")]
+
+
+def test_upsert_after_compaction_by_another_process_does_not_overwrite_other_users():
+    ws = goal_sheet([
+        [str(v) for v in goal("U1", 30, "2026/01/01")],
+        [str(v) for v in goal("U2", 60)],
+        [str(v) for v in goal("U3", 90)],
+    ])
+    web = GoalIndex(lambda: ws)
+    nightly = GoalIndex(lambda: ws)
+    web.upsert(goal("U2", 60))  # 索引を作る（U2 は3行目）
+
+    # 別プロセスの compact で U1 の古い行が消え、U2 / U3 が1行ずつ上に詰まる
+    assert nightly.compact(retention_days=90, today=datetime(2026, 10, 18)) == 1
+
+    assert web.upsert(goal("U2", 75)) == 2
+    assert web.upsert(goal("U4", 15)) == 4
+    assert [(row[0], row[3]) for row in ws.rows[1:]] == [("U2", "75"), ("U3", "90"), ("U4", "15")]
+    assert ws.reads == 3  # 最初の索引、compact、食い違いに気づいての作り直し
+
+
+def test_appends_from_two_processes_get_separate_rows():
+    ws = goal_sheet([[str(v) for v in goal("U1", 30)]])
+    first, second = GoalIndex(lambda: ws), GoalIndex(lambda: ws)
+    first.upsert(goal("U1", 30))
+    second.upsert(goal("U1", 30))
+
+    assert first.upsert(goal("U2", 45)) == 3
+    assert second.upsert(goal("U3", 50)) == 4
+    assert [row[0] for row in ws.rows[1:]] == ["U1", "U2", "U3"]
+
+
+def test_compact_keeps_old_goals_unless_retention_is_given():
+    ws = goal_sheet([
+        [str(v) for v in goal("U1", 30, "2026/01/01")],
+        [str(v) for v in goal("U2", 60)],
+    ])
+    assert GoalIndex(lambda: ws).compact(retention_days=0) == 0
+    assert len(ws.rows) == 3
+
+
+def test_compact_does_not_lose_updates_made_while_it_runs():
+    ws = goal_sheet([
+        [str(v) for v in goal("U1", 30)],
+        [str(v) for v in goal("U2", 60)],
+        [str(v) for v in goal("U1", 45)],
+        [str(v) for v in goal("U3", 15)],
+        [str(v) for v in goal("U3", 20)],
+    ])
+    web = GoalIndex(lambda: ws)
+    web.upsert(goal("U2", 60))
+
+    def concurrent_updates():
+        # 目標シートを読んだあとで、web が U2 を上書きし、だれかが U3 の古い行を書き換える
+        web.upsert(goal("U2", 90))
+        ws.rows[4][3] = "99"
+    ws.before_batch_get = concurrent_updates
+
+    assert GoalIndex(lambda: ws).compact(retention_days=0) == 1
+    assert [(row[0], row[3]) for row in ws.rows[1:]] == [("U2", "90"), ("U1", "45"), ("U3", "99"), ("U3", "20")]
@@ -0,0 +1,30 @@
+from datetime import date
+
+import pytest
+
+pd = pytest.importorskip("pandas")
+pytest.importorskip("gspread")
+pytest.importorskip("requests")
+
+from graph_generator.generate_and_send_graphs import aggregate_stage
+
+
+def test_aggregate_buckets_all_periods_in_one_pass():
+    rows = pd.DataFrame([
+        ("U1", "2026/10/18", "英語", 30),
+        ("U1", "2026/10/14", "英語", 60),
+        ("U1", "2026/10/01", "数学", 45),
+        ("U2", "2026/10/12", "国語", 20),
+    ], columns=["user_id", "date", "subject", "minutes"])
+
+    # 2026/10/18 は日曜日 → 週は 10/12 から
+    jobs = aggregate_stage(rows, date(2026, 10, 18), periods=["day", "week", "month", "trend"])
+
+    assert jobs[("U1", "day")][1][2:4] == (["英語"], [30])
+    assert jobs[("U1", "week")][1][2:4] == (["英語"], [90])
+    assert jobs[("U1", "month")][1][2:4] == (["英語", "数学"], [90, 45])
+    assert ("U2", "day") not in jobs
+    assert jobs[("U2", "week")][1][3] == [20]
+
+    kind, (user_id, days, labels, minutes, _) = jobs[("U1", "trend")]
+    assert kind == "line" and labels[-1] == "10/18" and minutes[-1] == 30 and len(minutes) == days
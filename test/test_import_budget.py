@@ -0,0 +1,21 @@
+from benchmarks import import_budget
+
+SAMPLE = """import time: self [us] | cumulative | imported package
+import time:       120 |        120 |   pandas.core
+import time:       300 |        420 | pandas
+import time:        80 |        900 | graph_generator.generate_and_send_graphs
+"""
+
+
+def test_parse_importtime_and_forbidden():
+    cumulative = import_budget.parse_importtime(SAMPLE)
+    assert cumulative["graph_generator.generate_and_send_graphs"] == 900
+    assert import_budget.find_forbidden(cumulative, ("pandas", "gspread")) == ["pandas"]
+    assert import_budget.find_forbidden({"pandasql": 1}, ("pandas",)) == []
+
+
+def test_cron_entry_points_skip_heavy_modules():
+    # 時間は環境に左右されるので、ここでは重いモジュールを読み込まないことだけ確かめる
+    entries = {m: spec for m, spec in import_budget.ENTRY_POINTS.items() if m != "app"}
+    for result in import_budget.check(entries, scale=100):
+        assert result.get("skipped") or result["heavy"] == [], result
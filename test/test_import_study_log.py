@@ -0,0 +1,64 @@
+import json
+
+import pytest
+
+from fakes import FakeSink
+from spreadsheet_utils.import_study_log import SheetsImportSink, StorageImportSink, import_csv, validate_row
+from storage.local_backend import LocalStorage
+
+CSV = """user_id,datetime,subject,minutes,raw_message
+U1,2026/9/1 8:00,英語,30,
+U2,2026-09-01T09:00:00,,,すうがく1時間半
+U1,2026/9/1 8:00,英語,30,
+U3,2026/9/2 7:00,謎の科目,30,
+,2026/9/2 7:00,英語,30,
+U2,2026/9/3 7:00,数学,45,
+"""
+
+
+@pytest.fixture
+def csv_path(tmp_path):
+    path = tmp_path / "school.csv"
+    path.write_text(CSV, encoding="utf-8")
+    return str(path)
+
+
+def test_validate_row_uses_message_rules():
+    record, reason = validate_row({"user_id": "U1", "datetime": "2026/9/1 8:00", "raw_message": "えいご1時間"}, "r7")
+    assert reason is None
+    assert (record["subject"], record["minutes"], record["record_id"]) == ("英語", 60, "r7")
+    # CSV にない秒未満の値は足さない
+    assert record["datetime"] == "2026-09-01T08:00:00"
+    assert validate_row({"user_id": "U1", "datetime": "昨日", "raw_message": "英語1時間"})[1] == "日時が読み取れません"
+    assert validate_row({"user_id": "U1", "datetime": "2026/9/1", "raw_message": "英語"})[1] == "時間が読み取れません"
+
+
+def test_import_writes_chunks_and_rejects(csv_path):
+    storage = LocalStorage()
+    result = import_csv(csv_path, StorageImportSink(storage), chunk_rows=2)
+    assert (result["imported"], result["rejected"]) == (4, 2)
+    # 同じ分の記録も別々に数える
+    assert storage.study_minutes("U1", "2026/09/01") == 60
+    assert storage.study_minutes("U2", "2026/09/01") == 90
+    with open(csv_path + ".rejects.csv", encoding="utf-8") as f:
+        assert [line.split(",")[0] for line in f.read().splitlines()[1:]] == ["4", "5"]
+
+
+def test_resume_skips_finished_sheets(csv_path):
+    sink = FakeSink(fail_targets=["U2"])
+    with pytest.raises(RuntimeError):
+        import_csv(csv_path, SheetsImportSink(sink), chunk_rows=2)
+    # StudyLog と U1 は書けた（U2 で止まった）
+    assert len(sink.rows["StudyLog"]) == 2
+    with open(csv_path + ".ckpt", encoding="utf-8") as f:
+        assert json.load(f)["targets"] == {"StudyLog": 2, "U1": 2}
+
+    sink.fail_targets.clear()
+    result = import_csv(csv_path, SheetsImportSink(sink), chunk_rows=2)
+    assert result["imported"] == 4
+    assert len(sink.rows["StudyLog"]) == 4
+    assert len(sink.rows["U1"]) == 2
+    assert len(sink.rows["U2"]) == 2
+    # 最後まで終わったあとにもう一度実行しても何も書かない
+    assert import_csv(csv_path, SheetsImportSink(sink), chunk_rows=2)["imported"] == 4
+    assert len(sink.rows["StudyLog"]) == 4
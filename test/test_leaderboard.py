@@ -0,0 +1,41 @@
+from datetime import date, datetime
+
+from fakes import FakeClock
+from spreadsheet_utils.leaderboard import WeeklyLeaderboard, format_leaderboard
+
+
+def test_incremental_ranking_with_ties_and_subjects():
+    clock = FakeClock(datetime(2026, 10, 14, 12, 0))
+    board = WeeklyLeaderboard(clock=clock)
+    board.rebuild([("U1", "2026/10/12", "英語", 30), ("U2", "2026/10/13", "数学", 60),
+                   ("U3", "2026/10/05", "英語", 999)])  # 先週の分は数えない
+    board.add("U1", "数学", 30, when="2026-10-14T08:00:00")
+    board.add("U3", "英語", 10, when="2026-10-14T09:00:00")
+
+    assert board.top(10) == [("U1", 60), ("U2", 60), ("U3", 10)]
+    assert board.rank("U2") == (1, 60)
+    assert board.rank("U3") == (3, 10)
+    assert board.top(10, "英語") == [("U1", 30), ("U3", 10)]
+    assert board.rank("U2", "英語") is None
+
+
+def test_resets_on_week_boundary():
+    clock = FakeClock(datetime(2026, 10, 18, 23, 0))
+    board = WeeklyLeaderboard(clock=clock)
+    board.add("U1", "英語", 30)
+    clock.now = datetime(2026, 10, 19, 0, 5)
+    assert board.top() == []
+    # 日付の遅れて届いた先週の記録は足さない
+    assert not board.add("U1", "英語", 30, when=date(2026, 10, 18))
+
+
+def test_format_masks_other_users():
+    clock = FakeClock(datetime(2026, 10, 14, 12, 0))
+    board = WeeklyLeaderboard(clock=clock)
+    board.add("Uaaaa1111", "英語", 90)
+    board.add("Ubbbb2222", "英語", 30)
+    text = format_leaderboard(board, "Ubbbb2222")
+    assert "1位 ユーザー…1111 90分" in text
+    assert "2位 あなた 30分" in text
+    assert "あなたは 2位（30分）" in text
+    assert "Uaaaa1111" not in text
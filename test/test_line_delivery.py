@@ -0,0 +1,64 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+import pytest
+
+pytest.importorskip("requests")
+
+from line_utils.line_delivery import LineDelivery, text_message
+
+
+class MockLine(BaseHTTPRequestHandler):
+    calls = []
+    fail_first = 0
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        MockLine.calls.append((self.path, body))
+        if MockLine.fail_first > 0:
+            MockLine.fail_first -= 1
+            self.send_response(429)
+            self.send_header("Retry-After", "0")
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.end_headers()
+        self.wfile.write(b"{}")
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def mock_line():
+    MockLine.calls = []
+    MockLine.fail_first = 0
+    server = HTTPServer(("127.0.0.1", 0), MockLine)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_port}"
+    server.shutdown()
+
+
+def test_identical_messages_are_multicast(mock_line):
+    delivery = LineDelivery(token="t", api_base=mock_line)
+    items = [(f"U{i}", [text_message("目標が未設定です")]) for i in range(3)]
+    items.append(("U9", [text_message("今日は120分")]))
+
+    stats = delivery.send_all(items)
+
+    paths = sorted(path for path, _ in MockLine.calls)
+    assert paths == ["/v2/bot/message/multicast", "/v2/bot/message/push"]
+    assert stats["delivered"] == 4 and stats["failed"] == 0
+
+
+def test_429_is_retried(mock_line):
+    MockLine.fail_first = 2
+    delivery = LineDelivery(token="t", api_base=mock_line, backoff_base=0)
+
+    assert delivery.push("U1", [text_message("hi")])
+    stats = delivery.stats.as_dict()
+    assert stats["retries"] == 2
+    assert stats["status_counts"] == {429: 2, 200: 1}
@@ -0,0 +1,32 @@
+from data_utils.message_router import (
+    route_message, NotificationCommand, DailyGoalCommand, StudyLogCommand, UnknownCommand, LeaderboardCommand
+)
+from goal_manager.parse_goal import parse_daily_goal_message
+
+
+def test_notification():
+    assert route_message("朝の通知を7時30分にして") == NotificationCommand("朝", "07:30")
+    assert route_message("夜の通知を９時半にして") == NotificationCommand("夜", "21:30")
+
+
+def test_daily_goal_takes_priority_over_study_time():
+    command = route_message("英語30分 毎日1時間")
+    assert command == DailyGoalCommand({"unit": "daily", "type": "time", "value": 60})
+    assert parse_daily_goal_message("毎日１時間半") == {"unit": "daily", "type": "time", "value": 90}
+
+
+def test_study_log():
+    assert route_message("英語1時間半") == StudyLogCommand("英語", 90)
+    assert route_message("数学１時間30分") == StudyLogCommand("数学", 90)
+    assert route_message("すうがく30分") == StudyLogCommand("数学", 30)
+
+
+def test_unknown():
+    assert route_message("今日は頑張った") == UnknownCommand("format")
+    assert route_message("30分") == UnknownCommand("subject", 30)
+
+
+def test_leaderboard():
+    assert route_message("ランキング") == LeaderboardCommand()
+    assert route_message("ランキング　えいご") == LeaderboardCommand("英語")
+    assert route_message("ランキング 謎の科目") == UnknownCommand("subject")
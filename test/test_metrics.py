@@ -0,0 +1,40 @@
+import pytest
+
+from metrics_utils import metrics
+from metrics_utils.metrics import Counter, Histogram, span
+
+
+def test_histogram_renders_cumulative_buckets():
+    hist = Histogram("test_seconds", "テスト", buckets=(0.1, 1.0))
+    hist.observe(0.05, stage="parse")
+    hist.observe(0.5, stage="parse")
+    lines = hist.render()
+    assert 'test_seconds_bucket{stage="parse",le="0.1"} 1' in lines
+    assert 'test_seconds_bucket{stage="parse",le="1.0"} 2' in lines
+    assert 'test_seconds_bucket{stage="parse",le="+Inf"} 2' in lines
+    assert 'test_seconds_count{stage="parse"} 2' in lines
+
+
+def test_counter_escapes_label_values():
+    counter = Counter("test_total", "テスト")
+    counter.inc(method='a"b')
+    assert counter.render()[-1] == 'test_total{method="a\\"b"} 1'
+
+
+def test_span_records_time_and_errors():
+    before = metrics.STAGE_SECONDS.count(stage="test.span")
+    with pytest.raises(ValueError):
+        with span("test.span"):
+            raise ValueError
+    assert metrics.STAGE_SECONDS.count(stage="test.span") == before + 1
+    assert metrics.STAGE_ERRORS.value(stage="test.span") >= 1
+    assert 'studymebot_stage_errors_total{stage="test.span"}' in metrics.render_prometheus()
+
+
+def test_dump_metrics_writes_textfile(tmp_path, monkeypatch):
+    path = tmp_path / "job.prom"
+    monkeypatch.setenv("METRICS_TEXTFILE", str(path))
+    with span("test.dump"):
+        pass
+    metrics.dump_metrics("test_job")
+    assert 'stage="test.dump"' in path.read_text(encoding="utf-8")
@@ -0,0 +1,37 @@
+from fakes import FakeWorksheet
+from spreadsheet_utils.notify_settings import NotifySettingsStore
+
+
+def make_store():
+    ws = FakeWorksheet([
+        ["user_id", "morning", "noon", "evening", "night"],
+        ["U1", "07:00", "OFF", "OFF", "22:00"],
+    ])
+    return ws, NotifySettingsStore(lambda: ws, coalesce_ms=60_000)
+
+
+def test_changes_are_coalesced_into_one_batch_update():
+    ws, store = make_store()
+    assert store.set_time("U1", "morning", "06:30") is True
+    assert store.set_time("U1", "night", "23:00") is True
+    assert store.set_time("U2", "noon", "12:15") is False
+    store.close()
+
+    assert ws.reads == 1
+    assert ws.batches == [[
+        {"range": "B2", "values": [["06:30"]]},
+        {"range": "E2", "values": [["23:00"]]},
+        {"range": "A3:E3", "values": [["U2", "OFF", "12:15", "OFF", "OFF"]]},
+    ]]
+
+
+def test_appended_user_is_indexed_for_later_updates():
+    ws, store = make_store()
+    store.set_time("U2", "noon", "12:15")
+    store.flush()
+    assert store.has_user("U2")
+
+    store.set_time("U2", "night", "21:00")
+    store.close()
+    assert ws.batches[-1] == [{"range": "E3", "values": [["21:00"]]}]
+    assert ws.reads == 1
@@ -0,0 +1,78 @@
+import threading
+import time
+
+from fakes import FakeClock
+from spreadsheet_utils.quota_governor import (
+    BULK, INTERACTIVE, READ, WRITE, QuotaGovernor, is_idempotent, quota_class_for, request_priority, current_priority
+)
+
+
+def make_governor(tmp_path, clock, **kwargs):
+    return QuotaGovernor(str(tmp_path / "quota.json"), rates={READ: 1.0, WRITE: 1.0}, burst=3,
+                         clock=clock.time, sleep=clock.sleep, **kwargs)
+
+
+def test_bucket_waits_for_refill(tmp_path):
+    clock = FakeClock()
+    governor = make_governor(tmp_path, clock, reserve=0)
+    assert [governor.acquire(WRITE) for _ in range(3)] == [0, 0, 0]
+    assert governor.acquire(WRITE) > 0
+    # 読み取りのバケットは別
+    assert governor.acquire(READ) == 0
+
+
+def test_bulk_leaves_reserve_for_interactive(tmp_path):
+    clock = FakeClock()
+    governor = make_governor(tmp_path, clock, reserve=2)
+    assert governor.acquire(READ, BULK) == 0
+    assert governor.acquire(READ, BULK) > 0
+    started = clock.now
+    assert governor.acquire(READ, INTERACTIVE) == 0
+    assert clock.now == started
+
+
+def test_penalize_empties_bucket_shared_by_state_file(tmp_path):
+    clock = FakeClock()
+    first = make_governor(tmp_path, clock, reserve=0)
+    second = make_governor(tmp_path, clock, reserve=0)
+    first.penalize(WRITE)
+    assert second.tokens(WRITE) == 0
+    assert second.acquire(WRITE) >= 1
+
+
+def test_governors_on_one_state_file_share_one_bucket(tmp_path):
+    # プロセスごとに別の QuotaGovernor ができるのと同じく、インスタンスを分けてファイルだけ共有する
+    path = str(tmp_path / "quota.json")
+
+    def take():
+        governor = QuotaGovernor(path, rates={READ: 20.0, WRITE: 20.0}, burst=10, reserve=0)
+        for _ in range(10):
+            governor.acquire(WRITE)
+
+    started = time.monotonic()
+    workers = [threading.Thread(target=take) for _ in range(3)]
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join(30)
+    # 30 回のうち容量（10）を超えた 20 回は毎秒 20 の補充を待つ → 全体で約1秒
+    assert time.monotonic() - started >= 0.9
+
+
+def test_quota_class_and_priority():
+    assert quota_class_for("get", "https://sheets.googleapis.com/v4/spreadsheets/x/values/A1") == READ
+    assert quota_class_for("POST", "https://sheets.googleapis.com/v4/spreadsheets/x:batchUpdate") == WRITE
+    assert quota_class_for("GET", "https://www.googleapis.com/drive/v3/files") is None
+    with request_priority(BULK):
+        assert current_priority() == BULK
+    assert current_priority() == INTERACTIVE
+
+
+def test_only_idempotent_requests_are_retried_on_5xx():
+    base = "https://sheets.googleapis.com/v4/spreadsheets/x"
+    assert is_idempotent("get", f"{base}/values/A1")
+    assert is_idempotent("PUT", f"{base}/values/A2%3AG2")
+    assert is_idempotent("POST", f"{base}/values:batchUpdate")
+    assert is_idempotent("POST", f"{base}/values:batchClear")
+    assert not is_idempotent("POST", f"{base}/values/StudyLog%21A1:append")
+    assert not is_idempotent("POST", f"{base}:batchUpdate")
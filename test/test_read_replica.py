@@ -0,0 +1,80 @@
+from fakes import FakeWorksheet
+from spreadsheet_utils.read_replica import ReadReplica, normalize_date
+
+HEADER = ["datetime", "user_id", "subject", "minutes", "raw_message"]
+
+
+
+def study_log_sheet(rows):
+    return FakeWorksheet([HEADER] + rows)
+
+
+def test_normalize_date():
+    assert normalize_date("2026-10-18T20:00:00.123") == "2026/10/18"
+    assert normalize_date("2026/1/5 8:00") == "2026/01/05"
+    assert normalize_date("") == ""
+
+
+def test_incremental_sync_reads_only_new_rows():
+    ws = study_log_sheet([
+        ["2026-10-18T08:00:00", "U1", "英語", "30", "英語30分"],
+        ["2026-10-18T09:00:00", "U2", "数学", "60", "数学1時間"],
+    ])
+    replica = ReadReplica()
+    assert replica.sync_study_log(ws, force=True) == 2
+
+    ws.rows.append(["2026-10-18T10:00:00", "U1", "数学", "15", "数学15分"])
+    assert replica.sync_study_log(ws, force=True) == 1
+    # ヘッダーが5列のシートでも、後ろに足した record_id の列（F）まで読む
+    assert ws.ranges[-1] == "A3:F"
+
+    assert replica.study_minutes("U1", "2026/10/18") == 45
+    assert sorted(replica.user_ids()) == ["U1", "U2"]
+
+
+def test_changed_tail_triggers_full_resync():
+    ws = study_log_sheet([
+        ["2026-10-17T08:00:00", "U1", "英語", "30", "英語30分"],
+        ["2026-10-18T09:00:00", "U1", "数学", "60", "数学1時間"],
+    ])
+    replica = ReadReplica()
+    replica.sync_study_log(ws, force=True)
+
+    # 先頭行がアーカイブなどで消えると行番号がずれる
+    del ws.rows[1]
+    replica.sync_study_log(ws, force=True)
+    assert ws.ranges[-1] == "A1:Z"
+    assert replica.study_minutes("U1", "2026/10/17") == 0
+    assert replica.study_minutes("U1", "2026/10/18") == 60
+
+
+def test_goal_update_is_read_back_before_the_next_full_sync(monkeypatch):
+    from goal_manager import goal_index
+    from goal_manager.goal_index import GOAL_COLUMNS, GoalIndex
+    from spreadsheet_utils import read_replica
+    from storage.sheets_backend import SheetsStorage
+
+    ws = FakeWorksheet([list(GOAL_COLUMNS), ["U1", "daily", "time", "30", "2026/10/18", "2026/10/18", "2026/10/18"]])
+    replica = ReadReplica()
+    monkeypatch.setattr(read_replica, "_replica", replica)
+    monkeypatch.setattr(goal_index, "_index", GoalIndex(lambda: ws))
+
+    def sync(self):
+        # 同期間隔の内側なので、シートは読み直さない
+        replica.sync_goals(ws)
+        return replica
+    monkeypatch.setattr(SheetsStorage, "sync", sync)
+
+    storage = SheetsStorage()
+    assert replica.sync_goals(ws, force=True) == 1
+    assert storage.goal("U1", "2026/10/18") == 30
+
+    storage.upsert_goal(["U1", "daily", "time", 90, "2026/10/18", "2026/10/18", "2026/10/18"])
+    storage.upsert_goal(["U2", "daily", "time", 45, "2026/10/18", "2026/10/18", "2026/10/18"])
+    assert storage.goal("U1", "2026/10/18") == 90
+    assert storage.goal("U2", "2026/10/18") == 45
+
+    # 次にシートから同期しても同じ内容になる
+    replica.sync_goals(ws, force=True)
+    assert storage.goal("U1", "2026/10/18") == 90
+    assert storage.goal("U2", "2026/10/18") == 45
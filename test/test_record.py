@@ -1,14 +1,32 @@
-from spreadsheet_utils import record_study_log
 from datetime import datetime
 
-# テストデータを作成
-data = {
-    "datetime": datetime.now().isoformat(),
-    "user_id": "test_user_abc",
-    "subject": "テスト科目",
-    "minutes": 45,
-    "raw_message": "テスト科目45分"
-}
-
-# 関数呼び出し
-record_study_log(data)
+import pytest
+
+import storage
+from spreadsheet_utils.leaderboard import get_leaderboard, reset_leaderboard
+from storage.local_backend import LocalStorage
+
+
+@pytest.fixture
+def local():
+    backend = LocalStorage()
+    storage.set_storage(backend)
+    yield backend
+    storage.set_storage(None)
+    reset_leaderboard()
+
+
+def test_record_study_log_saves_and_counts_for_ranking(local):
+    from spreadsheet_utils.spreadsheet_utils import get_today_study_minutes, record_study_log
+
+    now = datetime.now()
+    record_study_log({
+        "datetime": now.isoformat(),
+        "user_id": "test_user_abc",
+        "subject": "テスト科目",
+        "minutes": 45,
+        "raw_message": "テスト科目45分",
+    })
+
+    assert get_today_study_minutes("test_user_abc", now.strftime("%Y/%m/%d")) == 45
+    assert ("test_user_abc", 45) in get_leaderboard().top(subject="テスト科目")
@@ -0,0 +1,41 @@
+import pytest
+
+pytest.importorskip("pandas")
+
+from goal_manager.report_engine import ACHIEVED_COMMENT, NO_GOAL_MESSAGE, build_goal_report
+
+
+def report_by_user(user_ids, goal_rows, study_rows):
+    report = build_goal_report(user_ids, goal_rows, study_rows)
+    return {row.user_id: row for row in report.itertuples()}
+
+
+def test_rate_and_comment_use_the_latest_goal_row():
+    rows = report_by_user(
+        ["U1", "U2"],
+        [(2, "U1", 30), (5, "U1", 90), (3, "U2", 60)],
+        [("U1", "英語", 30), ("U1", "数学", 15), ("U2", "英語", 60), ("U2", "国語", 20)],
+    )
+
+    assert (rows["U1"].goal_minutes, rows["U1"].study_minutes, rows["U1"].rate) == (90, 45, 50)
+    assert rows["U1"].comment == "💡 あと45分で目標達成です！あと少し！"
+    assert rows["U1"].message.startswith("📊 今日の記録：45分 ／ 目標：90分（達成率 50%）")
+
+    assert rows["U2"].rate == 133
+    assert rows["U2"].comment == ACHIEVED_COMMENT
+
+
+def test_users_without_goal_get_the_no_goal_message():
+    rows = report_by_user(["U1", "U3"], [(2, "U1", 30)], [("U3", "英語", 20)])
+
+    assert (rows["U3"].goal_minutes, rows["U3"].study_minutes, rows["U3"].rate) == (0, 20, 0)
+    assert rows["U3"].message == NO_GOAL_MESSAGE
+    assert rows["U1"].study_minutes == 0 and rows["U1"].rate == 0
+
+
+def test_empty_user_list_returns_an_empty_report():
+    report = build_goal_report([], [(2, "U1", 30)], [("U1", "英語", 20)])
+    assert report.empty
+    assert {"user_id", "rate", "message"} <= set(report.columns)
+
+    assert build_goal_report([], [], []).empty
@@ -0,0 +1,36 @@
+from datetime import datetime, timedelta
+
+from push_schedulers.scheduler import JST, NotificationSchedule, parse_time
+
+
+def test_parse_time():
+    assert parse_time("07:30") == (7, 30)
+    assert parse_time("7:05") == (7, 5)
+    assert parse_time("OFF") is None
+    assert parse_time("25:00") is None
+
+
+def test_due_notifications_are_batched_and_rescheduled():
+    now = datetime(2026, 10, 18, 6, 0, tzinfo=JST)
+    schedule = NotificationSchedule()
+    schedule.set_user("U1", {"morning": "07:00", "night": "OFF"}, now)
+    schedule.set_user("U2", {"morning": "07:00", "noon": "12:30"}, now)
+
+    assert schedule.pop_due(now + timedelta(minutes=59)) == []
+    due = schedule.pop_due(now + timedelta(hours=1))
+    assert sorted(due) == [("U1", "morning"), ("U2", "morning")]
+    assert schedule.next_fire_time() == datetime(2026, 10, 18, 12, 30, tzinfo=JST)
+
+
+def test_changed_and_removed_settings_drop_stale_entries():
+    now = datetime(2026, 10, 18, 6, 0, tzinfo=JST)
+    schedule = NotificationSchedule()
+    schedule.set_user("U1", {"morning": "07:00"}, now)
+    schedule.set_user("U2", {"morning": "07:00"}, now)
+
+    assert schedule.set_user("U1", {"morning": "08:00"}, now) == 1
+    assert schedule.set_user("U1", {"morning": "08:00"}, now) == 0
+    schedule.remove_user("U2")
+
+    assert schedule.pop_due(now + timedelta(hours=1)) == []
+    assert schedule.pop_due(now + timedelta(hours=2)) == [("U1", "morning")]
@@ -0,0 +1,87 @@
+import pytest
+
+from fakes import FakeBook, FakeWorksheet
+from graph_generator.split_by_user import (
+    STATE_HEADER, USER_SHEET_HEADER, QuotaExhausted, Watermarks, split_study_log
+)
+
+HEADER = ["datetime", "user_id", "subject", "minutes", "raw_message"]
+
+
+class FakeResponse:
+    status_code = 429
+
+
+class FakeAPIError(Exception):
+    response = FakeResponse()
+
+
+class FlakyWorksheet(FakeWorksheet):
+    """
+    最初の fail_appends 回の append_rows をクォータ切れで失敗させる。
+    """
+
+    def __init__(self, rows, fail_appends=0):
+        super().__init__(rows)
+        self.fail_appends = fail_appends
+
+    def append_rows(self, rows):
+        if self.fail_appends:
+            self.fail_appends -= 1
+            raise FakeAPIError("quota exceeded")
+        super().append_rows(rows)
+
+
+def log(*rows):
+    return FakeWorksheet([HEADER] + [[f"2026-10-18T0{i}:00:00", uid, "英語", "30", "英語30分"]
+                                     for i, uid in enumerate(rows, start=1)])
+
+
+def copied(book, user_id):
+    return [r[0] for r in book.sheets[user_id].rows[1:]]
+
+
+def test_resume_reads_only_new_rows_and_tail_of_user_sheets():
+    book = FakeBook({"StudyLog": log("UA", "UB")})
+    state = FakeWorksheet([STATE_HEADER])
+    assert split_study_log(book, Watermarks(state)) == {"UA": 1, "UB": 1}
+
+    # webhook が UA のシートにだけ先に書いた行は、2回目のコピーで飛ばす
+    book.sheets["StudyLog"].rows.append(["2026-10-18T05:00:00", "UA", "数学", "10", "数学10分"])
+    book.sheets["UA"].rows.append(["2026-10-18T05:00:00", "数学", "10", "数学10分"])
+    book.sheets["UA"].ranges.clear()
+
+    watermarks = Watermarks(state)
+    assert watermarks.get("UA") == 3 and watermarks.sheet_rows["UA"] == 2
+    assert split_study_log(book, watermarks) == {"UA": 0}
+    assert copied(book, "UA") == ["2026-10-18T01:00:00", "2026-10-18T05:00:00"]
+    # 前回の末尾より少し手前から読むだけで、列全体は読まない
+    assert book.sheets["UA"].ranges == ["A2:C"]
+    assert Watermarks(state).marks == {"UA": 4, "UB": 4}
+
+
+def test_quota_interruption_before_a_new_users_first_chunk_is_resumed():
+    book = FakeBook({"StudyLog": log("UA", "UB"), "UB": FlakyWorksheet([USER_SHEET_HEADER], fail_appends=1)})
+    state = FakeWorksheet([STATE_HEADER])
+
+    with pytest.raises(QuotaExhausted):
+        split_study_log(book, Watermarks(state))
+    # UB はまだ1行もコピーしていないので、StudyLog の読み始めは UB の行より後ろにならない
+    assert Watermarks(state).marks == {"UA": 2, "UB": 1}
+
+    assert split_study_log(book, Watermarks(state)) == {"UB": 1}
+    assert copied(book, "UA") == ["2026-10-18T01:00:00"]
+    assert copied(book, "UB") == ["2026-10-18T02:00:00"]
+    assert Watermarks(state).marks == {"UA": 3, "UB": 3}
+
+
+def test_rows_with_the_same_datetime_are_copied_separately():
+    rows = [HEADER,
+            ["2026-10-18T01:00:00", "UA", "英語", "30", "英語30分"],
+            ["2026-10-18T01:00:00", "UA", "数学", "30", "数学30分"],
+            ["2026-10-18T01:00:00", "UA", "英語", "30", "英語30分"]]
+    book = FakeBook({"StudyLog": FakeWorksheet(rows)})
+    # 1件目だけ webhook が先に書いていた
+    book.sheets["UA"] = FakeWorksheet([USER_SHEET_HEADER, ["2026-10-18T01:00:00", "英語", "30", "英語30分"]])
+    assert split_study_log(book, Watermarks(FakeWorksheet([STATE_HEADER]))) == {"UA": 2}
+    assert [r[1] for r in book.sheets["UA"].rows[1:]] == ["英語", "数学", "英語"]
@@ -0,0 +1,75 @@
+from datetime import datetime
+
+import pytest
+
+import storage
+from spreadsheet_utils.leaderboard import get_leaderboard, reset_leaderboard
+from storage.local_backend import LocalStorage
+
+
+@pytest.fixture
+def local():
+    backend = LocalStorage()
+    storage.set_storage(backend)
+    yield backend
+    storage.set_storage(None)
+    reset_leaderboard()
+
+
+def record(dt, user_id, subject, minutes):
+    return {"datetime": dt, "user_id": user_id, "subject": subject, "minutes": minutes, "raw_message": ""}
+
+
+def test_study_log_queries(local):
+    local.append_study_logs([
+        record("2026-10-18T08:00:00", "U1", "英語", 30),
+        record("2026-10-18T09:00:00", "U1", "英語", 15),
+        record("2026-10-17T09:00:00", "U2", "数学", 60),
+    ])
+    assert local.study_minutes("U1", "2026/10/18") == 45
+    assert local.study_rows_on("2026/10/18") == [("U1", "英語", 45)]
+    assert sorted(local.daily_rows_between("2026/10/17", "2026/10/18")) == [
+        ("U1", "2026/10/18", "英語", 45), ("U2", "2026/10/17", "数学", 60)
+    ]
+
+
+def test_goal_upsert_overwrites_same_day(local):
+    first = local.upsert_goal(["U1", "daily", "time", 60, "2026/10/18", "2026/10/18", "2026/10/18"])
+    second = local.upsert_goal(["U1", "daily", "time", 90, "2026/10/18", "2026/10/18", "2026/10/18"])
+    assert first == second
+    assert local.goal("U1", "2026/10/18") == 90
+    assert local.goal_rows_on("2026/10/18") == [(first, "U1", 90)]
+
+
+def test_update_notification_time_through_storage(local):
+    from spreadsheet_utils.spreadsheet_utils import update_notification_time
+
+    assert "新しいユーザー" in update_notification_time("U1", "朝", "07:30")
+    assert "更新しました" in update_notification_time("U1", "夜", "22:00")
+    assert update_notification_time("U1", "深夜", "01:00") == "時間帯の指定が正しくありません。"
+
+    settings = local.notification_settings()["U1"]
+    assert (settings["morning"], settings["noon"], settings["night"]) == ("07:30", "OFF", "22:00")
+    assert local.notification_settings_version() == 2
+
+
+def test_record_study_log_through_storage(local):
+    from spreadsheet_utils.spreadsheet_utils import record_study_log, get_today_study_minutes
+
+    record_study_log(record("2026-10-18T08:00:00", "U1", "英語", 30))
+    assert get_today_study_minutes("U1", "2026/10/18") == 30
+
+
+def test_leaderboard_is_built_from_storage_then_updated(local):
+    from spreadsheet_utils.spreadsheet_utils import record_study_log
+
+    now = datetime.now().isoformat()
+    local.append_study_log(record(now, "U1", "英語", 30))
+    record_study_log(record(now, "U2", "英語", 45))
+    record_study_log(record(now, "U1", "数学", 20))
+    assert get_leaderboard().top() == [("U1", 50), ("U2", 45)]
+
+
+def test_unknown_backend_is_rejected():
+    with pytest.raises(ValueError):
+        storage.create_storage("excel")
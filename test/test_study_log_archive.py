@@ -0,0 +1,80 @@
+from datetime import date
+
+from fakes import FakeBook, FakeWorksheet
+from spreadsheet_utils.study_log_archive import (
+    MANIFEST_SHEET, archive_study_log, first_hot_month, load_archived_records, row_ranges
+)
+from spreadsheet_utils.study_rollup import StudyRollup
+
+HEADER = ["datetime", "user_id", "subject", "minutes", "raw_message"]
+
+
+class FakeWatermarks:
+    def __init__(self):
+        self.shifted = []
+        self.forgotten = []
+
+    def shift(self, deleted_rows):
+        self.shifted.append(list(deleted_rows))
+
+    def forget_sheet_rows(self, user_ids):
+        self.forgotten.append(list(user_ids))
+
+
+def study_log():
+    return FakeWorksheet([HEADER] + [
+        ["2026-07-31T08:00:00", "U1", "英語", "30", "英語30分"],
+        ["2026-08-02T08:00:00", "U1", "数学", "60", "数学1時間"],
+        ["2026-08-03T08:00:00", "U2", "英語", "15", "英語15分"],
+        ["2026-09-01T08:00:00", "U1", "英語", "45", "英語45分"],
+        ["2026-10-18T08:00:00", "U2", "数学", "20", "数学20分"],
+    ])
+
+
+def test_first_hot_month_and_ranges():
+    assert first_hot_month(date(2026, 10, 18), 2) == "2026/09"
+    assert first_hot_month(date(2026, 1, 5), 2) == "2025/12"
+    assert row_ranges([2, 3, 4, 7, 9, 10]) == [(9, 10), (7, 7), (2, 4)]
+
+
+def test_archive_moves_closed_months_and_is_rerunnable():
+    user_sheet = FakeWorksheet([["datetime", "subject", "minutes", "raw_message"],
+                                ["2026-08-02T08:00:00", "数学", "60", "数学1時間"],
+                                ["2026-09-01T08:00:00", "英語", "45", "英語45分"]])
+    book = FakeBook({"StudyLog": study_log(), "U1": user_sheet})
+    watermarks = FakeWatermarks()
+
+    archived = archive_study_log(book, date(2026, 10, 18), watermarks=watermarks, keep_months=2)
+    assert archived == {"2026/07": 1, "2026/08": 2}
+    assert watermarks.shifted == [[2, 3, 4]]
+    assert watermarks.forgotten == [["U1"]]
+    # ホットには直近2か月だけが残る
+    assert [r[0][:7] for r in book.sheets["StudyLog"].rows[1:]] == ["2026-09", "2026-10"]
+    assert [r[0][:7] for r in user_sheet.rows[1:]] == ["2026-09"]
+    assert len(book.sheets["StudyLog_2026_08"].rows) == 3
+
+    manifest = book.sheets[MANIFEST_SHEET].rows
+    assert [r[:3] for r in manifest[1:]] == [["2026/07", "StudyLog_2026_07", "1"],
+                                              ["2026/08", "StudyLog_2026_08", "2"]]
+
+    # 2回目はアーカイブする月がなく、何も変わらない
+    assert archive_study_log(book, date(2026, 10, 18), keep_months=2) == {}
+    assert len(book.sheets["StudyLog_2026_08"].rows) == 3
+
+
+def test_archived_records_and_rollup_keep_history():
+    book = FakeBook({"StudyLog": study_log()})
+    rollup = StudyRollup()
+    rollup.apply([dict(zip(HEADER, r)) for r in book.sheets["StudyLog"].rows[1:]])
+
+    archive_study_log(book, date(2026, 10, 18), keep_months=2)
+    records = load_archived_records(book, "2026/08/01", "2026/08/31")
+    assert sorted(r["minutes"] for r in records) == ["15", "60"]
+    assert len(load_archived_records(book)) == 3
+
+    # シートに残った範囲だけ作り直しても、アーカイブした月の集計は消えない
+    hot = [dict(zip(HEADER, r)) for r in book.sheets["StudyLog"].rows[1:]]
+    rollup.rebuild(hot, since="2026/09/01")
+    assert rollup.minutes("U1", "2026/08/02") == 60
+    assert rollup.minutes("U1", "2026/09/01") == 45
+    assert sorted(rollup.user_ids()) == ["U1", "U2"]
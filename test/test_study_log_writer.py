@@ -0,0 +1,105 @@
+import json
+
+from fakes import FakeSink
+from spreadsheet_utils.study_log_writer import STUDY_LOG_HEADER, StudyLogWriter, ensure_header
+
+
+def entry(user_id, minutes):
+    return {
+        "datetime": "2026-10-18T20:00:00",
+        "user_id": user_id,
+        "subject": "英語",
+        "minutes": minutes,
+        "raw_message": f"英語{minutes}分"
+    }
+
+
+def make_writer(tmp_path, sink):
+    return StudyLogWriter(str(tmp_path / "study_log.wal"), sink=sink, start_thread=False)
+
+
+def test_flush_uses_one_append_rows_per_sheet(tmp_path):
+    sink = FakeSink()
+    writer = make_writer(tmp_path, sink)
+    writer.submit(entry("U1", 10))
+    writer.submit(entry("U1", 20))
+    writer.submit(entry("U2", 30))
+
+    assert writer.flush() == 3
+    targets = sorted(target for target, _ in sink.calls)
+    assert targets == ["StudyLog", "U1", "U2"]
+    assert len(dict(sink.calls)["StudyLog"]) == 3
+    assert writer.pending_count() == 0
+
+
+def test_failed_sheet_is_replayed_after_restart_without_duplicates(tmp_path):
+    sink = FakeSink(fail_targets={"U2"})
+    writer = make_writer(tmp_path, sink)
+    writer.submit(entry("U1", 10))
+    writer.submit(entry("U2", 30))
+    try:
+        writer.flush()
+    except RuntimeError:
+        pass
+    writer._wal.close()
+
+    # 再起動：StudyLog と U1 は反映済みなので U2 だけ書き直す
+    sink = FakeSink()
+    writer = make_writer(tmp_path, sink)
+    assert writer.pending_count() == 1
+    writer.flush()
+    assert sink.calls == [("U2", [["2026-10-18T20:00:00", "英語", 30, "英語30分"]])]
+
+
+def test_ensure_header_adds_the_record_id_column_once():
+    class HeaderSheet:
+        def __init__(self):
+            self.header = STUDY_LOG_HEADER[:5]
+            self.col_count = 5
+            self.updates = 0
+
+        def row_values(self, row_no):
+            return list(self.header)
+
+        def add_cols(self, n):
+            self.col_count += n
+
+        def update(self, range_name, values):
+            self.updates += 1
+            self.header = values[0]
+
+    ws = HeaderSheet()
+    ensure_header(ws, STUDY_LOG_HEADER)
+    ensure_header(ws, STUDY_LOG_HEADER)
+    assert ws.header == STUDY_LOG_HEADER and ws.col_count == 6 and ws.updates == 1
+
+
+def test_torn_tail_is_truncated_so_later_entries_survive_the_next_restart(tmp_path):
+    wal = tmp_path / "study_log.wal"
+    writer = make_writer(tmp_path, FakeSink(fail_targets=["StudyLog", "U1"]))
+    writer.submit(entry("U1", 10))
+    writer.close()
+    # 2件目を書いている途中で落ちた
+    with open(wal, "a", encoding="utf-8") as f:
+        f.write('{"seq": 2, "data": {"datet')
+
+    restarted = make_writer(tmp_path, FakeSink(fail_targets=["StudyLog", "U1"]))
+    assert restarted.pending_count() == 1
+    assert restarted.submit(entry("U1", 30)) == 2
+    restarted.close()
+
+    sink = FakeSink()
+    again = make_writer(tmp_path, sink)
+    assert again.pending_count() == 2
+    again.flush()
+    assert [row[3] for row in dict(sink.calls)["StudyLog"]] == [10, 30]
+
+
+def test_entry_appended_after_a_torn_line_is_recovered(tmp_path):
+    wal = tmp_path / "study_log.wal"
+    with open(wal, "w", encoding="utf-8") as f:
+        f.write('{"seq": 1, "data": {"datet' + json.dumps({"seq": 2, "data": entry("U1", 30)}) + "\n")
+
+    writer = make_writer(tmp_path, FakeSink())
+    assert writer.pending_count() == 1
+    assert writer.submit(entry("U1", 40)) == 3
@@ -0,0 +1,93 @@
+from fakes import FakeWorksheet
+from spreadsheet_utils.read_replica import ReadReplica
+from spreadsheet_utils.study_rollup import StudyRollup
+
+HEADER = ["datetime", "user_id", "subject", "minutes", "raw_message", "record_id"]
+
+
+
+def study_log_sheet(rows):
+    return FakeWorksheet([HEADER] + rows)
+
+
+def record(dt, user_id, subject, minutes, record_id=None):
+    return {"datetime": dt, "user_id": user_id, "subject": subject, "minutes": minutes, "raw_message": "",
+            "record_id": record_id}
+
+
+def test_apply_accumulates_per_subject_and_is_idempotent():
+    rollup = StudyRollup()
+    first = record("2026-10-18T08:00:00", "U1", "英語", 30)
+    assert rollup.apply([first, record("2026-10-18T09:00:00", "U1", "英語", 15)]) == 2
+    assert rollup.apply([first]) == 0
+
+    assert rollup.minutes("U1", "2026/10/18") == 45
+    assert rollup.subject_totals("U1", "2026/10/18", "2026/10/18") == [("英語", 45, 2)]
+
+
+def test_records_at_the_same_time_are_counted_separately():
+    rollup = StudyRollup()
+    same_time = [
+        record("2026/10/18 20:00", "U1", "英語", 30, "r1"),
+        record("2026/10/18 20:00", "U1", "数学", 60, "r2"),
+        record("2026/10/18 20:00", "U1", "数学", 60, "r3"),
+    ]
+    assert rollup.apply(same_time) == 3
+    assert rollup.apply(same_time[:1]) == 0
+    assert rollup.minutes("U1", "2026/10/18") == 150
+
+    # ID のない記録でも、科目や時間が違えば別の記録
+    other = StudyRollup()
+    assert other.apply([record("2026/10/18 20:00", "U1", "英語", 30),
+                        record("2026/10/18 20:00", "U1", "数学", 60)]) == 2
+    assert other.minutes("U1", "2026/10/18") == 90
+
+
+def test_replica_sync_does_not_double_count_webhook_records():
+    rollup = StudyRollup()
+    replica = ReadReplica(rollup=rollup)
+    rollup.apply([record("2026-10-18T08:00:00", "U1", "英語", 30, "r1")])
+
+    ws = study_log_sheet([
+        ["2026-10-18T08:00:00", "U1", "英語", "30", "英語30分", "r1"],
+        ["2026-10-18T09:00:00", "U2", "数学", "60", "数学1時間", "r2"],
+    ])
+    replica.sync_study_log(ws, force=True)
+    ws.rows.append(["2026-10-19T10:00:00", "U1", "数学", "15", "数学15分", "r3"])
+    replica.sync_study_log(ws, force=True)
+
+    assert sorted(rollup.rows_on("2026/10/18")) == [("U1", "英語", 30), ("U2", "数学", 60)]
+    assert sorted(rollup.rows_between("2026/10/18", "2026/10/19")) == [
+        ("U1", "数学", 15), ("U1", "英語", 30), ("U2", "数学", 60)
+    ]
+
+
+def test_full_resync_rebuilds_rollup():
+    rollup = StudyRollup()
+    replica = ReadReplica(rollup=rollup)
+    ws = study_log_sheet([
+        ["2026-10-18T08:00:00", "U1", "英語", "30", "英語30分"],
+        ["2026-10-18T09:00:00", "U1", "英語", "60", "英語1時間"],
+    ])
+    replica.sync_study_log(ws, force=True)
+
+    del ws.rows[2]
+    replica.sync_study_log(ws, force=True)
+    assert rollup.minutes("U1", "2026/10/18") == 30
+
+
+def test_rows_without_record_id_use_their_row_number():
+    rollup = StudyRollup()
+    replica = ReadReplica(rollup=rollup)
+    # record_id 列を足す前のシート（ヘッダーも5列）
+    ws = study_log_sheet([
+        ["2026-10-18T08:00:00", "U1", "英語", "30", "英語30分"],
+        ["2026-10-18T08:00:00", "U1", "英語", "30", "英語30分"],
+    ])
+    ws.rows[0] = HEADER[:5]
+    replica.sync_study_log(ws, force=True)
+    ws.rows.append(["2026-10-18T09:00:00", "U1", "英語", "15", "英語15分", "r9"])
+    replica.sync_study_log(ws, force=True)
+    rollup.apply([record("2026-10-18T09:00:00", "U1", "英語", 15, "r9")])
+
+    assert rollup.minutes("U1", "2026/10/18") == 75
@@ -0,0 +1,28 @@
+from data_utils.subject_matcher import SubjectMatcher, find_subject
+
+
+def test_longest_match_wins():
+    assert find_subject("数学III1時間") == "数学III"
+    assert find_subject("英語表現30分") == "英語表現"
+    assert find_subject("国語と英語表現を1時間") == "英語表現"
+
+
+def test_reading_alias_maps_to_canonical_subject():
+    assert find_subject("すうがく30分") == "数学"
+    assert find_subject("えいごひょうげん1時間") == "英語表現"
+    assert find_subject("すうがく3を1時間") == "数学III"
+
+
+def test_full_width_and_case_are_normalized():
+    assert find_subject("数学Ⅲ1時間") == "数学III"
+    assert find_subject("toeic 30分") == "TOEIC"
+
+
+def test_no_subject():
+    assert find_subject("今日は30分") is None
+
+
+def test_find_all_reports_every_subject():
+    matcher = SubjectMatcher(["英語", "英語表現", "数学"])
+    found = [name for _, _, name in matcher.find_all("英語表現と数学")]
+    assert found == ["英語", "英語表現", "数学"]
@@ -0,0 +1,182 @@
+# dedupe.py
+# LINE の再送（同じ webhookEventId）を受け付けた時点で捨てる TTL つきキャッシュ
+# メモリ上の dict で判定し、path を指定すると SQLite にも残して再起動後も効くようにする
+# EventJournal は処理の終わったイベントの返信文を残し、再送や再試行で保存を二重にしないようにする
+
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from metrics_utils.metrics import Counter, register
+
+DEFAULT_TTL_SECONDS = 3600
+DEFAULT_MAX_ENTRIES = 100000
+# ディスク上の期限切れは、この件数を記録するごとにまとめて消す
+PURGE_EVERY = 1000
+
+DUPLICATES_DROPPED = register(Counter(
+    "studymebot_webhook_duplicates_dropped_total", "再送として捨てた webhook イベントの数"
+))
+
+
+class EventDeduper:
+    """
+    check_and_mark(event_id) は初めて見た ID なら True を返して記録し、TTL 内の2回目以降は False。
+    メモリ上は「記録した順」の OrderedDict なので、期限切れは先頭から捨てるだけでよい。
+    """
+
+    def __init__(self, ttl_seconds=DEFAULT_TTL_SECONDS, max_entries=DEFAULT_MAX_ENTRIES, path=None,
+                 clock=time.time):
+        self.ttl = ttl_seconds
+        self.max_entries = max_entries
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._seen = OrderedDict()
+        self._conn = None
+        self._inserts = 0
+        if path:
+            self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS seen_events (event_id TEXT PRIMARY KEY, seen_at REAL NOT NULL)"
+            )
+            self._load()
+
+    def _load(self):
+        cutoff = self._clock() - self.ttl
+        self._conn.execute("DELETE FROM seen_events WHERE seen_at < ?", (cutoff,))
+        rows = self._conn.execute(
+            "SELECT event_id, seen_at FROM seen_events ORDER BY seen_at DESC LIMIT ?", (self.max_entries,)
+        ).fetchall()
+        for event_id, seen_at in reversed(rows):
+            self._seen[event_id] = seen_at
+
+    def _expire(self, now):
+        cutoff = now - self.ttl
+        while self._seen:
+            event_id, seen_at = next(iter(self._seen.items()))
+            if seen_at >= cutoff and len(self._seen) <= self.max_entries:
+                break
+            self._seen.popitem(last=False)
+
+    def check_and_mark(self, event_id):
+        if not event_id:
+            # ID のないイベント（古い形式）は判定できないので通す
+            return True
+        now = self._clock()
+        with self._lock:
+            self._expire(now)
+            if event_id in self._seen:
+                DUPLICATES_DROPPED.inc()
+                return False
+            self._seen[event_id] = now
+            if self._conn is not None:
+                # 期限切れの行は上書きして「初めて」とみなす
+                inserted = self._conn.execute(
+                    "INSERT INTO seen_events (event_id, seen_at) VALUES (?, ?) "
+                    "ON CONFLICT (event_id) DO UPDATE SET seen_at = excluded.seen_at WHERE seen_at < ?",
+                    (event_id, now, now - self.ttl)
+                ).rowcount
+                if not inserted:
+                    # ほかのプロセスが先に受け付けた
+                    DUPLICATES_DROPPED.inc()
+                    return False
+                self._inserts += 1
+                if self._inserts % PURGE_EVERY == 0:
+                    self._conn.execute("DELETE FROM seen_events WHERE seen_at < ?", (now - self.ttl,))
+        return True
+
+    def forget(self, event_id):
+        """
+        処理に失敗したイベントは、再送を受け付けられるように記録から外す。
+        """
+        with self._lock:
+            self._seen.pop(event_id, None)
+            if self._conn is not None:
+                self._conn.execute("DELETE FROM seen_events WHERE event_id = ?", (event_id,))
+
+    def purge(self):
+        """
+        ディスク上の期限切れを消す（メモリ上は check_and_mark のたびに消える）。
+        """
+        if self._conn is not None:
+            with self._lock:
+                self._conn.execute("DELETE FROM seen_events WHERE seen_at < ?", (self._clock() - self.ttl,))
+
+    def __len__(self):
+        with self._lock:
+            return len(self._seen)
+
+
+class EventJournal:
+    """
+    webhookEventId -> 保存まで終わったイベントの返信文。
+    再送・再試行で同じイベントが来たら、保存はやり直さず残した返信文を返すだけにする。
+    """
+
+    def __init__(self, ttl_seconds=DEFAULT_TTL_SECONDS, max_entries=DEFAULT_MAX_ENTRIES, path=None,
+                 clock=time.time):
+        self.ttl = ttl_seconds
+        self.max_entries = max_entries
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._results = OrderedDict()
+        self._conn = None
+        if path:
+            self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS event_results "
+                "(event_id TEXT PRIMARY KEY, result TEXT NOT NULL, done_at REAL NOT NULL)"
+            )
+            self._conn.execute("DELETE FROM event_results WHERE done_at < ?", (clock() - ttl_seconds,))
+
+    def get(self, event_id):
+        if not event_id:
+            return None
+        cutoff = self._clock() - self.ttl
+        with self._lock:
+            entry = self._results.get(event_id)
+            if entry is not None:
+                return entry[0] if entry[1] >= cutoff else None
+            if self._conn is not None:
+                # 別のプロセス（再起動前を含む）で終わったイベント
+                row = self._conn.execute(
+                    "SELECT result FROM event_results WHERE event_id = ? AND done_at >= ?", (event_id, cutoff)
+                ).fetchone()
+                if row is not None:
+                    return row[0]
+        return None
+
+    def put(self, event_id, result):
+        if not event_id:
+            return
+        now = self._clock()
+        with self._lock:
+            self._results[event_id] = (result, now)
+            self._results.move_to_end(event_id)
+            while len(self._results) > self.max_entries:
+                self._results.popitem(last=False)
+            if self._conn is not None:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO event_results (event_id, result, done_at) VALUES (?, ?, ?)",
+                    (event_id, result, now)
+                )
+
+
+def create_deduper_from_env():
+    return EventDeduper(
+        ttl_seconds=float(os.getenv("WEBHOOK_DEDUPE_TTL_SECONDS", str(DEFAULT_TTL_SECONDS))),
+        max_entries=int(os.getenv("WEBHOOK_DEDUPE_MAX_ENTRIES", str(DEFAULT_MAX_ENTRIES))),
+        path=os.getenv("WEBHOOK_DEDUPE_PATH") or None
+    )
+
+
+def create_journal_from_env():
+    return EventJournal(
+        ttl_seconds=float(os.getenv("WEBHOOK_DEDUPE_TTL_SECONDS", str(DEFAULT_TTL_SECONDS))),
+        max_entries=int(os.getenv("WEBHOOK_DEDUPE_MAX_ENTRIES", str(DEFAULT_MAX_ENTRIES))),
+        path=os.getenv("WEBHOOK_DEDUPE_PATH") or None
+    )
@@ -0,0 +1,188 @@
+# event_queue.py
+# Webhook イベントをローカルの SQLite に永続化するキューとワーカープール
+
+import json
+import sqlite3
+import threading
+import time
+
+DEFAULT_MAX_ATTEMPTS = 5
+RETRY_BASE_SECONDS = 2
+RETRY_MAX_SECONDS = 300
+
+
+class EventQueue:
+    """
+    SQLite を使った永続キュー。
+    同じ user_key のイベントは enqueue 順に1件ずつしか取り出さない。
+    """
+
+    def __init__(self, path="event_queue.sqlite3", max_attempts=DEFAULT_MAX_ATTEMPTS):
+        self.path = path
+        self.max_attempts = max_attempts
+        self._lock = threading.Lock()
+        self._available = threading.Condition(self._lock)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS events (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                user_key TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                enqueued_at REAL NOT NULL,
+                available_at REAL NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                status TEXT NOT NULL DEFAULT 'pending',
+                last_error TEXT
+            );
+            CREATE INDEX IF NOT EXISTS idx_events_user ON events (user_key, id);
+            CREATE INDEX IF NOT EXISTS idx_events_status ON events (status, available_at);
+        """)
+        self.recover()
+
+    # 📥 追加（1トランザクションでまとめて書く）
+    def enqueue(self, items):
+        """
+        items: (user_key, payload dict) のリスト
+        """
+        now = time.time()
+        rows = [(key or "", json.dumps(payload, ensure_ascii=False), now, now) for key, payload in items]
+        with self._available:
+            self._conn.execute("BEGIN IMMEDIATE")
+            self._conn.executemany(
+                "INSERT INTO events (user_key, payload, enqueued_at, available_at) VALUES (?, ?, ?, ?)", rows
+            )
+            self._conn.execute("COMMIT")
+            self._available.notify_all()
+        return len(rows)
+
+    # 📤 取り出し（同じユーザーの先行イベントが残っていれば待つ）
+    def claim(self, timeout=None):
+        """
+        処理可能なイベントを running にして (id, payload, attempts) を返す。なければ None。
+        """
+        deadline = None if timeout is None else time.time() + timeout
+        with self._available:
+            while True:
+                job = self._claim_locked()
+                if job is not None:
+                    return job
+                wait = 0.5 if deadline is None else min(0.5, deadline - time.time())
+                if wait <= 0:
+                    return None
+                self._available.wait(wait)
+
+    def _claim_locked(self):
+        now = time.time()
+        self._conn.execute("BEGIN IMMEDIATE")
+        row = self._conn.execute("""
+            SELECT e.id, e.payload, e.attempts FROM events e
+            WHERE e.status = 'pending' AND e.available_at <= ?
+              AND NOT EXISTS (
+                  SELECT 1 FROM events p
+                  WHERE p.user_key = e.user_key AND p.id < e.id AND p.status IN ('pending', 'running')
+              )
+            ORDER BY e.id LIMIT 1
+        """, (now,)).fetchone()
+        if row is None:
+            self._conn.execute("COMMIT")
+            return None
+        self._conn.execute("UPDATE events SET status = 'running' WHERE id = ?", (row[0],))
+        self._conn.execute("COMMIT")
+        return row[0], json.loads(row[1]), row[2]
+
+    # ✅ 完了
+    def complete(self, event_id):
+        with self._available:
+            self._conn.execute("DELETE FROM events WHERE id = ?", (event_id,))
+            self._available.notify_all()
+
+    # 🔁 失敗（バックオフして再試行、上限を超えたら dead）
+    def fail(self, event_id, error, retryable=True):
+        with self._available:
+            attempts = self._conn.execute(
+                "SELECT attempts FROM events WHERE id = ?", (event_id,)
+            ).fetchone()[0] + 1
+            if not retryable or attempts >= self.max_attempts:
+                self._conn.execute(
+                    "UPDATE events SET status = 'dead', attempts = ?, last_error = ? WHERE id = ?",
+                    (attempts, str(error), event_id)
+                )
+            else:
+                delay = min(RETRY_BASE_SECONDS * (2 ** (attempts - 1)), RETRY_MAX_SECONDS)
+                self._conn.execute(
+                    "UPDATE events SET status = 'pending', attempts = ?, available_at = ?, last_error = ? WHERE id = ?",
+                    (attempts, time.time() + delay, str(error), event_id)
+                )
+            self._available.notify_all()
+
+    def recover(self):
+        """
+        前回のプロセスが処理中のまま落ちたイベントを pending に戻す。
+        """
+        with self._lock:
+            self._conn.execute("UPDATE events SET status = 'pending' WHERE status = 'running'")
+
+    # 📊 キューの深さと遅延
+    def stats(self):
+        with self._lock:
+            counts = dict(self._conn.execute(
+                "SELECT status, COUNT(*) FROM events GROUP BY status"
+            ).fetchall())
+            oldest = self._conn.execute(
+                "SELECT MIN(enqueued_at) FROM events WHERE status IN ('pending', 'running')"
+            ).fetchone()[0]
+        return {
+            "depth": counts.get("pending", 0) + counts.get("running", 0),
+            "pending": counts.get("pending", 0),
+            "running": counts.get("running", 0),
+            "dead": counts.get("dead", 0),
+            "lag_seconds": round(time.time() - oldest, 3) if oldest else 0.0
+        }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class EventWorkerPool:
+    """
+    EventQueue からイベントを取り出して handler(payload) を実行するスレッドプール。
+    is_retryable(exc) が False を返した例外は再試行しない。
+    """
+
+    def __init__(self, queue, handler, workers=4, is_retryable=None):
+        self.queue = queue
+        self.handler = handler
+        self.workers = workers
+        self.is_retryable = is_retryable or (lambda exc: True)
+        self._stop = threading.Event()
+        self._threads = []
+
+    def start(self):
+        for i in range(self.workers):
+            t = threading.Thread(target=self._run, name=f"event-worker-{i}", daemon=True)
+            t.start()
+            self._threads.append(t)
+
+    def stop(self, timeout=5):
+        self._stop.set()
+        for t in self._threads:
+            t.join(timeout)
+        self._threads = []
+
+    def _run(self):
+        while not self._stop.is_set():
+            job = self.queue.claim(timeout=1)
+            if job is None:
+                continue
+            event_id, payload, attempts = job
+            try:
+                self.handler(payload)
+            except Exception as e:
+                retryable = self.is_retryable(e)
+                print(f"❌ イベント処理に失敗しました (id={event_id}, attempt={attempts + 1}): {e}")
+                self.queue.fail(event_id, e, retryable=retryable)
+            else:
+                self.queue.complete(event_id)